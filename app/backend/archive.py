@@ -0,0 +1,290 @@
+import datetime
+import io
+import json
+import mimetypes
+import os
+import zipfile
+from collections import defaultdict
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, insert, select, union, update
+
+import models, blobstore, derivatives, ingest, tags
+from database import SessionLocal, ReadSessionLocal
+
+FORMAT = 1
+MANIFEST = "manifest.json"
+MEDIA_PREFIX = "media/"
+CHUNK_SIZE = ingest.CHUNK_SIZE
+BATCH_SIZE = 500
+MAX_IMPORT_MB = int(os.getenv("MAX_IMPORT_MB", "10240"))
+MAX_IMPORT_BYTES = MAX_IMPORT_MB * 1024 * 1024
+# Where POST /import spools the archive, outside uploads/ so the GC never sees it
+SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR") or None
+
+# Never exported: identity, bookkeeping and derived data that is rebuilt on import.
+# ranking comes from votes, which stay behind, so imported posts start at 0.
+SKIP = {"owner_id", "updated_at", "version", "legacy_gallery", "variants", "file_size", "size", "sha256", "hot_score", "ranking"}
+
+ENTRIES = (
+    ("journals.ndjson", "journal", models.JournalEntry),
+    ("blogs.ndjson", "blog", models.BlogPost),
+    ("sections.ndjson", "section", models.ProfileSection),
+)
+ALBUM = ("album.ndjson", models.AlbumItem, "file_path")
+MEDIA = ("media.ndjson", models.Media, "path")
+
+
+def _columns(model):
+    return [attr.key for attr in model.__mapper__.column_attrs if attr.key not in SKIP]
+
+
+def member_name(path: str) -> str:
+    # uploads/blobs/ab/abcd.jpg -> media/blobs/ab/abcd.jpg
+    return MEDIA_PREFIX + path.split("/", 1)[-1]
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class _Pipe(io.RawIOBase):
+    # Unseekable sink for ZipFile, the export drains it as it goes so about one chunk is buffered
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def _rows(db, model, owner_id, path_key=None):
+    columns = _columns(model)
+    query = db.query(*[getattr(model, key) for key in columns]).filter(model.owner_id == owner_id).order_by(model.id)
+    for row in query.yield_per(1000):
+        record = dict(zip(columns, row))
+        if path_key:
+            path = record.pop(path_key)
+            record["file"] = member_name(path) if path else None
+        yield record
+
+
+def _files(db, owner_id):
+    paths = union(
+        select(models.Media.path.label("path")).where(models.Media.owner_id == owner_id),
+        select(models.AlbumItem.file_path.label("path")).where(models.AlbumItem.owner_id == owner_id),
+        select(models.User.profile_picture.label("path")).where(models.User.id == owner_id),
+    ).subquery()
+    for (path,) in db.execute(select(paths.c.path).where(paths.c.path.isnot(None)).order_by(paths.c.path)).yield_per(1000):
+        yield path
+
+
+def export_archive(owner_id: int):
+    # A ZIP built while it is sent: NDJSON per table, then each referenced file once.
+    # Memory stays at about one chunk whatever the archive size. One read transaction
+    # covers the whole export, so rows and files come from the same snapshot.
+    pipe = _Pipe()
+    db = ReadSessionLocal()
+    try:
+        user = db.get(models.User, owner_id)
+        with zipfile.ZipFile(pipe, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            manifest = {
+                "format": FORMAT,
+                "exported_at": datetime.datetime.utcnow().isoformat(),
+                "username": user.username,
+                "profile_theme": user.profile_theme,
+                "profile_picture": member_name(user.profile_picture) if user.profile_picture else None,
+            }
+            zf.writestr(MANIFEST, json.dumps(manifest))
+            yield pipe.drain()
+
+            tables = [(name, _rows(db, model, owner_id)) for name, _, model in ENTRIES]
+            tables += [(name, _rows(db, model, owner_id, path_key)) for name, model, path_key in (ALBUM, MEDIA)]
+            for name, rows in tables:
+                with zf.open(name, "w", force_zip64=True) as out:
+                    for record in rows:
+                        out.write(json.dumps(record, default=_encode).encode() + b"\n")
+                        if pipe.size >= CHUNK_SIZE:
+                            yield pipe.drain()
+                yield pipe.drain()
+
+            for path in _files(db, owner_id):
+                if not os.path.isfile(path):
+                    continue
+                info = zipfile.ZipInfo(member_name(path), datetime.datetime.utcfromtimestamp(os.path.getmtime(path)).timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED  # media is already compressed
+                with open(path, "rb") as src, zf.open(info, "w", force_zip64=True) as out:
+                    while chunk := src.read(CHUNK_SIZE):
+                        out.write(chunk)
+                        yield pipe.drain()
+        yield pipe.drain()
+    finally:
+        db.close()
+
+
+def _decode(model, record):
+    # Only exported columns are accepted, ids and owners always come from the importer
+    columns = model.__mapper__.columns
+    now = datetime.datetime.utcnow()
+    values = {}
+    for key in _columns(model):
+        if key == "id" or key not in record:
+            continue
+        value = record[key]
+        if value is not None and isinstance(columns[key].type, DateTime):
+            value = datetime.datetime.fromisoformat(value)
+            if value.tzinfo is not None:
+                value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            # A date in the future would pin the entry to the top of date and hot ordered feeds
+            value = min(value, now)
+        values[key] = value
+    return values
+
+
+def _records(zf, name):
+    if name not in zf.NameToInfo:
+        return
+    with zf.open(name) as raw:
+        for line in io.TextIOWrapper(raw, encoding="utf-8"):
+            if line.strip():
+                yield json.loads(line)
+
+
+def _batches(records, size=BATCH_SIZE):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _store_files(db, zf, report):
+    # Every file is hashed on the way in, content already in the blob store is not written again
+    stored = {}
+    for info in zf.infolist():
+        if not info.filename.startswith(MEDIA_PREFIX) or info.is_dir():
+            continue
+        kind = "video" if (mimetypes.guess_type(info.filename)[0] or "").startswith("video") else "image"
+        with zf.open(info) as src:
+            incoming = ingest.receive_stream(src, blobstore.INCOMING_DIR, os.path.basename(info.filename), kind)
+        path, known = blobstore.place(db, incoming)
+        stored[info.filename] = (incoming.sha256, path, incoming.size, kind)
+        report["files"] += 1
+        report["deduplicated"] += int(known)
+    return stored
+
+
+def restore(path: str, owner_id: int) -> dict:
+    # Adds the archive's content to owner_id's space in one transaction
+    report = {"journal": 0, "blog": 0, "section": 0, "album": 0, "media": 0, "files": 0, "deduplicated": 0, "skipped": 0}
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Not a ZIP archive")
+    db = SessionLocal()
+    try:
+        with zf:
+            try:
+                manifest = json.loads(zf.read(MANIFEST))
+            except (KeyError, ValueError):
+                raise HTTPException(status_code=400, detail="Archive has no valid manifest.json")
+            if manifest.get("format") != FORMAT:
+                raise HTTPException(status_code=400, detail=f"Unsupported archive format {manifest.get('format')}")
+
+            stored = _store_files(db, zf, report)
+            targets = defaultdict(list)  # member -> rows that want its variants
+
+            def take(name):
+                # One reference per row, like an upload
+                if name not in stored:
+                    return None
+                return blobstore.acquire(db, *stored[name], owner_id)
+
+            ids = {}
+            for name, parent_type, model in ENTRIES:
+                ids[parent_type] = {}
+                for batch in _batches(_records(zf, name)):
+                    new_ids = db.scalars(
+                        insert(model).returning(model.id, sort_by_parameter_order=True),
+                        [dict(_decode(model, record), owner_id=owner_id) for record in batch],
+                    ).all()
+                    ids[parent_type].update(zip((record.get("id") for record in batch), new_ids))
+                    if model is models.BlogPost:
+                        tags.sync(db, new_ids)
+                report[parent_type] = len(ids[parent_type])
+
+            name, model, _ = ALBUM
+            for batch in _batches(_records(zf, name)):
+                rows, files = [], []
+                for record in batch:
+                    blob = take(record.get("file"))
+                    if blob is None:
+                        report["skipped"] += 1
+                        continue
+                    rows.append(dict(_decode(model, record), owner_id=owner_id, file_path=blob.path, file_size=blob.size, variants=blob.variants))
+                    files.append(record["file"])
+                if rows:
+                    new_ids = db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+                    for file, item_id in zip(files, new_ids):
+                        targets[file].append(("album", item_id))
+                    report["album"] += len(rows)
+
+            name, model, _ = MEDIA
+            for batch in _batches(_records(zf, name)):
+                rows = []
+                for record in batch:
+                    parent_type = record.get("parent_type")
+                    parent_id = ids.get(parent_type, {}).get(record.get("parent_id"))
+                    blob = take(record.get("file")) if parent_id is not None else None
+                    if blob is None:
+                        report["skipped"] += 1
+                        continue
+                    rows.append(dict(
+                        _decode(model, record),
+                        owner_id=owner_id,
+                        parent_id=parent_id,
+                        path=blob.path,
+                        size=blob.size,
+                        sha256=blob.sha256,
+                        variants=blob.variants,
+                    ))
+                    targets[record["file"]].append((parent_type, parent_id))
+                if rows:
+                    db.execute(insert(model), rows)
+                    report["media"] += len(rows)
+
+            profile = {}
+            if manifest.get("profile_theme") is not None:
+                profile["profile_theme"] = manifest["profile_theme"]
+            picture = take(manifest.get("profile_picture"))
+            if picture is not None:
+                blobstore.release(db, db.get(models.User, owner_id).profile_picture, owner_id)
+                profile["profile_picture"] = picture.path
+            if profile:
+                db.execute(update(models.User).where(models.User.id == owner_id).values(**profile))
+            db.commit()
+
+            for name, rows in targets.items():
+                derivatives.schedule(db.get(models.MediaBlob, stored[name][0]), rows)
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return report
@@ -0,0 +1,131 @@
+"""Read latency while a burst of logins runs against a live uvicorn server.
+
+Usage (from app/backend):
+    python benchmarks/auth.py --login-threads 16 --read-threads 4 --duration 10
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+    return {"count": len(samples), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def wait_ready(base, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(base + "/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--login-threads", type=int, default=16)
+    parser.add_argument("--read-threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-auth-")
+    os.makedirs(os.path.join(workdir, "uploads"))
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    try:
+        wait_ready(base)
+        with httpx.Client(base_url=base, timeout=60) as client:
+            client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+            token = client.post("/auth/token", data={"username": "bench", "password": "pw"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            for i in range(20):
+                client.post("/journal/", json={"title": f"Entry {i}", "content": "text"}, headers=headers)
+
+        stop = threading.Event()
+        reads, logins, statuses = [], [], {}
+        lock = threading.Lock()
+
+        def reader():
+            with httpx.Client(base_url=base, timeout=60) as client:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    client.get("/journal/", headers=headers)
+                    with lock:
+                        reads.append(time.perf_counter() - started)
+
+        def login():
+            with httpx.Client(base_url=base, timeout=60) as client:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    response = client.post("/auth/token", data={"username": "bench", "password": "pw"})
+                    with lock:
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                        if response.status_code == 200:
+                            logins.append(time.perf_counter() - started)
+                    if response.status_code == 503:
+                        time.sleep(float(response.headers.get("Retry-After", "1")))
+
+        # Reads alone first, then reads alongside the login burst
+        threads = [threading.Thread(target=reader) for _ in range(args.read_threads)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duration / 2)
+        stop.set()
+        for t in threads:
+            t.join()
+        idle_reads, reads = reads, []
+
+        stop.clear()
+        threads = [threading.Thread(target=reader) for _ in range(args.read_threads)]
+        threads += [threading.Thread(target=login) for _ in range(args.login_threads)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        print(json.dumps({
+            "login_threads": args.login_threads,
+            "read_threads": args.read_threads,
+            "reads_idle": percentiles(idle_reads),
+            "reads_during_logins": percentiles(reads),
+            "logins_ok": percentiles(logins),
+            "login_statuses": statuses,
+        }, indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
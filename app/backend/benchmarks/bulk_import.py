@@ -0,0 +1,87 @@
+"""Importing journal entries: one POST per entry against POST /journal/bulk.
+
+Usage (from app/backend):
+    python benchmarks/bulk_import.py --entries 10000 --batch-size 500
+
+Each API gets a fresh server and database. Both import the same entries and
+report rows/sec over the whole import.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from db_concurrency import free_port, wait_ready  # noqa: E402
+
+
+def entries(count):
+    return [{"title": f"Imported {i}", "content": "text " * 50, "is_public": i % 2 == 0} for i in range(count)]
+
+
+def import_single(client, headers, rows, batch_size):
+    for row in rows:
+        client.post("/journal/", json=row, headers=headers).raise_for_status()
+
+
+def import_bulk(client, headers, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        report = client.post("/journal/bulk", json={"create": rows[start:start + batch_size]}, headers=headers)
+        report.raise_for_status()
+        failed = [item for item in report.json()["created"] if item["status"] != 201]
+        if failed:
+            raise RuntimeError(f"bulk import rejected {len(failed)} rows: {failed[0]}")
+
+
+def run(api, rows, batch_size):
+    workdir = tempfile.mkdtemp(prefix="bench-bulk-")
+    os.makedirs(os.path.join(workdir, "uploads"))
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=BACKEND_DIR),
+    )
+    try:
+        wait_ready(base)
+        with httpx.Client(base_url=base, timeout=120) as client:
+            client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+            token = client.post("/auth/token", data={"username": "bench", "password": "pw"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            started = time.perf_counter()
+            api(client, headers, rows, batch_size)
+            elapsed = time.perf_counter() - started
+            stored = client.get("/dashboard/stats", headers=headers).json()["journal_count"]
+        return {"rows": len(rows), "stored": stored, "seconds": round(elapsed, 2), "rows_per_sec": round(len(rows) / elapsed, 1)}
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=500, help="entries per bulk request, at most BULK_MAX_ITEMS")
+    args = parser.parse_args()
+
+    rows = entries(args.entries)
+    results = {
+        "single": run(import_single, rows, args.batch_size),
+        "bulk": run(import_bulk, rows, args.batch_size),
+    }
+    results["speedup"] = round(results["bulk"]["rows_per_sec"] / results["single"]["rows_per_sec"], 1)
+    print(json.dumps({"entries": args.entries, "batch_size": args.batch_size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
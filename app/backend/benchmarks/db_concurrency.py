@@ -0,0 +1,139 @@
+"""Mixed read/write throughput against a live uvicorn server.
+
+Usage (from app/backend):
+    python benchmarks/db_concurrency.py --read-threads 8 --write-threads 4 --duration 10
+    python benchmarks/db_concurrency.py --modes sync,async   # DB_ASYNC off and on, side by side
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+    return {"count": len(samples), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def wait_ready(base, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(base + "/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def run_scenario(args, mode):
+    workdir = tempfile.mkdtemp(prefix="bench-db-")
+    os.makedirs(os.path.join(workdir, "uploads"))
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DB_ASYNC="1" if mode == "async" else "0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    try:
+        wait_ready(base)
+        with httpx.Client(base_url=base, timeout=60) as client:
+            client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+            token = client.post("/auth/token", data={"username": "bench", "password": "pw"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            for i in range(args.seed_entries):
+                client.post("/journal/", json={"title": f"Entry {i}", "content": "text " * 50}, headers=headers)
+            blog_id = client.post("/blog/", json={"title": "Post", "content": "text"}, headers=headers).json()["id"]
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        timings = {"read": [], "write": []}
+        failures = {"read": {}, "write": {}}
+
+        def run(kind, requests):
+            with httpx.Client(base_url=base, timeout=60) as client:
+                i = 0
+                while not stop.is_set():
+                    method, url, body = requests[i % len(requests)]
+                    i += 1
+                    started = time.perf_counter()
+                    response = client.request(method, url, json=body, headers=headers)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if response.status_code < 400:
+                            timings[kind].append(elapsed)
+                        else:
+                            failures[kind][response.status_code] = failures[kind].get(response.status_code, 0) + 1
+
+        reads = [
+            ("GET", "/journal/?limit=50", None),
+            ("GET", "/blog/", None),
+            ("GET", "/dashboard/stats", None),
+        ]
+        writes = [
+            ("POST", "/journal/", {"title": "New", "content": "written under load"}),
+            ("PUT", f"/blog/{blog_id}", {"title": "Post", "content": "edited under load"}),
+        ]
+        threads = [threading.Thread(target=run, args=("read", reads)) for _ in range(args.read_threads)]
+        threads += [threading.Thread(target=run, args=("write", writes)) for _ in range(args.write_threads)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "reads_per_sec": round(len(timings["read"]) / elapsed, 1),
+            "writes_per_sec": round(len(timings["write"]) / elapsed, 1),
+            "reads": percentiles(timings["read"]),
+            "writes": percentiles(timings["write"]),
+            "failures": failures,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--read-threads", type=int, default=8)
+    parser.add_argument("--write-threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seed-entries", type=int, default=200)
+    parser.add_argument("--modes", default="sync", help="comma separated: sync,async")
+    args = parser.parse_args()
+
+    results = {mode: run_scenario(args, mode) for mode in args.modes.split(",")}
+    print(json.dumps({
+        "read_threads": args.read_threads,
+        "write_threads": args.write_threads,
+        "modes": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
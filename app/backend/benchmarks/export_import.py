@@ -0,0 +1,167 @@
+"""Export a multi-GB synthetic account and import it into a fresh server.
+
+Usage (from app/backend):
+    python benchmarks/export_import.py --total-mb 3072 --file-mb 64 --entries 5000
+
+The account gets --entries journal entries and --total-mb of video uploads, half
+in the album and half in journal galleries. The export is streamed to disk and
+imported twice into a second server: first into an empty blob store, then as
+another user, where every file is deduplicated. Server RSS is sampled during
+each step, so the peak shows whether memory follows the archive size.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from db_concurrency import free_port, wait_ready  # noqa: E402
+
+CHUNK = 1024 * 1024
+
+
+class Server:
+    def __init__(self, total_mb):
+        self.workdir = tempfile.mkdtemp(prefix="bench-archive-")
+        os.makedirs(os.path.join(self.workdir, "uploads"))
+        port = free_port()
+        self.base = f"http://127.0.0.1:{port}"
+        env = dict(
+            os.environ,
+            PYTHONPATH=BACKEND_DIR,
+            MAX_APP_SIZE_MB=str(total_mb * 3),
+            MAX_IMPORT_MB=str(total_mb * 2),
+            IMPORT_SPOOL_DIR=self.workdir,
+            MEDIA_GC_INTERVAL="0",
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=self.workdir, env=env,
+        )
+        wait_ready(self.base)
+        self.client = httpx.Client(base_url=self.base, timeout=None)
+
+    def login(self, username):
+        self.client.post("/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+        token = self.client.post("/auth/token", data={"username": username, "password": "pw"}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    def rss_mb(self):
+        with open(f"/proc/{self.process.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    def measure(self, fn):
+        # Runs fn while sampling the server's RSS
+        samples = [self.rss_mb()]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(0.05):
+                samples.append(self.rss_mb())
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            stop.set()
+            sampler.join()
+        return result, time.perf_counter() - started, {"rss_before_mb": round(samples[0], 1), "rss_peak_mb": round(max(samples), 1)}
+
+    def close(self):
+        self.client.close()
+        self.process.terminate()
+        self.process.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def seed(server, headers, args, scratch):
+    rows = [{"title": f"Entry {i}", "content": "text " * 100} for i in range(args.entries)]
+    journal_ids = []
+    for start in range(0, len(rows), 500):
+        report = server.client.post("/journal/bulk", json={"create": rows[start:start + 500]}, headers=headers).json()
+        journal_ids += [item["id"] for item in report["created"]]
+    path = os.path.join(scratch, "clip.mp4")
+    for i in range(args.total_mb // args.file_mb):
+        with open(path, "wb") as out:
+            for _ in range(args.file_mb):
+                out.write(os.urandom(CHUNK))
+        with open(path, "rb") as f:
+            if i % 2:
+                response = server.client.post(f"/journal/upload/{journal_ids[i % len(journal_ids)]}", files={"files": (f"clip{i}.mp4", f, "video/mp4")}, headers=headers)
+            else:
+                response = server.client.post("/album/upload", files={"file": (f"clip{i}.mp4", f, "video/mp4")}, headers=headers)
+        response.raise_for_status()
+    os.remove(path)
+
+
+def export(server, headers, target):
+    size = 0
+    with server.client.stream("GET", "/export", headers=headers) as response:
+        response.raise_for_status()
+        with open(target, "wb") as out:
+            for chunk in response.iter_bytes(CHUNK):
+                out.write(chunk)
+                size += len(chunk)
+    return size
+
+
+def upload(server, headers, source):
+    def body():
+        with open(source, "rb") as f:
+            while chunk := f.read(CHUNK):
+                yield chunk
+    response = server.client.post("/import", content=body(), headers={**headers, "Content-Type": "application/zip"})
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--total-mb", type=int, default=3072)
+    parser.add_argument("--file-mb", type=int, default=64)
+    parser.add_argument("--entries", type=int, default=5000)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench-archive-zip-")
+    archive_path = os.path.join(scratch, "export.zip")
+    results = {}
+    source = Server(args.total_mb)
+    try:
+        headers = source.login("source")
+        started = time.perf_counter()
+        seed(source, headers, args, scratch)
+        results["seed_seconds"] = round(time.perf_counter() - started, 1)
+        size, elapsed, memory = source.measure(lambda: export(source, headers, archive_path))
+        results["export"] = {"mb": round(size / 1e6, 1), "seconds": round(elapsed, 1), "mb_per_sec": round(size / 1e6 / elapsed, 1), **memory}
+    finally:
+        source.close()
+
+    target = Server(args.total_mb)
+    try:
+        for step, username in (("import_fresh", "restored"), ("import_dedup", "copy")):
+            headers = target.login(username)
+            report, elapsed, memory = target.measure(lambda: upload(target, headers, archive_path))
+            results[step] = {"seconds": round(elapsed, 1), "mb_per_sec": round(size / 1e6 / elapsed, 1), **memory, "report": report}
+    finally:
+        target.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+    print(json.dumps({"total_mb": args.total_mb, "file_mb": args.file_mb, "entries": args.entries, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Hot feed reads from the stored hot_score index against scoring every post at query time.
+
+Usage (from app/backend):
+    python benchmarks/hot_feed.py --rows 100000 --page-size 20
+
+Run it at a few --rows values: the stored feed stays flat, the computed one
+grows with the table. Also times a vote flush, which rescores the voted posts.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The same formula as models.hot_score, evaluated by SQLite over the whole table
+COMPUTED_ORDER = """
+    (CASE WHEN ranking > 0 THEN 1 WHEN ranking < 0 THEN -1 ELSE 0 END)
+    * log10(max(abs(COALESCE(ranking, 0)), 1))
+    + (julianday(created_at) - julianday('2020-01-01')) * 86400 / {decay} DESC, id DESC
+"""
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return round(samples[len(samples) // 2] * 1000, 3)
+
+
+def seed(db, models, rows):
+    owner = models.User(username="bench", email="bench@example.com", hashed_password="x")
+    voter = models.User(username="voter", email="voter@example.com", hashed_password="x")
+    db.add_all([owner, voter])
+    db.commit()
+    now = datetime.datetime.utcnow()
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "title": f"Post {i}",
+            "content": "lorem ipsum " * 20,
+            "tags": "bench",
+            "ranking": int(random.paretovariate(1.2)) - 1,
+            "created_at": now - datetime.timedelta(minutes=rows - i),
+            "owner_id": owner.id,
+        })
+        if len(batch) == 5000:
+            db.execute(models.BlogPost.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.execute(models.BlogPost.__table__.insert(), batch)
+    db.commit()
+    return voter.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--votes", type=int, default=200, help="posts voted on before the timed flush")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-hot-"))
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    import main as app_main
+    import models, votes
+    from database import SessionLocal
+
+    db = SessionLocal()
+    voter_id = seed(db, models, args.rows)
+    client = TestClient(app_main.app)
+    computed = text(
+        f"SELECT id FROM blog_posts ORDER BY {COMPUTED_ORDER.format(decay=models.HOT_DECAY_SECONDS)} LIMIT :limit"
+    )
+
+    first = client.get("/blog/", params={"sort": "hot", "limit": args.page_size})
+    deep = {"sort": "hot", "limit": args.page_size, "cursor": first.headers["x-next-cursor"]}
+    expected = [row["id"] for row in first.json()]
+    assert [row.id for row in db.execute(computed, {"limit": args.page_size})] == expected, "orders differ"
+
+    results = {
+        "stored_first_page_ms": timed(lambda: client.get("/blog/", params={"sort": "hot", "limit": args.page_size}), args.repeat),
+        "stored_next_page_ms": timed(lambda: client.get("/blog/", params=deep), args.repeat),
+        "computed_query_ms": timed(lambda: db.execute(computed, {"limit": args.page_size}).all(), args.repeat),
+    }
+
+    post_ids = random.sample(range(1, args.rows + 1), min(args.votes, args.rows))
+    for post_id in post_ids:
+        votes.record(db, post_id, voter_id, 1)
+    started = time.perf_counter()
+    votes.flush()
+    results["vote_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    print(json.dumps({"rows": args.rows, "page_size": args.page_size, "votes": len(post_ids), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
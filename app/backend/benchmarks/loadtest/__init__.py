@@ -0,0 +1,18 @@
+"""Load tests against a seeded synthetic dataset.
+
+Usage (from app/backend):
+    python -m benchmarks.loadtest --scenarios dashboard,feed --transport asgi,uvicorn --workers 2
+    python -m benchmarks.loadtest --save-baseline baseline.json
+    python -m benchmarks.loadtest --baseline baseline.json   # compare, exit 1 on regressions
+
+The app runs in-process over the ASGI transport and/or under real uvicorn
+workers. Every request is timed, and the app reports its SQL statement count
+in a response header, so the JSON results break down per endpoint into
+throughput, p50/p95/p99 and statements per request.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.loadtest import BACKEND_DIR, dataset, scenarios
+from benchmarks.loadtest.instrument import STATEMENT_HEADER
+
+# Settings every run uses: large storage cap for upload bursts, no background GC
+SERVER_ENV = {"MAX_APP_SIZE_MB": "1000000", "MEDIA_GC_INTERVAL": "0"}
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statements = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def timed(self, label, pending):
+        started = time.perf_counter()
+        try:
+            response = await pending
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            raise
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        if STATEMENT_HEADER in response.headers:
+            self.statements[label].append(int(response.headers[STATEMENT_HEADER]))
+        return response
+
+    def report(self, elapsed):
+        results = {}
+        for label, samples in sorted(self.latencies.items()):
+            statements = self.statements[label]
+            results[label] = {
+                "requests": len(samples),
+                "errors": self.errors[label],
+                "statuses": dict(self.statuses[label]),
+                "rps": round(len(samples) / elapsed, 1),
+                **percentiles(samples),
+                "sql_per_request": round(sum(statements) / len(statements), 2) if statements else None,
+                "sql_max": max(statements) if statements else None,
+            }
+        return results
+
+
+async def sign_in(client, manifest, count):
+    sessions = []
+    for username in manifest["usernames"][:count]:
+        response = await client.post("/auth/token", data={"username": username, "password": manifest["password"]})
+        response.raise_for_status()
+        sessions.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+    return sessions
+
+
+async def run_scenario(client, manifest, sessions, name, concurrency, duration):
+    recorder = Recorder()
+    scenario = scenarios.SCENARIOS[name]
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(index):
+        user = scenarios.make_user(client, recorder, manifest, sessions, index)
+        while time.perf_counter() < deadline:
+            try:
+                await scenario(user)
+            except httpx.HTTPError:
+                await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+    return recorder.report(time.perf_counter() - started)
+
+
+async def drive(client, manifest, args):
+    sessions = await sign_in(client, manifest, args.sessions)
+    results = {}
+    for name in args.scenarios.split(","):
+        results[name] = await run_scenario(client, manifest, sessions, name, args.concurrency, args.duration)
+    return results
+
+
+async def run_asgi(manifest, args):
+    # In-process: no sockets or worker processes, only the app's own cost
+    from benchmarks.loadtest import instrument
+    app = instrument.create_app()
+    import main
+    main.start_workers()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await drive(client, manifest, args)
+    finally:
+        main.shutdown_workers()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            await client.get("/")
+            return
+        except httpx.HTTPError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def run_uvicorn(manifest, args, workdir):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.loadtest.instrument:create_app", "--factory",
+         "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+            await wait_ready(client)
+            return await drive(client, manifest, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(results, baseline, tolerance):
+    # Per endpoint changes against the baseline, a regression is slower p95, lower
+    # throughput or more SQL statements per request, each beyond the tolerance
+    regressions, changes = [], {}
+    for transport, by_scenario in results.items():
+        for scenario, endpoints in by_scenario.items():
+            for label, current in endpoints.items():
+                before = baseline.get(transport, {}).get(scenario, {}).get(label)
+                if not before:
+                    continue
+                change = {}
+                for key in ("rps", "p95_ms", "p99_ms", "sql_per_request"):
+                    if before.get(key) and current.get(key) is not None:
+                        change[key] = round(current[key] / before[key] - 1, 3)
+                key = f"{transport}/{scenario}/{label}"
+                changes[key] = change
+                if (change.get("p95_ms", 0) > tolerance or change.get("rps", 0) < -tolerance
+                        or change.get("sql_per_request", 0) > tolerance):
+                    regressions.append(key)
+    return changes, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest", description="Load tests against a synthetic dataset")
+    parser.add_argument("--scenarios", default=",".join(scenarios.SCENARIOS))
+    parser.add_argument("--transport", default="asgi,uvicorn", help="comma separated: asgi,uvicorn")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users per scenario")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--sessions", type=int, default=20, help="users signed in up front for the authenticated scenarios")
+    parser.add_argument("--out", help="write the results here as well as to stdout")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--save-baseline", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative change in p95, throughput and SQL statements per request")
+    dataset.add_arguments(parser)
+    args = parser.parse_args()
+
+    for key, value in SERVER_ENV.items():
+        os.environ.setdefault(key, value)
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    os.chdir(workdir)  # the backend modules bind ./sql_app.db and ./uploads on import
+    try:
+        started = time.perf_counter()
+        manifest = dataset.seed(dataset.spec_from(args))
+        report = {
+            "dataset": {**manifest["counts"], "seed_seconds": round(time.perf_counter() - started, 1)},
+            "settings": {key: getattr(args, key) for key in ("concurrency", "duration", "workers", "sessions")},
+            "results": {},
+        }
+        for transport in args.transport.split(","):
+            if transport == "asgi":
+                report["results"]["asgi"] = asyncio.run(run_asgi(manifest, args))
+            elif transport == "uvicorn":
+                report["results"]["uvicorn"] = asyncio.run(run_uvicorn(manifest, args, workdir))
+            else:
+                parser.error(f"unknown transport {transport}")
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["changes"], regressions = compare(report["results"], baseline.get("results", {}), args.tolerance)
+        report["regressions"] = regressions
+    output = json.dumps(report, indent=2)
+    print(output)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(output)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
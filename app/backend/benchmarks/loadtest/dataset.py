@@ -0,0 +1,163 @@
+"""Synthetic dataset: users with journals, ranked blog posts, profile sections,
+album items and gallery media backed by real files in the blob store.
+
+Seeds the SQLite database and uploads/ of the current directory, the same
+layout the app uses, so a server started there serves it as is.
+
+Usage (from app/backend, seeds the given directory):
+    python -m benchmarks.loadtest.dataset --dir /tmp/dataset --users 200 --journals 50
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+from collections import Counter
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import insert
+
+MANIFEST = "dataset.json"
+PASSWORD = "bench-password"
+
+WORDS = (
+    "river mountain coffee morning garden letter travel kitchen winter summer "
+    "temple market train ocean forest library music painting bread harvest"
+).split()
+
+
+@dataclass
+class Spec:
+    users: int = 50
+    journals: int = 20  # per user, and the same for the counts below
+    blogs: int = 10
+    sections: int = 4
+    album: int = 10
+    media: int = 2  # gallery items per journal, blog and section
+    files: int = 64  # distinct files on disk, shared between rows like re-used photos
+    file_kb: int = 64
+    seed: int = 1
+
+
+def _text(rng, words):
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def _insert(db, model, rows):
+    # executemany INSERT ... RETURNING, ids in row order
+    ids = []
+    for start in range(0, len(rows), 1000):
+        ids += db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows[start:start + 1000]).all()
+    return ids
+
+
+def _files(spec, rng, blobstore):
+    files = []
+    for i in range(spec.files):
+        data = rng.randbytes(spec.file_kb * 1024)
+        digest = hashlib.sha256(data).hexdigest()
+        path = blobstore.blob_path(digest, ".jpg")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            out.write(data)
+        files.append((digest, path, len(data)))
+    return files
+
+
+def seed(spec: Spec) -> dict:
+    # Imports here, the backend modules bind the database of the current directory
+    import blobstore, database, hashing, ledger, migrations, models, search
+
+    rng = random.Random(spec.seed)
+    migrations.upgrade(database.engine)
+    search.ensure_index(database.engine)
+    now = datetime.datetime.utcnow()
+    hashed = hashing.pwd_context.hash(PASSWORD)  # one bcrypt run, every user shares the password
+    files = _files(spec, rng, blobstore)
+    refs = Counter()
+
+    def pick():
+        digest, path, size = rng.choice(files)
+        refs[digest] += 1
+        return digest, path, size
+
+    db = database.SessionLocal()
+    try:
+        usernames = [f"user{i}" for i in range(spec.users)]
+        user_ids = _insert(db, models.User, [
+            {"username": name, "email": f"{name}@example.com", "hashed_password": hashed} for name in usernames
+        ])
+
+        def stamp(i, count):
+            return now - datetime.timedelta(minutes=count - i)
+
+        owned = {"journal": [], "blog": [], "section": []}
+        journals, blogs, sections, album = [], [], [], []
+        for owner_id in user_ids:
+            for i in range(spec.journals):
+                journals.append({"title": _text(rng, 4), "content": _text(rng, 120), "is_public": rng.random() < 0.3,
+                                 "created_at": stamp(i, spec.journals), "owner_id": owner_id})
+            for i in range(spec.blogs):
+                blogs.append({"title": _text(rng, 5), "content": _text(rng, 200), "tags": ", ".join(rng.sample(WORDS, 3)),
+                              "ranking": int(rng.paretovariate(1.2)) - 1, "created_at": stamp(i, spec.blogs), "owner_id": owner_id})
+            for i in range(spec.sections):
+                sections.append({"section_type": "text", "title": _text(rng, 2), "content": _text(rng, 60), "order": i,
+                                 "owner_id": owner_id})
+            for i in range(spec.album):
+                digest, path, size = pick()
+                album.append({"file_path": path, "file_size": size, "media_type": "image", "is_public": rng.random() < 0.5,
+                              "created_at": stamp(i, spec.album), "owner_id": owner_id})
+        for parent_type, model, rows in (("journal", models.JournalEntry, journals), ("blog", models.BlogPost, blogs),
+                                         ("section", models.ProfileSection, sections)):
+            owned[parent_type] = list(zip(_insert(db, model, rows), (row["owner_id"] for row in rows)))
+        _insert(db, models.AlbumItem, album)
+
+        media = []
+        for parent_type, parents in owned.items():
+            for parent_id, owner_id in parents:
+                for position in range(spec.media):
+                    digest, path, size = pick()
+                    media.append({"owner_id": owner_id, "parent_type": parent_type, "parent_id": parent_id, "position": position,
+                                  "path": path, "size": size, "media_type": "image", "mime": "image/jpeg", "sha256": digest})
+        _insert(db, models.Media, media)
+
+        db.execute(models.MediaBlob.__table__.insert(), [
+            {"sha256": digest, "path": path, "size": size, "media_type": "image", "ref_count": refs[digest], "created_at": now}
+            for digest, path, size in files
+        ])
+        db.commit()
+        ledger.rebuild(db)
+    finally:
+        db.close()
+
+    manifest = {
+        "spec": asdict(spec),
+        "password": PASSWORD,
+        "usernames": usernames,
+        "blog_ids": [blog_id for blog_id, _ in owned["blog"]],
+        "counts": {"users": len(user_ids), "journals": len(journals), "blogs": len(blogs), "sections": len(sections),
+                   "album": len(album), "media": len(media), "files": len(files)},
+    }
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def add_arguments(parser):
+    for field, default in asdict(Spec()).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field, type=int, default=default)
+
+
+def spec_from(args) -> Spec:
+    return Spec(**{field: getattr(args, field) for field in asdict(Spec())})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a synthetic dataset for the load tests")
+    parser.add_argument("--dir", required=True, help="directory to seed, it becomes the server's working directory")
+    add_arguments(parser)
+    args = parser.parse_args()
+    os.makedirs(args.dir, exist_ok=True)
+    os.chdir(args.dir)
+    print(json.dumps(seed(spec_from(args))["counts"]))
@@ -0,0 +1,52 @@
+"""The app with a per-request SQL statement count in a response header.
+
+uvicorn workers load it with --factory, the ASGI transport calls create_app().
+"""
+import contextvars
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+STATEMENT_HEADER = "X-SQL-Statements"
+
+# A mutable cell per request; threadpool handlers run in a copy of the context
+# and still share the cell
+_statements = contextvars.ContextVar("sql_statements", default=None)
+
+
+def _count(conn, cursor, statement, parameters, context, executemany):
+    cell = _statements.get()
+    if cell is not None:
+        cell[0] += 1
+
+
+class CountStatements:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        cell = [0]
+        token = _statements.set(cell)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(STATEMENT_HEADER, str(cell[0]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _statements.reset(token)
+
+
+def create_app():
+    import database, main
+
+    engines = {database.engine, database.read_engine}
+    if database.ASYNC_DB:
+        engines |= {database.async_engine.sync_engine, database.async_read_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _count)
+    return CountStatements(main.app)
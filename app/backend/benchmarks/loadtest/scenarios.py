@@ -0,0 +1,85 @@
+"""Scripted scenarios. Each is one iteration of a virtual user and is run in a
+loop by every concurrent client; requests are recorded under an endpoint label.
+"""
+import io
+import random
+
+try:
+    from PIL import Image
+except ImportError:  # uploads fall back to opaque bytes, the app then skips variants
+    Image = None
+
+FEED_PAGES = 5
+
+
+class VirtualUser:
+    def __init__(self, client, recorder, dataset, sessions, rng):
+        self.client = client
+        self.recorder = recorder
+        self.dataset = dataset
+        self.rng = rng
+        self.headers = rng.choice(sessions)
+
+    async def request(self, label, method, url, **kwargs):
+        kwargs.setdefault("headers", self.headers)
+        return await self.recorder.timed(label, self.client.request(method, url, **kwargs))
+
+
+def _image(rng):
+    if Image is None:
+        return rng.randbytes(32 * 1024), "application/octet-stream"
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3))).save(buf, "JPEG")
+    # A random tail keeps every upload distinct, so none are deduplicated away
+    return buf.getvalue() + rng.randbytes(16), "image/jpeg"
+
+
+async def dashboard(user):
+    # What the dashboard page fetches on open
+    await user.request("GET /dashboard/stats", "GET", "/dashboard/stats")
+    await user.request("GET /journal/", "GET", "/journal/?limit=20")
+    await user.request("GET /profile/", "GET", "/profile/")
+    await user.request("GET /profile/me", "GET", "/profile/me")
+
+
+async def feed(user):
+    # Anonymous paging through the public feeds
+    url = "/blog/?limit=20"
+    for _ in range(FEED_PAGES):
+        response = await user.request("GET /blog/", "GET", url, headers={})
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+        url = f"/blog/?limit=20&cursor={cursor}"
+    await user.request("GET /album/public", "GET", "/album/public?limit=20", headers={})
+
+
+async def upload(user):
+    data, content_type = _image(user.rng)
+    await user.request("POST /album/upload", "POST", "/album/upload", files={"file": ("bench.jpg", data, content_type)})
+
+
+async def login(user):
+    username = user.rng.choice(user.dataset["usernames"])
+    await user.request("POST /auth/token", "POST", "/auth/token", headers={},
+                       data={"username": username, "password": user.dataset["password"]})
+
+
+async def vote(user):
+    # A handful of hot posts take most of the votes
+    hot = user.dataset["blog_ids"][:20]
+    blog_id = user.rng.choice(hot)
+    await user.request("PUT /blog/{id}/rank", "PUT", f"/blog/{blog_id}/rank", json={"rank_delta": user.rng.choice((-1, 1))})
+
+
+SCENARIOS = {
+    "dashboard": dashboard,
+    "feed": feed,
+    "upload": upload,
+    "login": login,
+    "vote": vote,
+}
+
+
+def make_user(client, recorder, dataset, sessions, index):
+    return VirtualUser(client, recorder, dataset, sessions, random.Random(index))
@@ -0,0 +1,147 @@
+"""Media serving: the old StaticFiles mount against signed /media URLs.
+
+Usage (from app/backend):
+    python benchmarks/media_serving.py --files 20 --size-kb 512 --threads 8 --duration 5
+
+Each mode is measured for full downloads, video-style Range reads and repeat
+views, where a browser revalidates mount URLs but reuses immutable ones.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import media  # noqa: E402
+from db_concurrency import free_port, percentiles, wait_ready  # noqa: E402
+
+
+def legacy_app():
+    # What main.py mounted before /media existed
+    from fastapi import FastAPI
+    from fastapi.staticfiles import StaticFiles
+    app = FastAPI()
+    app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+    app.get("/")(lambda: {})
+    return app
+
+
+def seed(workdir, count, size):
+    paths = []
+    for i in range(count):
+        digest = f"{i:064x}"
+        path = f"uploads/blobs/{digest[:2]}/{digest}.mp4"
+        os.makedirs(os.path.join(workdir, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(workdir, path), "wb") as out:
+            out.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def load(base, urls, size, threads, duration, mode):
+    stop = threading.Event()
+    lock = threading.Lock()
+    timings, served, requests = [], [0], [0]
+
+    def run():
+        cache = {}  # url -> etag, a browser cache stand-in
+        with httpx.Client(base_url=base, timeout=30) as client:
+            while not stop.is_set():
+                url = random.choice(urls)
+                headers = {}
+                if mode == "range":
+                    start = random.randrange(0, size - 65536)
+                    headers["Range"] = f"bytes={start}-{start + 65535}"
+                elif mode == "repeat":
+                    if url in cache and cache[url] is None:
+                        # Fresh immutable copy, the browser doesn't ask again
+                        with lock:
+                            timings.append(0.0)
+                        continue
+                    if url in cache:
+                        headers["If-None-Match"] = cache[url]
+                started = time.perf_counter()
+                response = client.get(url, headers=headers)
+                elapsed = time.perf_counter() - started
+                if mode == "repeat" and response.status_code == 200:
+                    immutable = "immutable" in response.headers.get("cache-control", "")
+                    cache[url] = None if immutable else response.headers.get("etag")
+                with lock:
+                    timings.append(elapsed)
+                    served[0] += len(response.content)
+                    requests[0] += 1
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "views_per_sec": round(len(timings) / elapsed, 1),
+        "http_requests_per_sec": round(requests[0] / elapsed, 1),
+        "mb_per_sec": round(served[0] / elapsed / 1e6, 2),
+        "latency": percentiles(timings),
+    }
+
+
+def serve(workdir, target, factory=False):
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"]
+    if factory:
+        command.append("--factory")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([BACKEND_DIR, BENCH_DIR]))
+    server = subprocess.Popen(command, cwd=workdir, env=env)
+    base = f"http://127.0.0.1:{port}"
+    wait_ready(base)
+    return server, base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-media-")
+    size = args.size_kb * 1024
+    try:
+        paths = seed(workdir, args.files, size)
+        targets = {
+            "mount": ("media_serving:legacy_app", True, ["/" + p for p in paths]),
+            "media": ("main:app", False, ["/" + media.sign(p) for p in paths]),
+        }
+        results = {}
+        for name, (target, factory, urls) in targets.items():
+            server, base = serve(workdir, target, factory)
+            try:
+                results[name] = {
+                    mode: load(base, urls, size, args.threads, args.duration, mode)
+                    for mode in ("full", "range", "repeat")
+                }
+            finally:
+                server.terminate()
+                server.wait()
+        print(json.dumps({"files": args.files, "size_kb": args.size_kb, "threads": args.threads, "results": results}, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
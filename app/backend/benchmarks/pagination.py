@@ -0,0 +1,93 @@
+"""Compare page-N latency of keyset (cursor) paging against OFFSET paging.
+
+Usage (from app/backend):
+    python benchmarks/pagination.py --rows 100000 --page-size 20
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return round(samples[len(samples) // 2] * 1000, 3)
+
+
+def seed(db, models, rows):
+    owner = models.User(username="bench", email="bench@example.com", hashed_password="x")
+    db.add(owner)
+    db.commit()
+    start = datetime.datetime(2020, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "title": f"Post {i}",
+            "content": "lorem ipsum " * 20,
+            "tags": "bench",
+            "ranking": random.randint(-50, 500),
+            "created_at": start + datetime.timedelta(minutes=i),
+            "owner_id": owner.id,
+        })
+        if len(batch) == 5000:
+            db.execute(models.BlogPost.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.execute(models.BlogPost.__table__.insert(), batch)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-paging-"))
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import tuple_
+    import main as app_main
+    import models, pagination
+    from database import SessionLocal
+
+    db = SessionLocal()
+    seed(db, models, args.rows)
+    client = TestClient(app_main.app)
+    columns = [models.BlogPost.ranking, models.BlogPost.id]
+    ordered = db.query(models.BlogPost).order_by(models.BlogPost.ranking.desc(), models.BlogPost.id.desc())
+
+    results = []
+    for depth in (0, 1000, 10000, 50000, args.rows - args.page_size - 1):
+        if depth < 0 or depth >= args.rows:
+            continue
+        params = {"limit": args.page_size, "sort": "top"}
+        keyset = ordered
+        if depth:
+            anchor = ordered.offset(depth - 1).limit(1).one()
+            params["cursor"] = pagination.encode_cursor([anchor.ranking, anchor.id])
+            keyset = ordered.filter(tuple_(*columns) < tuple_(anchor.ranking, anchor.id))
+        results.append({
+            "depth": depth,
+            "keyset_query_ms": timed(lambda: keyset.limit(args.page_size).all(), args.repeat),
+            "offset_query_ms": timed(lambda: ordered.offset(depth).limit(args.page_size).all(), args.repeat),
+            "keyset_endpoint_ms": timed(lambda: client.get("/blog/", params=params), args.repeat),
+        })
+
+    print(json.dumps({"rows": args.rows, "page_size": args.page_size, "pages": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
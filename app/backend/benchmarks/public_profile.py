@@ -0,0 +1,100 @@
+"""Requests per second for rendering a profile: the two authenticated reads Profile.jsx
+makes against GET /u/{username}, cold (cache cleared before each request), warm
+and revalidated with If-None-Match.
+
+Usage (from app/backend):
+    python benchmarks/public_profile.py --sections 12 --media 4 --requests 500
+
+Rates count profile renders, two requests each for the old pair. Runs in
+process through TestClient, so the numbers are the app's own cost per
+request without network or server overhead.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DESIGN = {
+    "backgroundType": "gradient", "gradientStart": "#6366f1", "gradientEnd": "#a855f7", "gradientAngle": 135,
+    "color": "#1f2937", "width": 6, "customHeight": 400, "animation": "fade", "fontSize": 18,
+    "fontWeight": "normal", "fontStyle": "normal", "textAlign": "left", "fontFamily": "'Inter', sans-serif",
+}
+
+
+def rate(fn, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return round(requests / (time.perf_counter() - started), 1)
+
+
+def seed(db, models, sections, media_per_section):
+    user = db.query(models.User).filter(models.User.username == "bench").one()
+    user.profile_picture = "uploads/blobs/00/bench.png"
+    user.profile_theme = {"accent": "#6366f1", "font": "Inter"}
+    for position in range(sections):
+        section = models.ProfileSection(
+            section_type="custom", title=f"Section {position}", content="lorem ipsum " * 60,
+            design_config=DESIGN, order=position, owner_id=user.id,
+        )
+        db.add(section)
+        db.flush()
+        for index in range(media_per_section):
+            path = f"uploads/blobs/{position:02x}/{index}.jpg"
+            db.add(models.Media(
+                owner_id=user.id, parent_type="section", parent_id=section.id, position=index, path=path,
+                size=1000, media_type="image", width=1600, height=1200,
+                variants={str(width): path.replace(".jpg", f"_{width}.webp") for width in (320, 640, 1280)},
+            ))
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--media", type=int, default=4, help="gallery items per section")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-profile-"))
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    import main as app_main
+    import models, profile_cache
+    from database import SessionLocal
+
+    client = TestClient(app_main.app)
+    client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+    token = client.post("/auth/token", data={"username": "bench", "password": "pw"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    db = SessionLocal()
+    seed(db, models, args.sections, args.media)
+
+    def two_requests():
+        client.get("/profile/me", headers=headers).raise_for_status()
+        client.get("/profile/", headers=headers).raise_for_status()
+
+    def cold():
+        profile_cache.clear()
+        client.get("/u/bench").raise_for_status()
+
+    etag = client.get("/u/bench").headers["etag"]
+    body = client.get("/u/bench").content
+    results = {
+        "two_requests_rps": rate(two_requests, args.requests),
+        "cold_rps": rate(cold, args.requests),
+        "warm_rps": rate(lambda: client.get("/u/bench"), args.requests),
+        "revalidated_rps": rate(lambda: client.get("/u/bench", headers={"If-None-Match": etag}), args.requests),
+    }
+    print(json.dumps({
+        "sections": args.sections, "media_per_section": args.media, "body_bytes": len(body),
+        **results, "cache": profile_cache.stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Uploading a large video whose connection drops near the end: a retried POST
+/album/upload against a resumable upload that continues from its offset.
+
+Usage (from app/backend):
+    python benchmarks/resumable_upload.py --size-mb 90 --chunk-mb 8 --fail-at 0.95
+
+Reports the bytes sent and wall time of each until the video is stored, plus the
+throughput of an undisturbed upload both ways.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from db_concurrency import free_port, wait_ready  # noqa: E402
+
+
+def dropped_request(port, head: bytes, body: bytes, sent: int):
+    # Sends the headers and the first `sent` bytes of the body, then the connection dies
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(head)
+        sock.sendall(body[:sent])
+        time.sleep(0.5)
+
+
+def single(client, port, headers, data, fail_at):
+    boundary = "benchboundary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"clip.mp4\"\r\n"
+        f"Content-Type: video/mp4\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    sent = 0
+    if fail_at is not None:
+        head = (
+            f"POST /album/upload HTTP/1.1\r\nHost: bench\r\nAuthorization: {headers['Authorization']}\r\n"
+            f"Content-Type: multipart/form-data; boundary={boundary}\r\nContent-Length: {len(body)}\r\n\r\n"
+        ).encode()
+        sent += int(len(body) * fail_at)
+        dropped_request(port, head, body, int(len(body) * fail_at))
+    # Nothing survives the drop, the retry starts over
+    client.post("/album/upload", content=body, headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"}).raise_for_status()
+    return sent + len(body)
+
+
+def resumable(client, port, headers, data, fail_at, chunk):
+    upload = client.post("/uploads/", json={"length": len(data), "filename": "clip.mp4", "content_type": "video/mp4"}, headers=headers)
+    upload.raise_for_status()
+    url = upload.headers["location"]
+    offset, sent = 0, 0
+    if fail_at is not None:
+        # One long PATCH that dies, what arrived before the drop is kept
+        head = (
+            f"PATCH {url} HTTP/1.1\r\nHost: bench\r\nAuthorization: {headers['Authorization']}\r\n"
+            f"Upload-Offset: 0\r\nContent-Length: {len(data)}\r\n\r\n"
+        ).encode()
+        sent += int(len(data) * fail_at)
+        dropped_request(port, head, data, int(len(data) * fail_at))
+    while offset < len(data):
+        piece = data[offset:offset + chunk]
+        response = client.patch(url, content=piece, headers={**headers, "Upload-Offset": str(offset)})
+        sent += len(piece)
+        if response.status_code == 409:
+            # The dropped request is still being wound up, ask again where to resume
+            time.sleep(0.1)
+            offset = int(client.head(url, headers=headers).headers["upload-offset"])
+            continue
+        response.raise_for_status()
+        offset = int(response.headers["upload-offset"])
+    client.post(f"{url}/complete", headers=headers).raise_for_status()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=90)
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    parser.add_argument("--fail-at", type=float, default=0.95, help="fraction of the upload sent before the drop")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-resumable-")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=BACKEND_DIR, MAX_APP_SIZE_MB="100000"),
+    )
+    results = {}
+    try:
+        wait_ready(base)
+        with httpx.Client(base_url=base, timeout=300) as client:
+            client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+            token = client.post("/auth/token", data={"username": "bench", "password": "pw"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            size = args.size_mb * 1024 * 1024
+            for label, fail_at in (("undisturbed", None), (f"dropped_at_{args.fail_at:g}", args.fail_at)):
+                for api, upload in (
+                    ("single_post", lambda data: single(client, port, headers, data, fail_at)),
+                    ("resumable", lambda data: resumable(client, port, headers, data, fail_at, args.chunk_mb * 1024 * 1024)),
+                ):
+                    data = os.urandom(size)  # distinct content, nothing is deduplicated
+                    started = time.perf_counter()
+                    sent = upload(data)
+                    elapsed = time.perf_counter() - started
+                    results[f"{label}/{api}"] = {
+                        "mb_sent": round(sent / 1024 / 1024, 1),
+                        "seconds": round(elapsed, 2),
+                        "mb_per_sec": round(size / 1024 / 1024 / elapsed, 1),
+                    }
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({"size_mb": args.size_mb, "chunk_mb": args.chunk_mb, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measure /search latency against a seeded FTS5 index.
+
+Usage (from app/backend):
+    python benchmarks/search.py --rows 100000
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMON = (
+    "river mountain coffee morning garden letter travel kitchen winter summer "
+    "temple market train ocean forest library music painting bread harvest"
+).split()
+# Zipf-like vocabulary: a few common words and a long tail of rare ones
+WORDS = COMMON + [f"word{i}" for i in range(20000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(WORDS))))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def sentence(n):
+    return " ".join(random.choices(WORDS, cum_weights=CUM_WEIGHTS, k=n))
+
+
+def seed(db, models, rows):
+    owner = models.User(username="bench", email="bench@example.com", hashed_password="x")
+    db.add(owner)
+    db.commit()
+    start = datetime.datetime(2020, 1, 1)
+    journals, blogs = [], []
+    for i in range(rows):
+        row = {
+            "title": sentence(4),
+            "content": sentence(60),
+            "created_at": start + datetime.timedelta(minutes=i),
+            "owner_id": owner.id,
+        }
+        if i % 2:
+            blogs.append(dict(row, tags=",".join(random.sample(COMMON, 2)), ranking=0))
+        else:
+            journals.append(dict(row, is_public=bool(i % 3)))
+    # Inserts go through the triggers, same as the API would
+    for table, batch in ((models.JournalEntry.__table__, journals), (models.BlogPost.__table__, blogs)):
+        for offset in range(0, len(batch), 5000):
+            db.execute(table.insert(), batch[offset:offset + 5000])
+    db.commit()
+    return owner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-search-"))
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    import main as app_main
+    import models, dependencies
+    from database import SessionLocal
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    owner = seed(db, models, args.rows)
+    seed_seconds = round(time.perf_counter() - started, 2)
+    client = TestClient(app_main.app)
+    token = dependencies.create_access_token({"sub": owner.username})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    queries = {
+        "most_common_term": "river",
+        "common_term": "harvest",
+        "two_terms": "coffee morning",
+        "rare_term": "word5000",
+        "prefix": "templ",
+        "no_match": "zzzzzz",
+    }
+    results = {}
+    for name, q in queries.items():
+        results[name] = {
+            "anonymous": timed(lambda: client.get("/search/", params={"q": q}), args.repeat),
+            "owner": timed(lambda: client.get("/search/", params={"q": q}, headers=headers), args.repeat),
+        }
+
+    print(json.dumps({"rows": args.rows, "seed_seconds": seed_seconds, "queries": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
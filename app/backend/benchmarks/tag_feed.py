@@ -0,0 +1,110 @@
+"""Per-tag feed pages read from the blog_post_tags index against matching the tags string with LIKE.
+
+Usage (from app/backend):
+    python benchmarks/tag_feed.py --rows 100000 --tags 500 --page-size 20
+
+Times a common and a rare tag: LIKE scans the hot index until it has a page of
+matches, so the rarer the tag the more of the table it reads. The indexed feed
+reads one page whatever the tag. Also times the backfill and the tag cloud.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return round(samples[len(samples) // 2] * 1000, 3)
+
+
+def seed(db, models, rows, vocabulary):
+    owner = models.User(username="bench", email="bench@example.com", hashed_password="x")
+    db.add(owner)
+    db.commit()
+    now = datetime.datetime.utcnow()
+    # Zipf-ish popularity, tag0 is on a good share of posts and the tail is rare
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "title": f"Post {i}",
+            "content": "lorem ipsum " * 20,
+            "tags": ", ".join(set(random.choices(vocabulary, weights, k=3))),
+            "ranking": int(random.paretovariate(1.2)) - 1,
+            "created_at": now - datetime.timedelta(minutes=rows - i),
+            "owner_id": owner.id,
+        })
+        if len(batch) == 5000:
+            db.execute(models.BlogPost.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.execute(models.BlogPost.__table__.insert(), batch)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--tags", type=int, default=500, help="size of the tag vocabulary")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-tags-"))
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    import main as app_main
+    import models, tags
+    from database import SessionLocal, engine
+
+    vocabulary = [f"tag{rank}" for rank in range(args.tags)]
+    db = SessionLocal()
+    seed(db, models, args.rows, vocabulary)
+    started = time.perf_counter()
+    tags.backfill(engine)
+    results = {"backfill_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+    client = TestClient(app_main.app)
+    # The search a tags string column allows, word boundaries aside
+    like = text(
+        "SELECT id FROM blog_posts WHERE ', ' || tags || ',' LIKE :pattern "
+        "ORDER BY hot_score DESC, id DESC LIMIT :limit"
+    )
+    # What ?tag= runs, without the HTTP round trip
+    indexed = text(
+        "SELECT post_id FROM blog_post_tags WHERE tag_id = (SELECT id FROM tags WHERE name = :tag) "
+        "ORDER BY hot_score DESC, post_id DESC LIMIT :limit"
+    )
+    counts = dict(db.execute(text("SELECT name, post_count FROM tags")).all())
+    for label, tag in (("common", vocabulary[0]), ("rare", vocabulary[-1])):
+        params = {"tag": tag, "sort": "hot", "limit": args.page_size}
+        bind = {"pattern": f"%, {tag},%", "limit": args.page_size}
+        page = [row["id"] for row in client.get("/blog/", params=params).json()]
+        assert [row.id for row in db.execute(like, bind)] == page, "feeds differ"
+        results[label] = {
+            "tag": tag,
+            "posts": counts.get(tag, 0),
+            "indexed_page_ms": timed(lambda: client.get("/blog/", params=params), args.repeat),
+            "indexed_query_ms": timed(lambda: db.execute(indexed, {"tag": tag, "limit": args.page_size}).all(), args.repeat),
+            "like_query_ms": timed(lambda: db.execute(like, bind).all(), args.repeat),
+        }
+    results["cloud_ms"] = timed(lambda: client.get("/blog/tags", params={"limit": 50}), args.repeat)
+
+    print(json.dumps({"rows": args.rows, "tags": args.tags, "page_size": args.page_size, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
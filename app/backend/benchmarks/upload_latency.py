@@ -0,0 +1,99 @@
+"""Measure GET latency on the same worker while a large upload is in flight.
+
+Usage (from app/backend):
+    python benchmarks/upload_latency.py --size-mb 64 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "requests": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2) if samples else 0.0,
+        "mean_ms": round(statistics.mean(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+async def poll(client, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.005)
+
+
+async def run(size_mb, concurrency):
+    import httpx
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+        token = (await client.post("/auth/token", data={"username": "bench", "password": "bench"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        idle, busy = [], []
+        stop = asyncio.Event()
+        pollers = [asyncio.create_task(poll(client, stop, idle)) for _ in range(concurrency)]
+        await asyncio.sleep(1.0)
+        stop.set()
+        await asyncio.gather(*pollers)
+
+        payload = os.urandom(1024 * 1024) * size_mb
+        stop = asyncio.Event()
+        pollers = [asyncio.create_task(poll(client, stop, busy)) for _ in range(concurrency)]
+        started = time.perf_counter()
+        response = await client.post(
+            "/album/upload",
+            files={"file": ("bench.mp4", payload, "video/mp4")},
+            data={"is_public": "false"},
+            headers=headers,
+        )
+        upload_seconds = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*pollers)
+
+    return {
+        "upload_status": response.status_code,
+        "upload_mb": size_mb,
+        "upload_seconds": round(upload_seconds, 3),
+        "get_idle": summarize(idle),
+        "get_during_upload": summarize(busy),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    # Run against a throwaway database and uploads directory
+    workdir = tempfile.mkdtemp(prefix="bench-upload-")
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    result = asyncio.run(run(args.size_mb, args.concurrency))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Votes/sec under contention: per-vote read-modify-write vs the buffered vote path.
+
+Usage (from app/backend):
+    python benchmarks/votes.py --threads 16 --votes 4000 --posts 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_threads(threads, work):
+    errors = []
+
+    def target(index):
+        try:
+            work(index)
+        except Exception as exc:
+            errors.append(repr(exc))
+
+    workers = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - started, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--votes", type=int, default=4000)
+    parser.add_argument("--posts", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-votes-"))
+    sys.path.insert(0, BACKEND_DIR)
+    import migrations, models, votes
+    from database import SessionLocal, engine
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    db.execute(models.User.__table__.insert(), [
+        {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"} for i in range(args.votes)
+    ])
+    db.execute(models.BlogPost.__table__.insert(), [
+        {"title": f"Post {i}", "content": "x", "ranking": 0, "owner_id": 1} for i in range(args.posts)
+    ])
+    db.commit()
+    post_ids = [p.id for p in db.query(models.BlogPost.id)]
+    per_thread = args.votes // args.threads
+    random.seed(1)
+    plan = [[(random.choice(post_ids), t * per_thread + i + 1) for i in range(per_thread)] for t in range(args.threads)]
+
+    def naive(index):
+        # What PUT /blog/{id}/rank used to do: load, add in Python, commit
+        for post_id, _ in plan[index]:
+            session = SessionLocal()
+            try:
+                post = session.get(models.BlogPost, post_id)
+                post.ranking += 1
+                session.commit()
+            finally:
+                session.close()
+
+    def buffered(index):
+        session = SessionLocal()
+        try:
+            for post_id, user_id in plan[index]:
+                votes.record(session, post_id, user_id, 1)
+        finally:
+            session.close()
+
+    def total_ranking():
+        session = SessionLocal()
+        try:
+            return sum(p.ranking for p in session.query(models.BlogPost))
+        finally:
+            session.close()
+
+    expected = per_thread * args.threads
+    naive_seconds, naive_errors = run_threads(args.threads, naive)
+    naive_total = total_ranking()
+
+    db.query(models.BlogPost).update({"ranking": 0})
+    db.commit()
+    votes.start()
+    buffered_seconds, buffered_errors = run_threads(args.threads, buffered)
+    votes.stop()
+    buffered_total = total_ranking()
+
+    print(json.dumps({
+        "votes": expected,
+        "threads": args.threads,
+        "read_modify_write": {
+            "votes_per_sec": round(expected / naive_seconds, 1),
+            "lost_updates": expected - naive_total,
+            "errors": len(naive_errors),
+        },
+        "buffered": {
+            "votes_per_sec": round(expected / buffered_seconds, 1),
+            "lost_updates": expected - buffered_total,
+            "errors": len(buffered_errors),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import datetime
+import dataclasses
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import models, ingest, ledger, sessions
+from database import dialect_insert
+
+BLOB_DIR = "uploads/blobs"
+INCOMING_DIR = f"{BLOB_DIR}/incoming"
+
+
+def blob_path(digest: str, ext: str) -> str:
+    # Two-level fan out keeps directories small
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{ext}"
+
+
+def digest_from_path(path: Optional[str]) -> Optional[str]:
+    # Legacy uploads (uploads/<dir>/<prefix>_<name>) are not content addressed
+    if not path or not path.startswith(BLOB_DIR + "/"):
+        return None
+    digest = os.path.basename(path).split(".", 1)[0]
+    return digest if len(digest) == 64 else None
+
+
+def _place(tmp_path: str, path: Optional[str]):
+    if path is None:
+        os.remove(tmp_path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+
+
+def acquire(db: Session, digest: str, path: str, size: int, media_type: str, owner_id: int) -> models.MediaBlob:
+    # Another reference to live content is free, only new bytes on disk count against the cap
+    bumped = db.execute(
+        update(models.MediaBlob)
+        .where(models.MediaBlob.sha256 == digest, models.MediaBlob.ref_count > 0)
+        .values(ref_count=models.MediaBlob.ref_count + 1)
+    ).rowcount
+    if not bumped:
+        ledger.reserve_or_raise(db, size)
+        stmt = dialect_insert(db, models.MediaBlob).values(
+            sha256=digest,
+            path=path,
+            size=size,
+            media_type=media_type,
+            ref_count=1,
+            created_at=datetime.datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.MediaBlob.sha256],
+            set_={"ref_count": models.MediaBlob.ref_count + 1},
+        ).returning(models.MediaBlob.ref_count)
+        if db.execute(stmt).scalar_one() > 1:
+            # Revived by a concurrent upload on another worker, which already paid for it
+            ledger.credit(db, ledger.GLOBAL, size)
+    ledger.charge(db, owner_id, size)
+    return db.get(models.MediaBlob, digest, populate_existing=True)
+
+
+def release(db: Session, path: Optional[str], owner_id: int, size: Optional[int] = None):
+    # Zero-reference blobs stay on disk until the garbage collector removes them
+    if not path:
+        return
+    digest = digest_from_path(path)
+    if digest is None:
+        # Legacy upload outside the blob store
+        if size is None:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+        ledger.credit(db, owner_id, size)
+        ledger.credit(db, ledger.GLOBAL, size)
+        return
+    row = db.execute(
+        update(models.MediaBlob)
+        .where(models.MediaBlob.sha256 == digest, models.MediaBlob.ref_count > 0)
+        .values(ref_count=models.MediaBlob.ref_count - 1)
+        .returning(models.MediaBlob.ref_count, models.MediaBlob.size)
+    ).first()
+    if row is None:
+        return
+    ledger.credit(db, owner_id, row.size)
+    if row.ref_count == 0:
+        ledger.credit(db, ledger.GLOBAL, row.size)
+
+
+def place(db: Session, incoming: ingest.StoredUpload):
+    # store's placement for callers already in a worker thread. Returns the
+    # content's path and whether it was already stored, no reference is taken.
+    existing = db.get(models.MediaBlob, incoming.sha256)
+    try:
+        if existing is not None and existing.ref_count > 0 and os.path.exists(existing.path):
+            _place(incoming.path, None)
+            return existing.path, True
+        ext = os.path.splitext(incoming.filename)[1].lower()
+        path = existing.path if existing is not None else blob_path(incoming.sha256, ext)
+        _place(incoming.path, path)
+        return path, False
+    finally:
+        if os.path.exists(incoming.path):
+            os.remove(incoming.path)
+
+
+async def store(db: Session, incoming: ingest.StoredUpload) -> ingest.StoredUpload:
+    # Moves a file received by ingest.receive_form into the blob store and returns it
+    # at its new path. Nothing is written to the database: the caller acquires it in
+    # the transaction that records it, files placed but never acquired are left to
+    # the garbage collector.
+    try:
+        existing = await sessions.run(db, lambda session: session.get(models.MediaBlob, incoming.sha256))
+        if existing is not None and existing.ref_count > 0 and os.path.exists(existing.path):
+            # Known content, the temp copy is discarded and only a reference is added.
+            # Zero-reference content may be mid-collection, so it is written again below.
+            path = existing.path
+            await run_in_threadpool(_place, incoming.path, None)
+        else:
+            ext = os.path.splitext(incoming.filename)[1].lower()
+            path = existing.path if existing is not None else blob_path(incoming.sha256, ext)
+            await run_in_threadpool(_place, incoming.path, path)
+    finally:
+        if os.path.exists(incoming.path):
+            os.remove(incoming.path)
+    return dataclasses.replace(incoming, path=path)
+
+
+async def store_all(db: Session, uploads: list) -> list:
+    try:
+        return [await store(db, incoming) for incoming in uploads]
+    finally:
+        # Temp files of the uploads not reached when one failed
+        await run_in_threadpool(ingest.discard, uploads)
+
+
+def acquire_upload(db: Session, stored: ingest.StoredUpload, owner_id: int) -> models.MediaBlob:
+    return acquire(db, stored.sha256, stored.path, stored.size, stored.media_type, owner_id)
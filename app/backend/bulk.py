@@ -0,0 +1,83 @@
+import os
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+import models, blobstore, gallery, tags
+
+MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+
+
+def _result(index, id=None, status=200, error=None):
+    return {"index": index, "id": id, "status": status, "error": error}
+
+
+def _validate(schema, items, results):
+    # Each item is validated on its own, one bad item doesn't fail the batch
+    valid = []
+    for index, raw in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(raw)))
+        except ValidationError as exc:
+            results.append(_result(index, raw.get("id") if isinstance(raw, dict) else None, 422,
+                                   exc.errors(include_url=False, include_context=False)))
+    return valid
+
+
+def _owned(db: Session, model, ids, owner_id: int) -> set:
+    if not ids:
+        return set()
+    return {row_id for (row_id,) in db.query(model.id).filter(model.id.in_(ids), model.owner_id == owner_id)}
+
+
+def apply(db: Session, parent_type: str, batch, create_schema, update_schema, owner_id: int) -> dict:
+    # Creates, updates and deletes for one owner in a single transaction, with
+    # executemany inserts/updates instead of a flush and refresh per row
+    if len(batch.create) + len(batch.update) + len(batch.delete) > MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ITEMS} items per batch")
+    model = gallery.PARENTS[parent_type]
+    report = {"created": [], "updated": [], "deleted": []}
+
+    creates = _validate(create_schema, batch.create, report["created"])
+    if creates:
+        ids = db.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            [dict(item.model_dump(), owner_id=owner_id) for _, item in creates],
+        ).all()
+        report["created"] += [_result(index, row_id, 201) for (index, _), row_id in zip(creates, ids)]
+        if model is models.BlogPost:
+            tags.sync(db, ids)
+
+    updates = _validate(update_schema, batch.update, report["updated"])
+    owned = _owned(db, model, [item.id for _, item in updates], owner_id)
+    rows = []
+    for index, item in updates:
+        if item.id not in owned:
+            report["updated"].append(_result(index, item.id, 404, "Not found"))
+            continue
+        rows.append(item.model_dump(exclude_unset=True))
+        report["updated"].append(_result(index, item.id))
+    if rows:
+        # Bulk UPDATE by primary key, rows with the same set of keys go out as one executemany
+        db.execute(update(model), rows)
+        if model is models.BlogPost:
+            tags.sync(db, [row["id"] for row in rows if "tags" in row])
+
+    owned = _owned(db, model, batch.delete, owner_id)
+    for index, row_id in enumerate(batch.delete):
+        report["deleted"].append(_result(index, row_id, 200 if row_id in owned else 404, None if row_id in owned else "Not found"))
+    if owned:
+        items = db.query(models.Media).filter(models.Media.parent_type == parent_type, models.Media.parent_id.in_(owned))
+        for item in items:
+            blobstore.release(db, item.path, owner_id, item.size)
+        items.delete(synchronize_session=False)
+        if model is models.BlogPost:
+            db.query(models.BlogVote).filter(models.BlogVote.post_id.in_(owned)).delete(synchronize_session=False)
+            tags.detach(db, owned)
+        db.query(model).filter(model.id.in_(owned)).delete(synchronize_session=False)
+
+    for results in report.values():
+        results.sort(key=lambda result: result["index"])
+    return report
@@ -0,0 +1,78 @@
+import datetime
+import hashlib
+import os
+from email.utils import format_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+
+import media, models, sessions
+
+# Public feeds may be reused by shared caches for this long, private responses
+# are always revalidated against their ETag
+SHARED_MAX_AGE = int(os.getenv("FEED_SHARED_MAX_AGE", "10"))
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def scope(model, *criteria):
+    # Any insert or delete changes the count and any update raises max(updated_at),
+    # both are answered from the (scope, updated_at) indexes without reading rows
+    return select(func.count(model.id), func.max(model.updated_at)).where(*criteria)
+
+
+def owners(model, *criteria):
+    # Expanded owner summaries change with the owners' rows
+    owner_ids = select(model.owner_id).where(*criteria)
+    return select(func.max(models.User.updated_at)).where(models.User.id.in_(owner_ids)).scalar_subquery()
+
+
+def etag(*parts) -> str:
+    # Bodies carry signed media URLs, which roll over with each signing window
+    digest = hashlib.blake2b(repr(parts + (media.expiry(),)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _matches(header: str, tag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(candidate.strip().removeprefix("W/") == tag.removeprefix("W/") for candidate in header.split(","))
+
+
+def respond(request: Request, response: Response, tag: str, private: bool = True, last_modified=None):
+    # Sets the validators on the response; returns a 304 to send instead of the body
+    headers = {
+        "ETag": tag,
+        "Cache-Control": PRIVATE_CACHE_CONTROL if private else f"public, max-age={SHARED_MAX_AGE}",
+    }
+    if private:
+        headers["Vary"] = "Authorization"
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=datetime.timezone.utc), usegmt=True)
+    response.headers.update(headers)
+    header = request.headers.get("if-none-match")
+    if header and _matches(header, tag):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+async def listing(request: Request, response: Response, db, model, *criteria, expand=(), private=True):
+    # Validator for a list endpoint: its scope plus the query string (cursor, limit, fields)
+    statement = scope(model, *criteria)
+    if "owner" in expand:
+        statement = statement.add_columns(owners(model, *criteria))
+    count, updated, *owner_updated = (await sessions.execute(db, statement)).one()
+    owner_updated = owner_updated[0] if owner_updated else None
+    tag = etag(model.__tablename__, count, updated, owner_updated, str(request.url.query))
+    return respond(request, response, tag, private=private, last_modified=updated)
+
+
+def page(request: Request, response: Response, rows, *parts, expand=(), private=True):
+    # Validator for one keyset page built from its own rows (needs id, version and
+    # updated_at loaded): any change to which posts make the page changes the ids,
+    # any edit bumps a version. Costs nothing beyond reading the page.
+    versions = [(row.id, row.version) for row in rows]
+    owner_versions = sorted({(row.owner.id, row.owner.version) for row in rows if row.owner is not None}) if "owner" in expand else None
+    updated = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+    tag = etag(*parts, versions, owner_versions, str(request.url.query))
+    return respond(request, response, tag, private=private, last_modified=updated)
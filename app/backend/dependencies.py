@@ -1,10 +1,8 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
-import models, schemas, database
-from database import get_db
+import models, schemas, database, principals, sessions
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -12,14 +10,12 @@ SECRET_KEY = "YOUR_SUPER_SECRET_KEY_CHANGE_THIS"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Request-scoped sessions, an AsyncSession when DB_ASYNC is set (see sessions.py)
+get_db = database.get_async_db if database.ASYNC_DB else database.get_db
+get_read_db = database.get_async_read_db if database.ASYNC_DB else database.get_read_db
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -31,20 +27,44 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _load_principal(db: Session, username: str):
+    user = db.query(models.User).filter(models.User.username == username).first()
+    return principals.Principal.from_user(user) if user is not None else None
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
+    # The token is verified on every request, the user row only on a cache miss
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == username).first()
+        raise _credentials_exception()
+    principal = principals.get(username)
+    if principal is None:
+        principal = await sessions.run(db, _load_principal, username)
+        if principal is None:
+            raise _credentials_exception()
+        principals.put(principal)
+    return principal
+
+async def get_current_user(principal: principals.Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
+    # Full ORM user, for handlers that modify the user row itself
+    user = await sessions.run(db, lambda session: session.get(models.User, principal.id))
     if user is None:
-        raise credentials_exception
+        principals.invalidate(principal.username)
+        raise _credentials_exception()
     return user
+
+async def get_optional_principal(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_read_db)):
+    # Anonymous callers get None, a bad token is still rejected
+    if token is None:
+        return None
+    return await get_current_principal(token, db)
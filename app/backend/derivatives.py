@@ -0,0 +1,204 @@
+import argparse
+import concurrent.futures
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+
+import models, blobstore, gallery, migrations, profile_cache
+from database import SessionLocal, engine
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional, without it the API keeps serving originals only
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_DIR = f"{blobstore.BLOB_DIR}/variants"
+MAX_WORKERS = int(os.getenv("DERIVE_WORKERS", "2"))
+MAX_PENDING = int(os.getenv("DERIVE_MAX_PENDING", "64"))
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+_inflight = {}  # digest -> targets waiting on the same render
+
+
+def render_variants(source_path: str, digest: str):
+    # Runs inside a worker process, keep it free of DB access. Returns the
+    # variants and the original's (width, height).
+    fmt, ext = ("WEBP", ".webp") if features.check("webp") else ("JPEG", ".jpg")
+    variants = {}
+    with Image.open(source_path) as original:
+        img = ImageOps.exif_transpose(original)
+        dimensions = img.size
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha and fmt == "WEBP" else "RGB")
+        for width in VARIANT_WIDTHS:
+            if width >= img.width:
+                break
+            height = max(1, round(img.height * width / img.width))
+            path = f"{VARIANT_DIR}/{digest[:2]}/{digest}_{width}{ext}"
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            with os.fdopen(fd, "wb") as out:
+                img.resize((width, height), Image.LANCZOS).save(out, fmt, quality=80)
+            os.replace(tmp_path, path)
+            variants[str(width)] = path
+    return variants, dimensions
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn keeps worker processes clear of the server's threads and DB connections
+            _executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def record_variants(db, source_path: str, digest: str, variants: dict, targets, dimensions=None):
+    # Returns the owners of the profile sections that changed, their cached profiles are stale
+    profile_owners = set()
+    blob = db.get(models.MediaBlob, digest)
+    if blob is not None:
+        blob.variants = variants
+    for kind, row_id in targets:
+        if kind == "album":
+            item = db.get(models.AlbumItem, row_id)
+            if item is not None:
+                item.variants = variants
+            continue
+        items = db.query(models.Media).filter(
+            models.Media.parent_type == kind, models.Media.parent_id == row_id, models.Media.path == source_path
+        ).all()
+        for item in items:
+            item.variants = variants
+            if dimensions:
+                item.width, item.height = dimensions
+            if kind == "section":
+                profile_owners.add(item.owner_id)
+        if items:
+            gallery.touch(db, kind, [row_id])
+    return profile_owners
+
+
+def _on_done(future, source_path, digest):
+    _pending.release()
+    with _executor_lock:
+        targets = _inflight.pop(digest, [])
+    if future.cancelled():
+        return
+    try:
+        variants, dimensions = future.result()
+    except Exception:
+        logger.exception("Failed to derive variants for %s", source_path)
+        return
+    db = SessionLocal()
+    try:
+        profile_owners = record_variants(db, source_path, digest, variants, targets, dimensions)
+        db.commit()
+        for owner_id in profile_owners:
+            profile_cache.invalidate(owner_id)
+    except Exception:
+        logger.exception("Failed to record variants for %s", source_path)
+        db.rollback()
+    finally:
+        db.close()
+
+
+def schedule(blob: models.MediaBlob, targets):
+    # targets: [("album", item_id)] or [("journal"|"blog"|"section", row_id)]
+    if Image is None or blob.media_type != "image" or blob.variants is not None:
+        return
+    # Bounded queue, anything dropped here is picked up by the backfill command
+    if not _pending.acquire(blocking=False):
+        logger.warning("Derivative queue full, skipping %s", blob.path)
+        return
+    source_path, digest = blob.path, blob.sha256
+    with _executor_lock:
+        if digest in _inflight:
+            # Same content is already rendering, just record these rows too
+            _inflight[digest].extend(targets)
+            _pending.release()
+            return
+        _inflight[digest] = list(targets)
+    try:
+        future = _get_executor().submit(render_variants, source_path, digest)
+    except Exception:
+        _pending.release()
+        with _executor_lock:
+            _inflight.pop(digest, None)
+        logger.exception("Could not queue variants for %s", source_path)
+        return
+    future.add_done_callback(lambda f: _on_done(f, source_path, digest))
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _collect_jobs(db, force: bool):
+    jobs = {}
+    items = db.query(models.AlbumItem).filter(models.AlbumItem.media_type == "image")
+    for item in items:
+        if force or item.variants is None:
+            jobs.setdefault(item.file_path, []).append(("album", item.id))
+    for item in db.query(models.Media).filter(models.Media.media_type == "image"):
+        if force or item.variants is None or item.width is None:
+            jobs.setdefault(item.path, []).append((item.parent_type, item.parent_id))
+    return jobs
+
+
+def backfill(force: bool = False, workers: int = MAX_WORKERS):
+    if Image is None:
+        raise SystemExit("Pillow is not installed")
+    migrations.upgrade(engine)
+    gallery.convert_legacy(engine)
+    db = SessionLocal()
+    try:
+        jobs = {path: targets for path, targets in _collect_jobs(db, force).items() if os.path.exists(path)}
+        print(f"Deriving variants for {len(jobs)} images")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for path, targets in jobs.items():
+                digest = blobstore.digest_from_path(path) or _file_digest(path)
+                futures[pool.submit(render_variants, path, digest)] = (path, digest, targets)
+            for future in concurrent.futures.as_completed(futures):
+                path, digest, targets = futures[future]
+                try:
+                    variants, dimensions = future.result()
+                except Exception as exc:
+                    print(f"  failed {path}: {exc}")
+                    continue
+                record_variants(db, path, digest, variants, targets, dimensions)
+                db.commit()
+                print(f"  {path}: {len(variants)} variants")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-derive resized variants for images already in uploads/")
+    parser.add_argument("--force", action="store_true", help="re-render images that already have variants")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+    backfill(force=args.force, workers=args.workers)
@@ -0,0 +1,161 @@
+import argparse
+import logging
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, select, update
+
+import models, migrations, tags
+from database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+# Full recompute of every stored hot score, 0 disables the background pass. Votes
+# rescore their posts as they are flushed, this only repairs scores that drifted
+# (rankings edited outside the app, a changed HOT_DECAY_SECONDS).
+REFRESH_INTERVAL_SECONDS = float(os.getenv("FEED_REFRESH_INTERVAL", "3600"))
+BATCH_SIZE = int(os.getenv("FEED_REFRESH_BATCH", "1000"))
+
+# Keyset order per ?sort=, each backed by an index ending in id
+SORTS = {
+    "hot": [models.BlogPost.hot_score, models.BlogPost.id],
+    "top": [models.BlogPost.ranking, models.BlogPost.id],
+    "new": [models.BlogPost.created_at, models.BlogPost.id],
+}
+DEFAULT_SORT = "hot"
+# The same orders within one tag, from the keys copied onto its join rows
+TAG_SORTS = {
+    "hot": [models.BlogPostTag.hot_score, models.BlogPostTag.post_id],
+    "top": [models.BlogPostTag.ranking, models.BlogPostTag.post_id],
+    "new": [models.BlogPostTag.created_at, models.BlogPostTag.post_id],
+}
+
+_posts = models.BlogPost.__table__
+_set_score = (
+    update(_posts)
+    .where(_posts.c.id == bindparam("post_id"))
+    .values(hot_score=bindparam("score"))
+)
+# A vote flush may commit between a refresh's read and write, its score then stands
+_repair_score = _set_score.where(_posts.c.ranking.is_not_distinct_from(bindparam("read_ranking")))
+
+_stats_lock = threading.Lock()
+_stats = {"runs": 0, "posts_scanned": 0, "posts_rescored": 0, "errors": 0, "last_run_at": None, "last_run_seconds": 0.0}
+_stop = threading.Event()
+_thread = None
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def order(sort: str):
+    columns = SORTS.get(sort)
+    if columns is None:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORTS)}")
+    return columns
+
+
+def tagged(statement, tag: str, sort: str):
+    # Posts with a tag, paged by the join rows' index. Returns the statement and its order.
+    link = models.BlogPostTag
+    tag_id = select(models.Tag.id).where(models.Tag.name == tags.normalize(tag)).scalar_subquery()
+    return statement.join(link, link.post_id == models.BlogPost.id).where(link.tag_id == tag_id), TAG_SORTS[sort]
+
+
+def rescore(db, post_ids) -> int:
+    # Reads the rankings as written in this transaction, callers commit
+    post_ids = list(post_ids)
+    if not post_ids:
+        return 0
+    rows = db.execute(
+        select(_posts.c.id, _posts.c.ranking, _posts.c.created_at).where(_posts.c.id.in_(post_ids))
+    ).all()
+    if rows:
+        db.execute(_set_score, [
+            {"post_id": post_id, "score": models.hot_score(ranking, created_at)}
+            for post_id, ranking, created_at in rows
+        ])
+        tags.copy_sort_keys(db, [row.id for row in rows])
+    return len(rows)
+
+
+def refresh(missing_only: bool = False, stop=None) -> dict:
+    # Walks the posts in id order, a batch per transaction, and writes only the
+    # scores that differ from what the current formula gives
+    started = time.monotonic()
+    report = {"scanned": 0, "rescored": 0}
+    query = select(_posts.c.id, _posts.c.ranking, _posts.c.created_at, _posts.c.hot_score).order_by(_posts.c.id)
+    if missing_only:
+        query = query.where(_posts.c.hot_score.is_(None))
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while stop is None or not stop.is_set():
+            rows = db.execute(query.where(_posts.c.id > last_id).limit(BATCH_SIZE)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            changed = []
+            for row in rows:
+                score = models.hot_score(row.ranking, row.created_at)
+                if row.hot_score != score:
+                    changed.append({"post_id": row.id, "read_ranking": row.ranking, "score": score})
+            if changed:
+                db.execute(_repair_score, changed)
+                tags.copy_sort_keys(db, [row["post_id"] for row in changed])
+            db.commit()
+            report["scanned"] += len(rows)
+            report["rescored"] += len(changed)
+    finally:
+        db.close()
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["posts_scanned"] += report["scanned"]
+        _stats["posts_rescored"] += report["rescored"]
+        _stats["last_run_at"] = time.time()
+        _stats["last_run_seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+def _run():
+    while not _stop.wait(REFRESH_INTERVAL_SECONDS):
+        try:
+            report = refresh(stop=_stop)
+            if report["rescored"]:
+                logger.info("Feed refresh rescored %d of %d posts", report["rescored"], report["scanned"])
+        except Exception:
+            logger.exception("Feed refresh failed")
+            with _stats_lock:
+                _stats["errors"] += 1
+
+
+def start():
+    global _thread
+    if REFRESH_INTERVAL_SECONDS <= 0:
+        return
+    if _thread is None or not _thread.is_alive():
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="feed-refresh", daemon=True)
+        _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        # A pass in progress stops after its current batch
+        _thread.join(timeout=5)
+        _thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the stored hot scores of blog posts")
+    parser.add_argument("--missing-only", action="store_true", help="only score posts that have no score yet")
+    args = parser.parse_args()
+    migrations.upgrade(engine)
+    report = refresh(missing_only=args.missing_only)
+    print(f"Rescored {report['rescored']} of {report['scanned']} posts")
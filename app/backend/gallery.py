@@ -0,0 +1,125 @@
+import datetime
+import mimetypes
+import os
+from typing import List
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, null, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models, blobstore
+
+PARENTS = {
+    "journal": models.JournalEntry,
+    "blog": models.BlogPost,
+    "section": models.ProfileSection,
+}
+
+
+def _items(db: Session, parent_type: str, parent_id: int):
+    return db.query(models.Media).filter(models.Media.parent_type == parent_type, models.Media.parent_id == parent_id)
+
+
+def touch(db: Session, parent_type: str, parent_ids):
+    # Gallery changes don't write the parent row, but its ETag validators still have to move
+    model = PARENTS[parent_type]
+    db.execute(update(model).where(model.id.in_(list(parent_ids))).values(updated_at=datetime.datetime.utcnow()))
+
+
+def add(db: Session, parent_type: str, parent_id: int, blobs, owner_id: int) -> List[models.Media]:
+    # Appends rows, nothing else in the gallery is read or rewritten
+    start = db.query(func.max(models.Media.position)).filter(
+        models.Media.parent_type == parent_type, models.Media.parent_id == parent_id
+    ).scalar()
+    start = 0 if start is None else start + 1
+    items = [
+        models.Media(
+            owner_id=owner_id,
+            parent_type=parent_type,
+            parent_id=parent_id,
+            position=start + offset,
+            path=blob.path,
+            size=blob.size,
+            media_type=blob.media_type,
+            mime=mimetypes.guess_type(blob.path)[0],
+            sha256=blob.sha256,
+            variants=blob.variants,
+        )
+        for offset, blob in enumerate(blobs)
+    ]
+    db.add_all(items)
+    touch(db, parent_type, [parent_id])
+    return items
+
+
+def remove(db: Session, parent_type: str, parent_id: int, media_id: int, owner_id: int):
+    item = _items(db, parent_type, parent_id).filter(models.Media.id == media_id, models.Media.owner_id == owner_id).first()
+    if item is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    blobstore.release(db, item.path, owner_id, item.size)
+    db.delete(item)
+    touch(db, parent_type, [parent_id])
+
+
+def remove_all(db: Session, parent_type: str, parent_id: int, owner_id: int):
+    for item in _items(db, parent_type, parent_id):
+        blobstore.release(db, item.path, owner_id, item.size)
+    _items(db, parent_type, parent_id).delete(synchronize_session=False)
+
+
+def reorder(db: Session, parent_type: str, parent_id: int, media_ids: List[int]):
+    # media_ids first, in the given order, anything left out keeps its relative order after them
+    current = [media_id for (media_id,) in _items(db, parent_type, parent_id).order_by(models.Media.position, models.Media.id).with_entities(models.Media.id)]
+    unknown = set(media_ids) - set(current)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Not in this gallery: {', '.join(map(str, sorted(unknown)))}")
+    ordered = list(dict.fromkeys(media_ids)) + [m for m in current if m not in set(media_ids)]
+    if ordered == current:
+        return
+    # One statement for the whole gallery
+    positions = {media_id: position for position, media_id in enumerate(ordered)}
+    db.execute(
+        update(models.Media)
+        .where(models.Media.parent_type == parent_type, models.Media.parent_id == parent_id)
+        .values(position=case(positions, value=models.Media.id, else_=models.Media.position))
+    )
+    touch(db, parent_type, [parent_id])
+
+
+def convert_legacy(bind: Engine):
+    # One-off: galleries stored as JSON lists become media rows. Each parent row is
+    # claimed by clearing its JSON first, so workers starting together don't convert it twice.
+    with Session(bind) as db:
+        sizes = dict(db.query(models.MediaBlob.path, models.MediaBlob.size))
+        for parent_type, model in PARENTS.items():
+            pending = db.query(model.id).filter(model.legacy_gallery.isnot(None)).all()
+            for (parent_id,) in pending:
+                row = db.query(model.owner_id, model.legacy_gallery).filter(model.id == parent_id).first()
+                claimed = db.execute(
+                    update(model)
+                    .where(model.id == parent_id, model.legacy_gallery.isnot(None))
+                    .values(legacy_gallery=null())
+                ).rowcount
+                if not claimed or row is None:
+                    continue
+                for position, entry in enumerate(row.legacy_gallery or []):
+                    path = entry.get("url")
+                    if not path:
+                        continue
+                    size = sizes.get(path)
+                    if size is None:
+                        size = os.path.getsize(path) if os.path.exists(path) else 0
+                    db.add(models.Media(
+                        owner_id=row.owner_id,
+                        parent_type=parent_type,
+                        parent_id=parent_id,
+                        position=position,
+                        path=path,
+                        size=size,
+                        media_type=entry.get("type") or "image",
+                        mime=mimetypes.guess_type(path)[0],
+                        sha256=entry.get("hash") or blobstore.digest_from_path(path),
+                        variants=entry.get("variants"),
+                    ))
+                db.commit()
@@ -0,0 +1,113 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+MAX_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(MAX_WORKERS * 8)))
+RETRY_AFTER_SECONDS = 1
+BUSY_DETAIL = "Too many sign-ins in progress, please retry shortly."
+
+# Hashes made with a different cost are deprecated and upgraded on the next login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+_stats_lock = threading.Lock()
+_stats = {
+    "hash": {"count": 0, "total_ms": 0.0, "max_ms": 0.0},
+    "verify": {"count": 0, "total_ms": 0.0, "max_ms": 0.0},
+    "rejected": 0,
+}
+
+
+def _hash(password: str) -> str:
+    # Runs inside a worker process
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Separate processes so bcrypt never competes for the API's threadpool
+            _executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            # Hashes take a fraction of a second, let running ones finish
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def _record(op: str, elapsed_ms: float):
+    with _stats_lock:
+        entry = _stats[op]
+        entry["count"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+
+async def _run(op: str, fn, *args):
+    # Bounded admission: shed load with 503 instead of queueing without limit
+    if not _pending.acquire(blocking=False):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail=BUSY_DETAIL,
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    started = time.perf_counter()
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _pending.release()
+        raise
+
+    def done(_):
+        # The slot is held until the worker process is done, a cancelled
+        # request can't free it while its hash still occupies a worker
+        _pending.release()
+        _record(op, (time.perf_counter() - started) * 1000)
+
+    future.add_done_callback(done)
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", _hash, password)
+
+
+async def verify_password(password: str, hashed: str):
+    # Returns (verified, new_hash), new_hash is set when the stored hash needs upgrading
+    return await _run("verify", _verify_and_update, password, hashed)
+
+
+def stats() -> dict:
+    with _stats_lock:
+        result = {"rejected": _stats["rejected"], "max_pending": MAX_PENDING, "workers": MAX_WORKERS}
+        for op in ("hash", "verify"):
+            entry = _stats[op]
+            result[op] = dict(
+                entry,
+                avg_ms=round(entry["total_ms"] / entry["count"], 3) if entry["count"] else 0.0,
+            )
+        return result
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_MB = 100
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+MAX_FILES = 50
+MAX_FIELD_BYTES = 64 * 1024
+# Part headers, boundaries and plain fields on top of the file bytes
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, detail: str = "Upload exceeds the size limit."):
+        super().__init__(status_code=413, detail=detail)
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    media_type: str
+    sha256: str
+    filename: str
+
+
+@dataclass
+class ReceivedForm:
+    files: dict = field(default_factory=dict)  # field name -> [StoredUpload]
+    fields: dict = field(default_factory=dict)  # field name -> str
+
+    def uploads(self, name: str) -> list:
+        uploads = self.files.get(name)
+        if not uploads:
+            discard(self.all_uploads())
+            raise HTTPException(status_code=422, detail=f"Field '{name}' needs at least one file")
+        return uploads
+
+    def flag(self, name: str, default: bool = False) -> bool:
+        value = self.fields.get(name)
+        if value is None:
+            return default
+        return value.strip().lower() in ("1", "true", "on", "yes")
+
+    def all_uploads(self) -> list:
+        return [upload for uploads in self.files.values() for upload in uploads]
+
+
+def kind_of(content_type: Optional[str]) -> str:
+    return "video" if (content_type or "").startswith("video") else "image"
+
+
+def safe_filename(filename: Optional[str]) -> str:
+    # Never trust client paths, keep only the last component
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    return name or "upload"
+
+
+def discard(uploads):
+    # Temp files the caller did not move into place
+    for upload in uploads:
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
+
+
+def form_schema(file_field: str, multiple: bool = False, **fields) -> dict:
+    # OpenAPI requestBody for routes that parse their own multipart body
+    binary = {"type": "string", "format": "binary"}
+    properties = {file_field: {"type": "array", "items": binary} if multiple else binary, **fields}
+    schema = {"type": "object", "required": [file_field], "properties": properties}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": schema}}}}
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+def _stream_to_disk(src, directory: str, max_bytes: Optional[int], too_large_detail: str):
+    os.makedirs(directory, exist_ok=True)
+    # Temp file lives in the store so the final rename stays on one filesystem
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ingest-", suffix=".part")
+    size = 0
+    digest = hashlib.sha256()
+    started = time.perf_counter()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            src.seek(0)
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(too_large_detail)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    metrics.observe_upload(size, time.perf_counter() - started)
+    return tmp_path, size, digest.hexdigest()
+
+
+@dataclass
+class _Part:
+    name: str
+    out: Optional[object] = None  # temp file for file parts, None for plain fields
+    path: Optional[str] = None
+    filename: str = ""
+    content_type: str = ""
+    size: int = 0
+    digest: Optional[object] = None
+    data: bytearray = field(default_factory=bytearray)
+    started: float = 0.0
+
+
+class _FormWriter:
+    # python_multipart callbacks, file parts go straight to temp files in the store
+    # with a byte counter that aborts the request as soon as a file runs over
+    def __init__(self, directory: str, max_files: int, max_bytes: Optional[int], too_large_detail: str):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.too_large_detail = too_large_detail
+        self.form = ReceivedForm()
+        self.ended = False
+        self._part = None
+        self._headers = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._file_count = 0
+        self._temp_paths = []
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_end": self.on_end,
+        }
+
+    def on_part_begin(self):
+        self._part = None
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise HTTPException(status_code=400, detail="Form part without a field name")
+        part = _Part(name=_decode(options[b"name"]))
+        if b"filename" in options:
+            self._file_count += 1
+            if self._file_count > self.max_files:
+                raise HTTPException(status_code=400, detail=f"At most {self.max_files} files per upload")
+            fd, part.path = tempfile.mkstemp(dir=self.directory, prefix=".ingest-", suffix=".part")
+            self._temp_paths.append(part.path)
+            part.out = os.fdopen(fd, "wb")
+            part.filename = safe_filename(_decode(options[b"filename"]))
+            part.content_type = _decode(self._headers.get(b"content-type", b""))
+            part.digest = hashlib.sha256()
+            part.started = time.perf_counter()
+        self._part = part
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        part = self._part
+        chunk = data[start:end]
+        part.size += len(chunk)
+        if part.out is None:
+            if part.size > MAX_FIELD_BYTES:
+                raise HTTPException(status_code=400, detail=f"Form field '{part.name}' is too long")
+            part.data += chunk
+            return
+        if self.max_bytes is not None and part.size > self.max_bytes:
+            raise UploadTooLarge(self.too_large_detail)
+        part.digest.update(chunk)
+        part.out.write(chunk)
+
+    def on_part_end(self):
+        part, self._part = self._part, None
+        if part.out is None:
+            self.form.fields[part.name] = _decode(bytes(part.data))
+            return
+        part.out.close()
+        metrics.observe_upload(part.size, time.perf_counter() - part.started)
+        self.form.files.setdefault(part.name, []).append(StoredUpload(
+            path=part.path,
+            size=part.size,
+            media_type=kind_of(part.content_type),
+            sha256=part.digest.hexdigest(),
+            filename=part.filename,
+        ))
+
+    def on_end(self):
+        self.ended = True
+
+    def close(self):
+        # Failed request, nothing received is kept
+        if self._part is not None and self._part.out is not None:
+            self._part.out.close()
+        for path in self._temp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def receive_form(
+    request: Request,
+    directory: str,
+    max_files: int = MAX_FILES,
+    max_bytes: Optional[int] = MAX_UPLOAD_BYTES,
+    too_large_detail: str = f"File exceeds the {MAX_UPLOAD_MB}MB upload limit.",
+) -> ReceivedForm:
+    # Parses the multipart body as it arrives, nothing is spooled first. Files land
+    # in temp files in the directory, the caller renames or discards them.
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+    limit = None if max_bytes is None else max_files * max_bytes + FORM_OVERHEAD_BYTES
+    declared = request.headers.get("content-length", "")
+    if limit is not None and declared.isdigit() and int(declared) > limit:
+        # Refused before any of the body is read
+        raise UploadTooLarge(too_large_detail)
+
+    await run_in_threadpool(os.makedirs, directory, exist_ok=True)
+    writer = _FormWriter(directory, max_files, max_bytes, too_large_detail)
+    parser = MultipartParser(params[b"boundary"], writer.callbacks())
+    received = 0
+    pending = []
+    pending_bytes = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if limit is not None and received > limit:
+                raise UploadTooLarge(too_large_detail)
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            # Disk writes and hashing run in a worker thread, a chunk at a time
+            if pending_bytes >= CHUNK_SIZE:
+                await run_in_threadpool(parser.write, b"".join(pending))
+                pending, pending_bytes = [], 0
+        if pending:
+            await run_in_threadpool(parser.write, b"".join(pending))
+        if not writer.ended:
+            raise HTTPException(status_code=400, detail="Incomplete multipart body")
+    except MultipartParseError:
+        await run_in_threadpool(writer.close)
+        raise HTTPException(status_code=400, detail="Malformed multipart body")
+    except BaseException:
+        await run_in_threadpool(writer.close)
+        raise
+    return writer.form
+
+
+def receive_stream(
+    src,
+    directory: str,
+    filename: str,
+    media_type: str,
+    max_bytes: Optional[int] = MAX_UPLOAD_BYTES,
+    too_large_detail: str = f"File exceeds the {MAX_UPLOAD_MB}MB upload limit.",
+) -> StoredUpload:
+    # Copies any readable file object into a temp file, called from worker threads
+    tmp_path, size, sha256 = _stream_to_disk(src, directory, max_bytes, too_large_detail)
+    return StoredUpload(path=tmp_path, size=size, media_type=media_type, sha256=sha256, filename=safe_filename(filename))
@@ -0,0 +1,152 @@
+import argparse
+import datetime
+import os
+from collections import defaultdict
+
+from fastapi import HTTPException
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+import models, migrations
+from database import SessionLocal, engine, dialect_insert
+
+GLOBAL = 0
+MAX_APP_SIZE_MB = int(os.getenv("MAX_APP_SIZE_MB", "100"))
+MAX_APP_SIZE_BYTES = MAX_APP_SIZE_MB * 1024 * 1024
+QUOTA_DETAIL = f"Storage limit of {MAX_APP_SIZE_MB}MB reached."
+
+
+def _ensure_row(db: Session, user_id: int):
+    stmt = dialect_insert(db, models.StorageUsage).values(
+        user_id=user_id, bytes_used=0, updated_at=datetime.datetime.utcnow()
+    )
+    db.execute(stmt.on_conflict_do_nothing(index_elements=[models.StorageUsage.user_id]))
+
+
+def usage(db: Session, user_id: int = GLOBAL) -> int:
+    used = db.query(models.StorageUsage.bytes_used).filter(models.StorageUsage.user_id == user_id).scalar()
+    return used or 0
+
+
+def has_room(db: Session) -> bool:
+    return usage(db) < MAX_APP_SIZE_BYTES
+
+
+def reserve(db: Session, nbytes: int, cap: int = MAX_APP_SIZE_BYTES) -> bool:
+    # Single conditional UPDATE, so concurrent workers can never overshoot the cap
+    _ensure_row(db, GLOBAL)
+    result = db.execute(
+        update(models.StorageUsage)
+        .where(
+            models.StorageUsage.user_id == GLOBAL,
+            models.StorageUsage.bytes_used + nbytes <= cap,
+        )
+        .values(
+            bytes_used=models.StorageUsage.bytes_used + nbytes,
+            updated_at=datetime.datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def reserve_or_raise(db: Session, nbytes: int):
+    if not reserve(db, nbytes):
+        raise HTTPException(status_code=400, detail=QUOTA_DETAIL)
+
+
+def charge(db: Session, user_id: int, nbytes: int):
+    _ensure_row(db, user_id)
+    db.execute(
+        update(models.StorageUsage)
+        .where(models.StorageUsage.user_id == user_id)
+        .values(
+            bytes_used=models.StorageUsage.bytes_used + nbytes,
+            updated_at=datetime.datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def credit(db: Session, user_id: int, nbytes: int):
+    used = models.StorageUsage.bytes_used
+    db.execute(
+        update(models.StorageUsage)
+        .where(models.StorageUsage.user_id == user_id)
+        .values(
+            bytes_used=case((used > nbytes, used - nbytes), else_=0),
+            updated_at=datetime.datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def compute_usage(db: Session):
+    # Full recount, only used to seed or repair the ledger
+    blobs = db.query(models.MediaBlob).all()
+    blob_sizes = {b.path: b.size or 0 for b in blobs}
+    per_user = defaultdict(int)
+    legacy = {}
+
+    def add(owner_id, path, size=None):
+        if not path:
+            return
+        if path in blob_sizes:
+            size = blob_sizes[path]
+        elif size is None:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+        per_user[owner_id] += size
+        if path not in blob_sizes:
+            legacy[path] = size
+
+    for item in db.query(models.AlbumItem):
+        add(item.owner_id, item.file_path, item.file_size)
+    for owner_id, path, size in db.query(models.Media.owner_id, models.Media.path, models.Media.size):
+        add(owner_id, path, size)
+    for user in db.query(models.User).filter(models.User.profile_picture.isnot(None)):
+        add(user.id, user.profile_picture)
+
+    total = sum(b.size or 0 for b in blobs if b.ref_count > 0) + sum(legacy.values())
+    return total, dict(per_user)
+
+
+def rebuild(db: Session):
+    total, per_user = compute_usage(db)
+    now = datetime.datetime.utcnow()
+    db.query(models.StorageUsage).delete()
+    db.add(models.StorageUsage(user_id=GLOBAL, bytes_used=total, updated_at=now))
+    for user_id, nbytes in per_user.items():
+        db.add(models.StorageUsage(user_id=user_id, bytes_used=nbytes, updated_at=now))
+    db.commit()
+    return total, per_user
+
+
+def bootstrap():
+    # Seed the ledger once for databases created before it existed
+    db = SessionLocal()
+    try:
+        if db.get(models.StorageUsage, GLOBAL) is None:
+            total, per_user = compute_usage(db)
+            rows = [{"user_id": GLOBAL, "bytes_used": total}]
+            rows += [{"user_id": u, "bytes_used": n} for u, n in per_user.items()]
+            now = datetime.datetime.utcnow()
+            for row in rows:
+                stmt = dialect_insert(db, models.StorageUsage).values(updated_at=now, **row)
+                db.execute(stmt.on_conflict_do_nothing(index_elements=[models.StorageUsage.user_id]))
+            db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recount storage usage from album items, galleries and profile pictures")
+    parser.parse_args()
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        total, per_user = rebuild(db)
+        print(f"global: {total} bytes")
+        for user_id, nbytes in sorted(per_user.items()):
+            print(f"user {user_id}: {nbytes} bytes")
+    finally:
+        db.close()
@@ -1,14 +1,31 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from database import engine, Base
-from routers import journal, album, blog, profile, auth, dashboard
+from database import engine
+import database
+from routers import journal, album, blog, profile, auth, dashboard, search as search_router, media as media_router, archive as archive_router, metrics as metrics_router, uploads as uploads_router, public_profile
 from fastapi.middleware.cors import CORSMiddleware
+import migrations, derivatives, feed, gallery, hashing, ledger, media_gc, metrics, pagination, principals, profile_cache, resumable, tags, votes, search
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Create tables and add any columns/indexes introduced since
+migrations.upgrade(engine)
+gallery.convert_legacy(engine)
+feed.refresh(missing_only=True)  # posts from before hot scores existed
+tags.backfill(engine)
+ledger.bootstrap()
+search.ensure_index(engine)
 
 app = FastAPI(title="Private Space App")
 
+# Per-route latency, SQL statements and timings, exported at /metrics
+metrics.instrument(engine, database.read_engine)
+if database.ASYNC_DB:
+    metrics.instrument(database.async_engine.sync_engine, database.async_read_engine.sync_engine)
+metrics.register("principal_cache", principals.stats)
+metrics.register("profile_cache", profile_cache.stats)
+metrics.register("password_hashing", hashing.stats)
+metrics.register("media_gc", media_gc.stats)
+metrics.register("feed_refresh", feed.stats)
+metrics.register("resumable_uploads", resumable.stats)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -16,7 +33,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, "Location", "Upload-Offset", "Upload-Length", "Upload-Expires"],
 )
+app.add_middleware(metrics.RequestMetrics)
 
 # Include Routers
 app.include_router(auth.router)
@@ -24,10 +43,38 @@ app.include_router(journal.router)
 app.include_router(album.router)
 app.include_router(blog.router)
 app.include_router(profile.router)
+app.include_router(public_profile.router)
 app.include_router(dashboard.router)
+app.include_router(search_router.router)
+app.include_router(archive_router.router)
+app.include_router(uploads_router.router)
+app.include_router(metrics_router.router)
+# Uploads are only reachable through signed /media URLs, which enforce is_public
+app.include_router(media_router.router)
+
+@app.on_event("startup")
+def start_workers():
+    votes.start()
+    media_gc.start()
+    feed.start()
+    resumable.start()
+
+@app.on_event("startup")
+async def start_monitors():
+    metrics.start()
+
+@app.on_event("shutdown")
+async def stop_monitors():
+    metrics.stop()
 
-# Mount Static Files (Uploads)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+@app.on_event("shutdown")
+def shutdown_workers():
+    votes.stop()
+    media_gc.stop()
+    feed.stop()
+    resumable.stop()
+    derivatives.shutdown()
+    hashing.shutdown()
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,323 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import delete
+
+import models, blobstore, derivatives, gallery, migrations
+from database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = "uploads"
+STATE_FILE = os.getenv("MEDIA_GC_STATE", f"{UPLOAD_ROOT}/.gc_state.json")
+STATE_NAME = os.path.basename(STATE_FILE)
+# Files younger than this are never collected, uploads place their file before the row commits
+GRACE_SECONDS = int(os.getenv("MEDIA_GC_GRACE", "3600"))
+INTERVAL_SECONDS = float(os.getenv("MEDIA_GC_INTERVAL", str(6 * 3600)))  # 0 disables the background collector
+FILES_PER_SECOND = float(os.getenv("MEDIA_GC_FILES_PER_SEC", "200"))
+BATCH_SIZE = int(os.getenv("MEDIA_GC_BATCH", "500"))  # files checked against the database per query
+# Files are renamed to this prefix before they are unlinked, leftovers of a crash are collected like any orphan
+QUARANTINE_PREFIX = ".gc-"
+
+GALLERY_MODELS = tuple(gallery.PARENTS.values())
+
+_stats_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "files_scanned": 0,
+    "files_deleted": 0,
+    "bytes_reclaimed": 0,
+    "skipped_in_use": 0,
+    "errors": 0,
+    "last_run_at": None,
+    "last_run_seconds": 0.0,
+}
+_stop = threading.Event()
+_thread = None
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(**counts):
+    with _stats_lock:
+        for key, value in counts.items():
+            _stats[key] += value
+
+
+def _load_state() -> dict:
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(cursor):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + ".part"
+    with open(tmp_path, "w") as f:
+        json.dump({"cursor": cursor, "saved_at": time.time()}, f)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def _variants(rows) -> set:
+    return {path for (variants,) in rows for path in (variants or {}).values()}
+
+
+def legacy_paths(db) -> set:
+    # References only held in JSON on rows from before the blob store: galleries not
+    # yet converted to media rows and variants of legacy uploads. A fixed set, new
+    # uploads never add to it.
+    live = set()
+    for model in GALLERY_MODELS:
+        for (entries,) in db.query(model.legacy_gallery).filter(model.legacy_gallery.isnot(None)):
+            for entry in entries or []:
+                live.add(entry.get("url"))
+                live.update((entry.get("variants") or {}).values())
+    legacy_album = db.query(models.AlbumItem.variants).filter(
+        models.AlbumItem.variants.isnot(None), ~models.AlbumItem.file_path.startswith(blobstore.BLOB_DIR + "/")
+    )
+    live |= _variants(legacy_album)
+    live |= _variants(db.query(models.Media.variants).filter(models.Media.variants.isnot(None), models.Media.sha256.is_(None)))
+    live.discard(None)
+    return live
+
+
+def _variant_digest(path: str):
+    # variants/ab/<digest>_<width>.webp, named after the original's content
+    if not path.startswith(derivatives.VARIANT_DIR + "/"):
+        return None
+    digest = os.path.basename(path).split("_", 1)[0]
+    return digest if len(digest) == 64 else None
+
+
+def live_among(db, paths) -> set:
+    # Which of these paths the database still points at, one indexed IN query per
+    # path column instead of holding every live path in memory
+    paths = list(paths)
+    if not paths:
+        return set()
+    live = set()
+    for column, *criteria in (
+        (models.AlbumItem.file_path,),
+        (models.Media.path,),
+        (models.User.profile_picture,),
+        # Partial files of resumable uploads, expired ones are removed with their session
+        (models.UploadSession.path,),
+        (models.MediaBlob.path, models.MediaBlob.ref_count > 0),
+    ):
+        live.update(path for (path,) in db.query(column).filter(column.in_(paths), *criteria))
+    # Variants are found through the digest of the content they were made from
+    digests = {digest for digest in map(_variant_digest, paths) if digest is not None}
+    if digests:
+        blobs = db.query(models.MediaBlob.variants).filter(models.MediaBlob.sha256.in_(digests), models.MediaBlob.ref_count > 0)
+        live |= _variants(blobs)
+        live |= _variants(db.query(models.Media.variants).filter(models.Media.sha256.in_(digests)))
+        blob_paths = db.query(models.MediaBlob.path).filter(models.MediaBlob.sha256.in_(digests))
+        live |= _variants(db.query(models.AlbumItem.variants).filter(models.AlbumItem.file_path.in_(blob_paths.scalar_subquery())))
+    return live & set(paths)
+
+
+def _walk(root: str, after=None):
+    # Sorted depth first, so a cursor (the last path handled) resumes a pass where it stopped.
+    # Paths compare by components, which is the order this walk produces.
+    after_parts = tuple(after.split("/")) if after else None
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.name.startswith(STATE_NAME):
+            continue
+        path = f"{root}/{entry.name}"
+        parts = tuple(path.split("/"))
+        if entry.is_dir(follow_symlinks=False):
+            if after_parts is None or after_parts[:len(parts)] == parts:
+                yield from _walk(path, after)
+            elif parts > after_parts:
+                yield from _walk(path)
+        elif after_parts is None or parts > after_parts:
+            yield path
+
+
+def _restore(quarantined: str, path: str):
+    # Back in place, unless an upload already wrote the same content there
+    if os.path.exists(path):
+        os.remove(quarantined)
+    else:
+        os.rename(quarantined, path)
+
+
+def _remove(db, path: str, first_stat) -> bool:
+    # False when the file turned out to be in use after all. The file is moved aside
+    # before the last checks: an upload placing the same content meanwhile writes a
+    # new file at path, which the unlink below can't reach.
+    quarantined = f"{os.path.dirname(path)}/{QUARANTINE_PREFIX}{os.path.basename(path)}"
+    os.rename(path, quarantined)
+    try:
+        current = os.stat(quarantined)
+        if (current.st_ino, current.st_mtime_ns) != (first_stat.st_ino, first_stat.st_mtime_ns):
+            # An upload of the same content put the file back since it was checked
+            _restore(quarantined, path)
+            return False
+        digest = blobstore.digest_from_path(path)
+        if digest is not None:
+            blob = db.get(models.MediaBlob, digest)
+            if blob is not None and blob.path == path:
+                deleted = db.execute(
+                    delete(models.MediaBlob).where(models.MediaBlob.sha256 == digest, models.MediaBlob.ref_count == 0)
+                ).rowcount
+                db.commit()
+                if not deleted:
+                    # Referenced again since its batch was checked
+                    _restore(quarantined, path)
+                    return False
+        referenced = live_among(db, [path])
+        db.commit()
+        if referenced:
+            _restore(quarantined, path)
+            return False
+    except BaseException:
+        _restore(quarantined, path)
+        raise
+    os.remove(quarantined)
+    return True
+
+
+def collect(dry_run: bool = False, max_files=None, files_per_second=None, stop=None, grace=GRACE_SECONDS) -> dict:
+    # One pass over uploads/. Resumes from the saved cursor unless dry_run, which
+    # always reports on the whole tree and changes nothing.
+    started = time.monotonic()
+    cutoff = time.time() - grace
+    cursor = None if dry_run else _load_state().get("cursor")
+    report = {"scanned": 0, "orphans": 0, "bytes": 0, "skipped_in_use": 0, "errors": 0, "complete": False, "candidates": []}
+    db = SessionLocal()
+    try:
+        legacy = legacy_paths(db)
+        db.commit()
+        walker = _walk(UPLOAD_ROOT, cursor)
+        last = cursor
+        while True:
+            room = BATCH_SIZE if max_files is None else min(BATCH_SIZE, max_files - report["scanned"])
+            if (stop is not None and stop.is_set()) or room <= 0:
+                break
+            # Files in walk order, so a batch mostly shares a directory
+            batch = list(itertools.islice(walker, room))
+            if not batch:
+                report["complete"] = True
+                break
+            _collect_batch(db, batch, legacy, cutoff, dry_run, files_per_second, report)
+            report["scanned"] += len(batch)
+            last = batch[-1]
+            if not dry_run:
+                _save_state(last)
+        if not dry_run:
+            _save_state(None if report["complete"] else last)
+    finally:
+        db.close()
+    if not dry_run:
+        with _stats_lock:
+            _stats["runs"] += 1
+            _stats["last_run_at"] = time.time()
+            _stats["last_run_seconds"] = round(time.monotonic() - started, 3)
+        _record(
+            files_scanned=report["scanned"],
+            files_deleted=report["orphans"],
+            bytes_reclaimed=report["bytes"],
+            skipped_in_use=report["skipped_in_use"],
+            errors=report["errors"],
+        )
+    return report
+
+
+def _collect_batch(db, batch, legacy, cutoff, dry_run, files_per_second, report):
+    candidates = []
+    for path in batch:
+        if files_per_second:
+            # Paces stats and unlinks so a pass never saturates the disk
+            time.sleep(1 / files_per_second)
+        if path in legacy:
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime <= cutoff:
+            candidates.append((path, stat))
+    live = live_among(db, [path for path, _ in candidates])
+    db.commit()
+    for path, stat in candidates:
+        if path in live:
+            continue
+        if dry_run:
+            report["orphans"] += 1
+            report["bytes"] += stat.st_size
+            report["candidates"].append((path, stat.st_size))
+            continue
+        try:
+            removed = _remove(db, path, stat)
+        except FileNotFoundError:
+            continue
+        except Exception:
+            db.rollback()
+            logger.exception("Could not collect %s", path)
+            report["errors"] += 1
+            continue
+        if removed:
+            report["orphans"] += 1
+            report["bytes"] += stat.st_size
+        else:
+            report["skipped_in_use"] += 1
+
+
+def _run():
+    while not _stop.wait(INTERVAL_SECONDS):
+        try:
+            report = collect(files_per_second=FILES_PER_SECOND, stop=_stop)
+            if report["orphans"]:
+                logger.info("Media GC removed %d files, %d bytes", report["orphans"], report["bytes"])
+        except Exception:
+            logger.exception("Media GC pass failed")
+            _record(errors=1)
+
+
+def start():
+    global _thread
+    if INTERVAL_SECONDS <= 0:
+        return
+    if _thread is None or not _thread.is_alive():
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="media-gc", daemon=True)
+        _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        # A pass in progress saves its cursor and stops after its current batch
+        _thread.join(timeout=5)
+        _thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove files under uploads/ that nothing references any more")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be removed, change nothing")
+    parser.add_argument("--max-files", type=int, default=None, help="stop after this many files, the next run resumes")
+    parser.add_argument("--files-per-sec", type=float, default=None, help="throttle the scan")
+    parser.add_argument("--grace", type=int, default=GRACE_SECONDS, help="skip files modified within this many seconds")
+    args = parser.parse_args()
+    migrations.upgrade(engine)
+    gallery.convert_legacy(engine)
+    report = collect(dry_run=args.dry_run, max_files=args.max_files, files_per_second=args.files_per_sec, grace=args.grace)
+    for path, size in report["candidates"]:
+        print(f"  {path} ({size} bytes)")
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {report['orphans']} of {report['scanned']} files, {report['bytes']} bytes"
+          + ("" if report["complete"] else " (partial pass, rerun to continue)"))
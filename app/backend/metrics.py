@@ -0,0 +1,267 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+import anyio.to_thread
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+import profiling
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+LAG_INTERVAL_SECONDS = float(os.getenv("METRICS_LAG_INTERVAL", "1"))
+# When set, GET /metrics needs "Authorization: Bearer <token>". Without a token the
+# endpoint is a 404 unless METRICS_PUBLIC=1 opens it to anyone who can reach it.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC") == "1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+RATE_BUCKETS = (1e5, 1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9)
+
+_lock = threading.Lock()
+_registry = []
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with _lock:
+            self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        names = self.labels + ("le",)
+        for labels, entry in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, entry):
+                yield f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {count}"
+            yield f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {entry[-1]}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(entry[-2])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {entry[-1]}"
+
+
+REQUESTS = Counter("http_requests_total", "Requests by route and status", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being served")
+REQUEST_STATEMENTS = Histogram("http_request_sql_statements", "SQL statements per request", ("method", "route"), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram("http_request_sql_seconds", "Time in SQL per request", ("method", "route"))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Latency of single SQL statements")
+SLOW_QUERIES = Counter("db_slow_queries_total", f"Statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g}ms)", ("route",))
+UPLOAD_BYTES = Counter("upload_bytes_total", "Upload bytes written to disk")
+UPLOAD_SECONDS = Counter("upload_write_seconds_total", "Time spent streaming uploads to disk")
+UPLOAD_RATE = Histogram("upload_bytes_per_second", "Disk write throughput per upload", buckets=RATE_BUCKETS)
+LOOP_LAG = Gauge("event_loop_lag_seconds", "How late the last event loop wake-up was")
+LOOP_LAG_SECONDS = Histogram("event_loop_lag_seconds_distribution", "Event loop wake-up lateness")
+THREADPOOL_WAIT = Gauge("threadpool_wait_seconds", "How long the last probe waited for a threadpool slot")
+THREADPOOL_BUSY = Gauge("threadpool_busy_threads", "Threadpool slots in use")
+THREADPOOL_SIZE = Gauge("threadpool_size", "Threadpool capacity")
+
+
+def register(name: str, collect: Callable[[], dict]):
+    # Numeric fields of a module's stats() dict are exported as app_<name>_<field> gauges
+    _collectors[name] = collect
+
+
+def _flatten(prefix, stats):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(f"{prefix}_{key}", value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}_{key}", value
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    for name, collect in _collectors.items():
+        try:
+            stats = collect()
+        except Exception:
+            logger.exception("Metrics collector %s failed", name)
+            continue
+        for key, value in _flatten(f"app_{name}", stats):
+            lines.append(f"# TYPE {key} gauge")
+            lines.append(f"{key} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _Usage:
+    __slots__ = ("scope", "statements", "sql_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the scope, so the label is its template
+        return getattr(self.scope.get("route"), "path", None) or "unmatched"
+
+
+# Shared by the request's threadpool calls, they run in a copy of its context
+_usage = contextvars.ContextVar("request_usage", default=None)
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    QUERY_SECONDS.observe(elapsed)
+    usage = _usage.get()
+    if usage is not None:
+        usage.statements += 1
+        usage.sql_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = usage.route if usage is not None else "background"
+        SLOW_QUERIES.inc(route)
+        logger.warning("Slow query (%.1fms) on %s: %s", elapsed * 1000, route, " ".join(statement.split())[:2000])
+
+
+def _on_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument(*engines):
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor)
+        event.listen(engine, "after_cursor_execute", _after_cursor)
+        event.listen(engine, "handle_error", _on_error)
+
+
+def observe_upload(nbytes: int, seconds: float):
+    UPLOAD_BYTES.inc(amount=nbytes)
+    UPLOAD_SECONDS.inc(amount=seconds)
+    if seconds > 0:
+        UPLOAD_RATE.observe(nbytes / seconds)
+
+
+class RequestMetrics:
+    # Outermost ASGI middleware: latency, status and SQL usage per route template
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        usage = _Usage(scope)
+        token = _usage.set(usage)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        run = profiling.start(scope)
+        started = time.perf_counter()
+        IN_FLIGHT.inc(amount=1)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.inc(amount=-1)
+            _usage.reset(token)
+            route = usage.route
+            REQUESTS.inc(scope["method"], route, str(status[0]))
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route)
+            REQUEST_STATEMENTS.observe(usage.statements, scope["method"], route)
+            REQUEST_SQL_SECONDS.observe(usage.sql_seconds, scope["method"], route)
+            if run is not None:
+                await profiling.finish(run, elapsed, scope["method"], route)
+
+
+_monitor = None
+
+
+async def _watch_lag():
+    loop = asyncio.get_running_loop()
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    while True:
+        expected = loop.time() + LAG_INTERVAL_SECONDS
+        await asyncio.sleep(LAG_INTERVAL_SECONDS)
+        lag = max(loop.time() - expected, 0.0)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_SECONDS.observe(lag)
+        THREADPOOL_SIZE.set(limiter.total_tokens)
+        THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+        queued = time.perf_counter()
+        THREADPOOL_WAIT.set(await run_in_threadpool(time.perf_counter) - queued)
+
+
+def start():
+    # Called from an async startup hook, the probe runs on the serving loop
+    global _monitor
+    if LAG_INTERVAL_SECONDS > 0 and (_monitor is None or _monitor.done()):
+        _monitor = asyncio.get_running_loop().create_task(_watch_lag())
+
+
+def stop():
+    global _monitor
+    if _monitor is not None:
+        _monitor.cancel()
+        _monitor = None
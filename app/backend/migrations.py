@@ -0,0 +1,44 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from database import Base
+
+
+def _add_missing_columns(conn, table, existing):
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=conn.dialect)
+        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+        added.append(column.name)
+    return added
+
+
+def _backfill(conn, table, added):
+    # Rows that predate a column get a value from their own data where there is one
+    if "updated_at" in added:
+        source = 'COALESCE("created_at", CURRENT_TIMESTAMP)' if "created_at" in table.columns else "CURRENT_TIMESTAMP"
+        conn.execute(text(f'UPDATE {table.name} SET "updated_at" = {source} WHERE "updated_at" IS NULL'))
+    if "version" in added:
+        conn.execute(text(f'UPDATE {table.name} SET "version" = 1 WHERE "version" IS NULL'))
+
+
+def _add_missing_indexes(conn, table, existing):
+    for index in table.indexes:
+        if index.name not in existing:
+            conn.execute(CreateIndex(index))
+
+
+def upgrade(engine: Engine):
+    # create_all only creates missing tables, this adds the columns and indexes
+    # that were introduced after a table was first created
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            _backfill(conn, table, _add_missing_columns(conn, table, columns))
+            _add_missing_indexes(conn, table, indexes)
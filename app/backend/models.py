@@ -1,16 +1,42 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, JSON, Float, Index, literal_column
 from sqlalchemy.orm import relationship
 import datetime
+import math
 from database import Base
 
-class User(Base):
+def srcset_for(variants):
+    if not variants:
+        return None
+    return ", ".join(f"{url} {width}w" for width, url in sorted(variants.items(), key=lambda v: int(v[0])))
+
+HOT_EPOCH = datetime.datetime(2020, 1, 1)
+HOT_DECAY_SECONDS = 45000  # a post needs 10x the votes to rank level with one this much newer
+
+def hot_score(ranking, created_at):
+    # log10 of the votes plus a bonus that grows with creation time. Newer posts
+    # outrank older ones without any row being rewritten as time passes.
+    ranking = ranking or 0
+    sign = (ranking > 0) - (ranking < 0)
+    age = ((created_at or datetime.datetime.utcnow()) - HOT_EPOCH).total_seconds()
+    return sign * math.log10(max(abs(ranking), 1)) + age / HOT_DECAY_SECONDS
+
+def _default_hot_score(context):
+    params = context.get_current_parameters()
+    return hot_score(params.get("ranking"), params.get("created_at"))
+
+class Versioned:
+    # Validators for conditional GETs, maintained by every ORM and Core UPDATE
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    version = Column(Integer, default=1, onupdate=literal_column("COALESCE(version, 0) + 1"))
+
+class User(Versioned, Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    profile_picture = Column(String, nullable=True) # Path to pfp
+    profile_picture = Column(String, nullable=True, index=True) # Path to pfp
     profile_theme = Column(JSON, nullable=True) # Global profile theme
     
     journals = relationship("JournalEntry", back_populates="owner")
@@ -19,58 +45,230 @@ class User(Base):
     profile_sections = relationship("ProfileSection", back_populates="owner")
 
 
-class JournalEntry(Base):
+class JournalEntry(Versioned, Base):
     __tablename__ = "journal_entries"
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     content = Column(Text)
-    media_gallery = Column(JSON, nullable=True) # List of {url, type}
+    legacy_gallery = Column("media_gallery", JSON, nullable=True) # Pre-media-table galleries, converted on startup
     is_public = Column(Boolean, default=False)
     design_config = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="journals")
+    media_items = relationship(
+        "Media",
+        primaryjoin="and_(foreign(Media.parent_id) == JournalEntry.id, Media.parent_type == 'journal')",
+        order_by="[Media.position, Media.id]",
+        viewonly=True,
+    )
+
+    __table_args__ = (
+        Index("ix_journal_entries_owner_created", "owner_id", "created_at", "id"),
+        Index("ix_journal_entries_owner_updated", "owner_id", "updated_at"),
+    )
 
-class AlbumItem(Base):
+    @property
+    def media_gallery(self):
+        return [item.gallery_entry() for item in self.media_items]
+
+class AlbumItem(Versioned, Base):
     __tablename__ = "album_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    file_path = Column(String)
+    file_path = Column(String, index=True)
+    filename = Column(String, nullable=True) # Name the file was uploaded under
     file_size = Column(Integer)
     media_type = Column(String)
     is_public = Column(Boolean, default=False)
     design_config = Column(JSON, nullable=True)
+    variants = Column(JSON, nullable=True) # {width: url} of resized copies
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="album_items")
 
-class BlogPost(Base):
+    __table_args__ = (
+        Index("ix_album_items_owner_id_id", "owner_id", "id"),
+        Index("ix_album_items_public_id", "is_public", "id"),
+        Index("ix_album_items_owner_updated", "owner_id", "updated_at"),
+        Index("ix_album_items_public_updated", "is_public", "updated_at"),
+    )
+
+    @property
+    def srcset(self):
+        return srcset_for(self.variants)
+
+class BlogPost(Versioned, Base):
     __tablename__ = "blog_posts"
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     content = Column(Text)
     tags = Column(String)
-    media_gallery = Column(JSON, nullable=True) # List of {url, type}
+    legacy_gallery = Column("media_gallery", JSON, nullable=True) # Pre-media-table galleries, converted on startup
     ranking = Column(Integer, default=0)
     design_config = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    hot_score = Column(Float, default=_default_hot_score) # Kept current by feed.rescore and feed.refresh
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="blog_posts")
+    media_items = relationship(
+        "Media",
+        primaryjoin="and_(foreign(Media.parent_id) == BlogPost.id, Media.parent_type == 'blog')",
+        order_by="[Media.position, Media.id]",
+        viewonly=True,
+    )
+
+    __table_args__ = (
+        Index("ix_blog_posts_ranking_id", "ranking", "id"),
+        Index("ix_blog_posts_hot_id", "hot_score", "id"),
+        Index("ix_blog_posts_created_id", "created_at", "id"),
+        Index("ix_blog_posts_owner_created", "owner_id", "created_at", "id"),
+        Index("ix_blog_posts_owner_updated", "owner_id", "updated_at"),
+        Index("ix_blog_posts_updated", "updated_at"),
+    )
 
-class ProfileSection(Base):
+    @property
+    def media_gallery(self):
+        return [item.gallery_entry() for item in self.media_items]
+
+class ProfileSection(Versioned, Base):
     __tablename__ = "profile_sections"
 
     id = Column(Integer, primary_key=True, index=True)
     section_type = Column(String)
     title = Column(String)
     content = Column(Text)
-    media_gallery = Column(JSON, nullable=True) # List of {url, type}
+    legacy_gallery = Column("media_gallery", JSON, nullable=True) # Pre-media-table galleries, converted on startup
     design_config = Column(JSON, nullable=True) # Per-section theme
     order = Column(Integer, default=0)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="profile_sections")
+    media_items = relationship(
+        "Media",
+        primaryjoin="and_(foreign(Media.parent_id) == ProfileSection.id, Media.parent_type == 'section')",
+        order_by="[Media.position, Media.id]",
+        viewonly=True,
+    )
+
+    __table_args__ = (
+        Index("ix_profile_sections_owner_updated", "owner_id", "updated_at"),
+    )
+
+    @property
+    def media_gallery(self):
+        return [item.gallery_entry() for item in self.media_items]
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True) # Normalized, see tags.normalize
+    post_count = Column(Integer, default=0, nullable=False) # Kept by tags.sync and tags.detach
+
+    __table_args__ = (
+        Index("ix_tags_post_count_name", "post_count", "name"),
+    )
+
+class BlogPostTag(Base):
+    __tablename__ = "blog_post_tags"
+
+    post_id = Column(Integer, ForeignKey("blog_posts.id"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    # Copies of the post's feed sort keys, so a tag's feed pages from one index
+    hot_score = Column(Float)
+    ranking = Column(Integer)
+    created_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_blog_post_tags_tag_hot", "tag_id", "hot_score", "post_id"),
+        Index("ix_blog_post_tags_tag_ranking", "tag_id", "ranking", "post_id"),
+        Index("ix_blog_post_tags_tag_created", "tag_id", "created_at", "post_id"),
+    )
+
+class BlogVote(Base):
+    __tablename__ = "blog_votes"
+
+    post_id = Column(Integer, ForeignKey("blog_posts.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    value = Column(Integer, default=0) # -1, 0 or 1
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class StorageUsage(Base):
+    __tablename__ = "storage_usage"
+
+    user_id = Column(Integer, primary_key=True) # 0 holds the global total
+    bytes_used = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class MediaBlob(Versioned, Base):
+    __tablename__ = "media_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, unique=True)
+    size = Column(Integer)
+    media_type = Column(String)
+    ref_count = Column(Integer, default=0, index=True)
+    variants = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class Media(Versioned, Base):
+    __tablename__ = "media"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    parent_type = Column(String) # journal, blog or section
+    parent_id = Column(Integer)
+    position = Column(Integer, default=0)
+    path = Column(String)
+    size = Column(Integer)
+    media_type = Column(String) # image or video
+    mime = Column(String, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    variants = Column(JSON, nullable=True) # {width: url} of resized copies
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_media_parent_position", "parent_type", "parent_id", "position"),
+        Index("ix_media_owner_id", "owner_id", "id"),
+        Index("ix_media_owner_type_id", "owner_id", "media_type", "id"),
+        Index("ix_media_sha256", "sha256"),
+        Index("ix_media_path", "path"),
+    )
+
+    @property
+    def srcset(self):
+        return srcset_for(self.variants)
+
+    def gallery_entry(self) -> dict:
+        # The shape galleries had as JSON, plus the id the per-item endpoints take
+        entry = {"id": self.id, "url": self.path, "type": self.media_type, "hash": self.sha256}
+        if self.variants is not None:
+            entry["variants"] = self.variants
+            entry["srcset"] = self.srcset
+        if self.width:
+            entry["width"], entry["height"] = self.width, self.height
+        return entry
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True) # Random token, part of the upload URL
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    target = Column(String) # album, journal, blog or section
+    parent_id = Column(Integer, nullable=True) # Gallery the upload is added to
+    is_public = Column(Boolean, default=False)
+    filename = Column(String)
+    media_type = Column(String) # image or video
+    length = Column(Integer) # Declared at creation
+    received = Column(Integer, default=0) # Bytes on disk and synced, the next PATCH starts here
+    path = Column(String, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, index=True) # Moved forward by every PATCH
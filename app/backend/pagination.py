@@ -0,0 +1,52 @@
+import base64
+import datetime
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, tuple_
+
+import sessions
+
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, columns) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        # Lists and objects would reach the driver as bind values
+        if not all(v is None or isinstance(v, (str, int, float)) for v in values):
+            raise ValueError
+        return [
+            datetime.datetime.fromisoformat(v) if isinstance(col.type, DateTime) and v is not None else v
+            for col, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(db, statement, columns, cursor: Optional[str], limit: int, response: Response, keys=None):
+    # Keyset paging of an entity select(): newest/highest first, columns must end with a
+    # unique tiebreaker (id) and be covered by an index so a deep page costs the same as
+    # the first one. keys names the row attributes holding the same values, when columns
+    # are on a joined table.
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        statement = statement.where(tuple_(*columns) < tuple_(*decode_cursor(cursor, columns)))
+    statement = statement.order_by(*[c.desc() for c in columns]).limit(limit + 1)
+    rows = (await sessions.execute(db, statement)).scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, key) for key in keys or [c.key for c in columns]])
+    return rows
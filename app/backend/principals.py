@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# Per-worker LRU of authenticated users, keyed by the token subject (username).
+# Profile writes invalidate their user's entry, the TTL bounds staleness from
+# writes handled by other workers.
+TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    # Read-only snapshot of a User, enough for ownership checks and /profile/me
+    id: int
+    username: str
+    email: Optional[str]
+    profile_picture: Optional[str]
+    profile_theme: Optional[dict]
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            profile_picture=user.profile_picture,
+            profile_theme=user.profile_theme,
+        )
+
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def get(username: str) -> Optional[Principal]:
+    with _lock:
+        entry = _entries.get(username)
+        if entry is not None and time.monotonic() - entry[0] <= TTL_SECONDS:
+            _entries.move_to_end(username)
+            _counters["hits"] += 1
+            return entry[1]
+        if entry is not None:
+            del _entries[username]
+        _counters["misses"] += 1
+        return None
+
+
+def put(principal: Principal):
+    with _lock:
+        _entries[principal.username] = (time.monotonic(), principal)
+        _entries.move_to_end(principal.username)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _counters["evictions"] += 1
+
+
+def invalidate(username: str):
+    with _lock:
+        if _entries.pop(username, None) is not None:
+            _counters["invalidations"] += 1
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counters, size=len(_entries), max_size=MAX_ENTRIES)
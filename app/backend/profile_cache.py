@@ -0,0 +1,90 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import media
+
+# Per-worker LRU of public profiles as the JSON bytes GET /u/{username} sends,
+# keyed by username. Profile writes invalidate their user's entry, the TTL bounds
+# staleness from writes handled by other workers.
+TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL", "60"))
+MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class Entry:
+    user_id: int
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime.datetime]
+    url_expiry: int  # signing window of the media URLs in the body
+
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_usernames = {}  # user id -> cached username, writers only know the id
+_generation = 0
+_counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def generation() -> int:
+    # Taken before a build reads the database, put() drops the build if a write came in between
+    with _lock:
+        return _generation
+
+
+def get(username: str) -> Optional[Entry]:
+    with _lock:
+        item = _entries.get(username)
+        if item is not None:
+            stored_at, entry = item
+            if time.monotonic() - stored_at <= TTL_SECONDS and entry.url_expiry == media.expiry():
+                _entries.move_to_end(username)
+                _counters["hits"] += 1
+                return entry
+            _drop(username)
+        _counters["misses"] += 1
+        return None
+
+
+def put(username: str, entry: Entry, built_at: int):
+    with _lock:
+        if built_at != _generation:
+            return
+        _drop(username)
+        _entries[username] = (time.monotonic(), entry)
+        _usernames[entry.user_id] = username
+        while len(_entries) > MAX_ENTRIES:
+            _drop(next(iter(_entries)))
+            _counters["evictions"] += 1
+
+
+def _drop(username: str):
+    item = _entries.pop(username, None)
+    if item is not None and _usernames.get(item[1].user_id) == username:
+        del _usernames[item[1].user_id]
+    return item
+
+
+def invalidate(user_id: int):
+    global _generation
+    with _lock:
+        _generation += 1
+        username = _usernames.get(user_id)
+        if username is not None and _drop(username) is not None:
+            _counters["invalidations"] += 1
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _usernames.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counters, size=len(_entries), max_size=MAX_ENTRIES)
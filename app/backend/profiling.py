@@ -0,0 +1,97 @@
+import cProfile
+import contextvars
+import functools
+import heapq
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+# Fraction of requests profiled, 0 disables sampling
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests carrying "X-Profile: <token>" are always profiled, unset disables the header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_HEADER = b"x-profile"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+KEEP = int(os.getenv("PROFILE_KEEP", "20"))  # pstats files for the slowest requests seen
+
+_active = contextvars.ContextVar("profile_run", default=None)
+_busy = threading.Lock()  # one profiled request at a time, cProfile hooks are per thread
+_kept = []  # min-heap of (seconds, path)
+_kept_lock = threading.Lock()
+
+
+class _Run:
+    def __init__(self):
+        self.loop_profile = cProfile.Profile()
+        self.thread_profiles = []
+        self.token = None
+        self.thread = threading.get_ident()  # the event loop's
+
+
+def _requested(scope) -> bool:
+    if PROFILE_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return value.decode("latin-1") == PROFILE_TOKEN
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def start(scope):
+    if not _requested(scope) or not _busy.acquire(blocking=False):
+        return None
+    # The event loop part of the request. Other requests interleaved on the loop
+    # show up here too, sync handlers get their own profile in profiled().
+    run = _Run()
+    run.token = _active.set(run)
+    run.loop_profile.enable()
+    return run
+
+
+def profiled(fn):
+    # Wraps sync handlers, which run in threadpool threads the loop profile can't see
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        run = _active.get()
+        if run is None or run.thread == threading.get_ident():
+            # On the loop itself (run_sync) the loop profile records it, a second
+            # profiler would replace its hook
+            return fn(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            run.thread_profiles.append(profile)
+    return wrapper
+
+
+def _dump(run, seconds, method, route):
+    with _kept_lock:
+        if len(_kept) >= KEEP and seconds <= _kept[0][0]:
+            return None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(PROFILE_DIR, f"{int(seconds * 1000):07d}ms-{method}-{slug}-{int(time.time() * 1000)}.pstats")
+        stats = pstats.Stats(run.loop_profile)
+        for profile in run.thread_profiles:
+            stats.add(profile)
+        stats.dump_stats(path)
+        heapq.heappush(_kept, (seconds, path))
+        if len(_kept) > KEEP:
+            _, evicted = heapq.heappop(_kept)
+            try:
+                os.remove(evicted)
+            except FileNotFoundError:
+                pass
+        return path
+
+
+async def finish(run, seconds, method, route):
+    run.loop_profile.disable()
+    _active.reset(run.token)
+    _busy.release()
+    await run_in_threadpool(_dump, run, seconds, method, route)
@@ -0,0 +1,62 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import load_only, selectinload
+
+EXCERPT_LENGTH = 200
+EXPANDABLE = {"owner"}
+
+# Fields derived from stored columns or relationships, mapped to what they need
+COMPUTED = {
+    "excerpt": ("content", lambda row: (row.content or "")[:EXCERPT_LENGTH]),
+    "media_gallery": ("media_items", lambda row: row.media_gallery),
+    "cover": ("media_items", lambda row: row.media_items[0].gallery_entry() if row.media_items else None),
+    "media_count": ("media_items", lambda row: len(row.media_items)),
+    "srcset": ("variants", lambda row: row.srcset),
+}
+
+
+def parse_fields(fields: Optional[str], allowed: set, default: set) -> set:
+    if not fields:
+        return set(default)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested | {"id"}
+
+
+def parse_expand(expand: Optional[str]) -> set:
+    requested = {e.strip() for e in (expand or "").split(",") if e.strip()}
+    unknown = requested - EXPANDABLE
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot expand: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def apply(query, model, fields: set, expand: set, always=()):
+    # Only load the columns the projection needs, owners and media come in one batched query each
+    columns = {c.key for c in always}
+    for field in fields:
+        columns.add(COMPUTED[field][0] if field in COMPUTED else field)
+    attrs = [getattr(model, c) for c in columns if c in model.__mapper__.columns]
+    for name in columns & set(model.__mapper__.relationships.keys()):
+        query = query.options(selectinload(getattr(model, name)))
+    if "owner" in expand:
+        attrs.append(model.owner_id)
+        query = query.options(selectinload(model.owner))
+    return query.options(load_only(*attrs))
+
+
+def project(row, fields: set, expand: set) -> dict:
+    data = {}
+    for field in fields:
+        data[field] = COMPUTED[field][1](row) if field in COMPUTED else getattr(row, field)
+    if "owner" in expand:
+        owner = row.owner
+        data["owner"] = None if owner is None else {
+            "id": owner.id,
+            "username": owner.username,
+            "profile_picture": owner.profile_picture,
+        }
+    return data
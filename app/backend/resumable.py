@@ -0,0 +1,237 @@
+import datetime
+import hashlib
+import logging
+import os
+import secrets
+import threading
+from email.utils import format_datetime
+
+try:
+    import fcntl
+except ImportError:  # without it, concurrent PATCHes to one upload are only caught by the offset check
+    fcntl = None
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+import models, blobstore, gallery, ingest, ledger
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Partial files live under uploads/ so finalizing is a rename into the blob store.
+# media_gc treats the paths of open sessions as live.
+SESSION_DIR = os.getenv("UPLOAD_SESSION_DIR", "uploads/sessions")
+TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))  # since the last PATCH
+EXPIRE_INTERVAL_SECONDS = float(os.getenv("UPLOAD_EXPIRE_INTERVAL", "900"))  # 0 disables the background sweep
+MAX_OPEN_PER_USER = int(os.getenv("UPLOAD_MAX_OPEN", "10"))
+TARGETS = ("album",) + tuple(gallery.PARENTS)
+
+_stats_lock = threading.Lock()
+_stats = {"created": 0, "completed": 0, "expired": 0, "bytes_received": 0}
+_stop = threading.Event()
+_thread = None
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(**counts):
+    with _stats_lock:
+        for key, value in counts.items():
+            _stats[key] += value
+
+
+def _expiry() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=TTL_SECONDS)
+
+
+def progress_headers(upload: models.UploadSession) -> dict:
+    return {
+        "Upload-Offset": str(upload.received),
+        "Upload-Length": str(upload.length),
+        "Upload-Expires": format_datetime(upload.expires_at.replace(tzinfo=datetime.timezone.utc), usegmt=True),
+        "Cache-Control": "no-store",
+    }
+
+
+def create(db: Session, owner_id: int, spec) -> models.UploadSession:
+    if spec.target not in TARGETS:
+        raise HTTPException(status_code=400, detail=f"target must be one of {', '.join(TARGETS)}")
+    if spec.length <= 0:
+        raise HTTPException(status_code=400, detail="length must be positive")
+    if spec.length > ingest.MAX_UPLOAD_BYTES:
+        raise ingest.UploadTooLarge(f"File exceeds the {ingest.MAX_UPLOAD_MB}MB upload limit.")
+    model = gallery.PARENTS.get(spec.target)
+    if model is not None:
+        if spec.parent_id is None or db.query(model.id).filter(model.id == spec.parent_id, model.owner_id == owner_id).first() is None:
+            raise HTTPException(status_code=404, detail="Parent not found")
+    open_uploads = models.UploadSession.expires_at > datetime.datetime.utcnow()
+    count = db.query(func.count(models.UploadSession.id)).filter(open_uploads, models.UploadSession.owner_id == owner_id).scalar()
+    if count >= MAX_OPEN_PER_USER:
+        raise HTTPException(status_code=429, detail="Too many unfinished uploads")
+    # Open uploads count as spoken for. Finalizing still reserves in the ledger, this
+    # only turns away uploads that could never fit before any bytes are sent.
+    pending = db.query(func.coalesce(func.sum(models.UploadSession.length), 0)).filter(open_uploads).scalar()
+    if ledger.usage(db) + pending + spec.length > ledger.MAX_APP_SIZE_BYTES:
+        raise HTTPException(status_code=400, detail=ledger.QUOTA_DETAIL)
+
+    upload_id = secrets.token_hex(16)
+    path = f"{SESSION_DIR}/{upload_id}.part"
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    open(path, "xb").close()
+    upload = models.UploadSession(
+        id=upload_id,
+        owner_id=owner_id,
+        target=spec.target,
+        parent_id=spec.parent_id if model is not None else None,
+        is_public=spec.is_public,
+        filename=ingest.safe_filename(spec.filename),
+        media_type=ingest.kind_of(spec.content_type),
+        length=spec.length,
+        received=0,
+        path=path,
+        expires_at=_expiry(),
+    )
+    db.add(upload)
+    _record(created=1)
+    return upload
+
+
+def get(db: Session, upload_id: str, owner_id: int) -> models.UploadSession:
+    upload = db.query(models.UploadSession).filter(
+        models.UploadSession.id == upload_id,
+        models.UploadSession.owner_id == owner_id,
+        models.UploadSession.expires_at > datetime.datetime.utcnow(),
+    ).first()
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+def received(db: Session, upload_id: str):
+    # Read after taking the file lock, the row may have moved on since get()
+    return db.execute(select(models.UploadSession.received).where(models.UploadSession.id == upload_id)).scalar()
+
+
+def open_locked(path: str):
+    # One request at a time per upload, across workers. The lock goes with the file.
+    try:
+        part = open(path, "r+b")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if fcntl is not None:
+        try:
+            fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            part.close()
+            raise HTTPException(status_code=409, detail="Another request is using this upload")
+    return part
+
+
+def rewind(part, offset: int):
+    # Bytes past the recorded offset come from a request that died before recording them
+    part.truncate(offset)
+    part.seek(offset)
+
+
+def sync(part):
+    # The offset is only recorded once its bytes are on disk
+    part.flush()
+    os.fsync(part.fileno())
+
+
+def advance(db: Session, upload_id: str, old: int, new: int) -> bool:
+    moved = db.execute(
+        update(models.UploadSession)
+        .where(models.UploadSession.id == upload_id, models.UploadSession.received == old)
+        .values(received=new, expires_at=_expiry())
+    ).rowcount == 1
+    if moved:
+        _record(bytes_received=new - old)
+    return moved
+
+
+def digest(part) -> str:
+    sha256 = hashlib.sha256()
+    part.seek(0)
+    for chunk in iter(lambda: part.read(ingest.CHUNK_SIZE), b""):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def finalize(db: Session, upload: models.UploadSession, sha256: str) -> models.MediaBlob:
+    # Moves the finished file into the blob store and takes a reference, the same
+    # as blobstore.store and acquire_upload. The caller records the album item or gallery entry.
+    incoming = ingest.StoredUpload(
+        path=upload.path, size=upload.length, media_type=upload.media_type, sha256=sha256, filename=upload.filename
+    )
+    path, _ = blobstore.place(db, incoming)
+    try:
+        blob = blobstore.acquire(db, sha256, path, upload.length, upload.media_type, upload.owner_id)
+    except HTTPException:
+        # The bytes are in the blob store now (the GC collects them), the upload can't be retried
+        upload_id = upload.id
+        db.rollback()
+        db.execute(delete(models.UploadSession).where(models.UploadSession.id == upload_id))
+        db.commit()
+        raise
+    db.delete(upload)
+    _record(completed=1)
+    return blob
+
+
+def remove_part(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def expire() -> int:
+    db = SessionLocal()
+    try:
+        stale = db.query(models.UploadSession.id, models.UploadSession.path).filter(
+            models.UploadSession.expires_at <= datetime.datetime.utcnow()
+        ).all()
+        if not stale:
+            return 0
+        db.execute(delete(models.UploadSession).where(models.UploadSession.id.in_([upload_id for upload_id, _ in stale])))
+        db.commit()
+    finally:
+        db.close()
+    for _, path in stale:
+        remove_part(path)
+    _record(expired=len(stale))
+    return len(stale)
+
+
+def _run():
+    while not _stop.wait(EXPIRE_INTERVAL_SECONDS):
+        try:
+            expired = expire()
+            if expired:
+                logger.info("Expired %d abandoned uploads", expired)
+        except Exception:
+            logger.exception("Upload expiry failed")
+
+
+def start():
+    global _thread
+    if EXPIRE_INTERVAL_SECONDS <= 0:
+        return
+    if _thread is None or not _thread.is_alive():
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="upload-expiry", daemon=True)
+        _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+        _thread = None
@@ -1,91 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
-from sqlalchemy import func
+from typing import List, Optional
 import os
-import shutil
-import models, schemas, dependencies
+import models, schemas, dependencies, principals, sessions, blobstore, ingest, derivatives, stats_cache, pagination, projections, conditional
 
 router = APIRouter(
     prefix="/album",
     tags=["album"],
+    route_class=sessions.SessionRoute,
 )
 
-MAX_APP_SIZE_MB = 100
-MAX_APP_SIZE_BYTES = MAX_APP_SIZE_MB * 1024 * 1024
 UPLOAD_DIR = "uploads"
+LIST_FIELDS = set(schemas.AlbumListItem.model_fields) - {"owner"}
+
+async def list_items(db, statement, cursor, limit, fields, expand, response):
+    selected = projections.parse_fields(fields, LIST_FIELDS, LIST_FIELDS)
+    expanded = projections.parse_expand(expand)
+    # Newest first, ids grow with upload order
+    order = [models.AlbumItem.id]
+    statement = projections.apply(statement, models.AlbumItem, selected, expanded, always=order)
+    rows = await pagination.paginate(db, statement, order, cursor, limit, response)
+    return [projections.project(row, selected, expanded) for row in rows]
+
+def create_item(session, blob, is_public, owner_id, filename=None):
+    # Records an uploaded blob as an album item, for single and resumable uploads
+    db_item = models.AlbumItem(
+        file_path=blob.path,
+        filename=filename,
+        file_size=blob.size,
+        media_type=blob.media_type,
+        variants=blob.variants,
+        is_public=is_public,
+        design_config=None, # Media upload currently doesn't send JSON design, will add later if needed
+        owner_id=owner_id
+    )
+    session.add(db_item)
+    session.commit()
+    derivatives.schedule(blob, [("album", db_item.id)])
+    session.refresh(db_item)
+    return schemas.AlbumItem.model_validate(db_item)
 
 # Ensure upload directory exists
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
-def get_total_size(db: Session):
-    total_size = db.query(func.sum(models.AlbumItem.file_size)).scalar()
-    return total_size or 0
-
-@router.post("/upload", response_model=schemas.AlbumItem)
+@router.post("/upload", response_model=schemas.AlbumItem, openapi_extra=ingest.form_schema("file", is_public={"type": "boolean", "default": False}))
 async def upload_file(
-    file: UploadFile = File(...),
-    is_public: bool = Form(False),
-    current_user: models.User = Depends(dependencies.get_current_user),
+    request: Request,
+    current_user: principals.Principal = Depends(dependencies.get_current_principal),
     db: Session = Depends(dependencies.get_db)
 ):
-    # Check total size cap
-    current_total = get_total_size(db)
-    # Estimate file size (naive, as we receive stream)
-    # Better: check content-length header or read chunks and count
-    # For simplicity, we'll read into memory to check size (not ideal for huge files but ok for small apps)
-    # Or save to temp and check. 
-    
-    file.file.seek(0, 2)
-    size = file.file.tell()
-    file.file.seek(0)
-    
-    if current_total + size > MAX_APP_SIZE_BYTES:
-        raise HTTPException(status_code=400, detail="Storage limit of 100MB reached.")
+    # Total size cap is reserved atomically in the storage ledger
+    form = await ingest.receive_form(request, blobstore.INCOMING_DIR, max_files=1)
+    stored, = await blobstore.store_all(db, form.uploads("file"))
 
-    file_cat = "video" if file.content_type.startswith("video") else "image"
-    file_location = f"{UPLOAD_DIR}/{file.filename}"
-    
-    with open(file_location, "wb+") as file_object:
-        shutil.copyfileobj(file.file, file_object)
-        
-    db_item = models.AlbumItem(
-        file_path=file_location,
-        file_size=size,
-        media_type=file_cat,
-        is_public=is_public,
-        design_config=None, # Media upload currently doesn't send JSON design, will add later if needed
-        owner_id=current_user.id
-    )
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
+    def save(session):
+        blob = blobstore.acquire_upload(session, stored, current_user.id)
+        return create_item(session, blob, form.flag("is_public"), current_user.id, stored.filename)
 
-@router.get("/", response_model=List[schemas.AlbumItem])
-def read_album(
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    item = await sessions.run(db, save)
+    stats_cache.invalidate(current_user.id)
+    return item
+
+@router.get("/", response_model=List[schemas.AlbumListItem], response_model_exclude_unset=True)
+async def read_album(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     # Retrieve user's items + public items? Or just user's?
     # Requirement: "photo/short video album section(public/private)"
     # Assuming this endpoint is for the user's dashboard/album view
-    return db.query(models.AlbumItem).filter(models.AlbumItem.owner_id == current_user.id).offset(skip).limit(limit).all()
+    scope = models.AlbumItem.owner_id == current_user.id
+    not_modified = await conditional.listing(request, response, db, models.AlbumItem, scope, expand=projections.parse_expand(expand))
+    if not_modified:
+        return not_modified
+    return await list_items(db, select(models.AlbumItem).where(scope), cursor, limit, fields, expand, response)
 
 @router.delete("/{item_id}")
 def delete_item(
     item_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     item = db.query(models.AlbumItem).filter(models.AlbumItem.id == item_id, models.AlbumItem.owner_id == current_user.id).first()
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
+    blobstore.release(db, item.file_path, current_user.id, item.file_size)
     db.delete(item)
     db.commit()
+    stats_cache.invalidate(current_user.id)
     return {"status": "deleted"}
 
 @router.put("/{item_id}/design")
@@ -93,7 +103,7 @@ def update_item_design(
     item_id: int,
     design: dict = Body(...),
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     item = db.query(models.AlbumItem).filter(models.AlbumItem.id == item_id, models.AlbumItem.owner_id == current_user.id).first()
     if not item:
@@ -102,6 +112,18 @@ def update_item_design(
     db.commit()
     return item
 
-@router.get("/public", response_model=List[schemas.AlbumItem])
-def read_public_album(skip: int = 0, limit: int = 100, db: Session = Depends(dependencies.get_db)):
-    return db.query(models.AlbumItem).filter(models.AlbumItem.is_public == True).offset(skip).limit(limit).all()
+@router.get("/public", response_model=List[schemas.AlbumListItem], response_model_exclude_unset=True)
+async def read_public_album(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(dependencies.get_read_db)
+):
+    scope = models.AlbumItem.is_public == True
+    not_modified = await conditional.listing(request, response, db, models.AlbumItem, scope, expand=projections.parse_expand(expand), private=False)
+    if not_modified:
+        return not_modified
+    return await list_items(db, select(models.AlbumItem).where(scope), cursor, limit, fields, expand, response)
@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+import archive, dependencies, principals, sessions, stats_cache, profile_cache
+
+router = APIRouter(
+    tags=["archive"],
+    route_class=sessions.SessionRoute,
+)
+
+@router.get("/export")
+def export_space(current_user: principals.Principal = Depends(dependencies.get_current_principal)):
+    # Built while it streams, nothing is staged on disk or in memory
+    return StreamingResponse(
+        archive.export_archive(current_user.id),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{current_user.username}-export.zip"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+@router.post("/import")
+async def import_space(request: Request, current_user: principals.Principal = Depends(dependencies.get_current_principal)):
+    # The raw ZIP body is spooled to disk, ZIP readers need the central directory at the end
+    fd, path = tempfile.mkstemp(dir=archive.SPOOL_DIR, prefix=".import-", suffix=".zip")
+    try:
+        size = 0
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > archive.MAX_IMPORT_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Archive exceeds the {archive.MAX_IMPORT_MB}MB import limit.")
+                await run_in_threadpool(out.write, chunk)
+        report = await run_in_threadpool(archive.restore, path, current_user.id)
+    finally:
+        os.remove(path)
+    principals.invalidate(current_user.username)
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
+    return report
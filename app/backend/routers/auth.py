@@ -1,37 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
-import models, schemas, database, dependencies
+import models, schemas, database, dependencies, hashing, sessions
 from datetime import timedelta
 
 router = APIRouter(
     prefix="/auth",
     tags=["auth"],
+    route_class=sessions.SessionRoute,
 )
 
-@router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(dependencies.get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = dependencies.get_password_hash(user.password)
+def _stored_hash(db: Session, username: str):
+    user = db.query(models.User).filter(models.User.username == username).first()
+    # End the read transaction so no pooled connection is held while hashing
+    db.commit()
+    return user.hashed_password if user else None
+
+def _create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
     db_user = models.User(email=user.email, username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    return db_user
+    return schemas.User.model_validate(db_user)
+
+def _store_hash(db: Session, username: str, hashed_password: str):
+    db.query(models.User).filter(models.User.username == username).update({"hashed_password": hashed_password})
+    db.commit()
+
+@router.post("/register", response_model=schemas.User)
+async def register(user: schemas.UserCreate, db: Session = Depends(dependencies.get_db)):
+    if await sessions.run(db, _stored_hash, user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    hashed_password = await hashing.hash_password(user.password)
+    return await sessions.run(db, _create_user, user, hashed_password)
 
 @router.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(dependencies.get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not dependencies.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(dependencies.get_db)):
+    stored_hash = await sessions.run(db, _stored_hash, form_data.username)
+    verified, new_hash = False, None
+    if stored_hash:
+        verified, new_hash = await hashing.verify_password(form_data.password, stored_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored with an outdated cost factor, upgrade it now that we have the password
+        await sessions.run(db, _store_hash, form_data.username, new_hash)
     access_token_expires = timedelta(minutes=dependencies.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = dependencies.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": form_data.username}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1,62 +1,112 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Form, Body, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import models, schemas, dependencies
-import os
+import models, schemas, dependencies, principals, sessions, bulk, blobstore, ingest, media, gallery, derivatives, stats_cache, pagination, projections, votes, conditional, feed, tags
 
 router = APIRouter(
     prefix="/blog",
     tags=["blog"],
+    route_class=sessions.SessionRoute,
 )
 
+LIST_FIELDS = set(schemas.BlogListItem.model_fields) - {"owner"}
+SUMMARY_FIELDS = {"id", "title", "excerpt", "tags", "ranking", "created_at", "cover", "media_count", "owner_id"}
+
+async def list_blogs(db, statement, order, cursor, limit, fields, expand, response):
+    selected = projections.parse_fields(fields, LIST_FIELDS, SUMMARY_FIELDS)
+    expanded = projections.parse_expand(expand)
+    statement = projections.apply(statement, models.BlogPost, selected, expanded, always=order)
+    rows = await pagination.paginate(db, statement, order, cursor, limit, response)
+    return [projections.project(row, selected, expanded) for row in rows]
+
 @router.post("/", response_model=schemas.Blog)
 def create_blog(
     blog: schemas.BlogCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     db_blog = models.BlogPost(**blog.dict(), owner_id=current_user.id)
     db.add(db_blog)
+    db.flush()
+    tags.sync(db, [db_blog.id])
     db.commit()
+    stats_cache.invalidate(current_user.id)
     db.refresh(db_blog)
     return db_blog
 
-UPLOAD_DIR = "uploads/blog"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+@router.post("/bulk", response_model=schemas.BulkReport)
+def bulk_blogs(
+    batch: schemas.BulkRequest,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    report = bulk.apply(db, "blog", batch, schemas.BlogCreate, schemas.BlogBulkUpdate, current_user.id)
+    db.commit()
+    stats_cache.invalidate(current_user.id)
+    return report
 
-@router.post("/{blog_id}/media")
+@router.post("/{blog_id}/media", openapi_extra=ingest.form_schema("files", multiple=True))
 async def upload_blog_media(
     blog_id: int,
-    files: List[UploadFile] = File(...),
+    request: Request,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    blog = db.query(models.BlogPost).filter(models.BlogPost.id == blog_id, models.BlogPost.owner_id == current_user.id).first()
+    blog = await sessions.run(db, lambda session: session.query(models.BlogPost).filter(models.BlogPost.id == blog_id, models.BlogPost.owner_id == current_user.id).first())
     if not blog:
         raise HTTPException(status_code=404, detail="Blog not found")
-        
-    gallery = list(blog.media_gallery or [])
-    for file in files:
-        file_location = f"{UPLOAD_DIR}/{blog_id}_{file.filename}"
-        with open(file_location, "wb+") as file_object:
-            import shutil
-            shutil.copyfileobj(file.file, file_object)
-        
-        media_type = "video" if file.content_type.startswith("video") else "image"
-        gallery.append({"url": file_location, "type": media_type})
-        
-    blog.media_gallery = gallery
+
+    form = await ingest.receive_form(request, blobstore.INCOMING_DIR)
+    stored = await blobstore.store_all(db, form.uploads("files"))
+
+    def save(session):
+        blobs = [blobstore.acquire_upload(session, upload, current_user.id) for upload in stored]
+        gallery.add(session, "blog", blog.id, blobs, current_user.id)
+        session.commit()
+        for blob in blobs:
+            derivatives.schedule(blob, [("blog", blog.id)])
+        return blog.media_gallery
+
+    entries = await sessions.run(db, save)
+    stats_cache.invalidate(current_user.id)
+    return {"gallery": media.sign_gallery(entries)}
+
+@router.delete("/{blog_id}/media/{media_id}")
+def delete_blog_media(
+    blog_id: int,
+    media_id: int,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    parent = db.query(models.BlogPost).filter(models.BlogPost.id == blog_id, models.BlogPost.owner_id == current_user.id).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    gallery.remove(db, "blog", parent.id, media_id, current_user.id)
+    db.commit()
+    stats_cache.invalidate(current_user.id)
+    return {"gallery": media.sign_gallery(parent.media_gallery)}
+
+@router.put("/{blog_id}/media/order")
+def reorder_blog_media(
+    blog_id: int,
+    media_ids: List[int] = Body(...),
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    parent = db.query(models.BlogPost).filter(models.BlogPost.id == blog_id, models.BlogPost.owner_id == current_user.id).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    gallery.reorder(db, "blog", parent.id, media_ids)
     db.commit()
-    db.refresh(blog)
-    return {"gallery": blog.media_gallery}
+    return {"gallery": media.sign_gallery(parent.media_gallery)}
 
 @router.put("/{blog_id}", response_model=schemas.Blog)
 def update_blog(
     blog_id: int,
     blog_update: schemas.BlogCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     db_blog = db.query(models.BlogPost).filter(models.BlogPost.id == blog_id, models.BlogPost.owner_id == current_user.id).first()
     if not db_blog:
@@ -65,8 +115,12 @@ def update_blog(
     update_data = blog_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_blog, key, value)
+    if "tags" in update_data:
+        db.flush()
+        tags.sync(db, [db_blog.id])
     
     db.commit()
+    stats_cache.invalidate(current_user.id)
     db.refresh(db_blog)
     return db_blog
 
@@ -74,42 +128,103 @@ def update_blog(
 def delete_blog(
     blog_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     blog = db.query(models.BlogPost).filter(models.BlogPost.id == blog_id, models.BlogPost.owner_id == current_user.id).first()
     if not blog:
         raise HTTPException(status_code=404, detail="Blog not found")
+    gallery.remove_all(db, "blog", blog.id, current_user.id)
+    db.query(models.BlogVote).filter(models.BlogVote.post_id == blog_id).delete()
+    tags.detach(db, [blog.id])
     db.delete(blog)
     db.commit()
+    stats_cache.invalidate(current_user.id)
     return {"status": "deleted"}
 
-@router.get("/", response_model=List[schemas.Blog])
-def read_blogs(skip: int = 0, limit: int = 100, db: Session = Depends(dependencies.get_db)):
-    # Simple public feed or user specific? "ranking in blogs" suggests public/community aspect
-    return db.query(models.BlogPost).order_by(models.BlogPost.ranking.desc()).offset(skip).limit(limit).all()
+@router.get("/", response_model=List[schemas.BlogListItem], response_model_exclude_unset=True)
+async def read_blogs(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    sort: str = feed.DEFAULT_SORT,
+    tag: Optional[str] = None,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(dependencies.get_read_db)
+):
+    # Public feed: hot (votes decayed by age), top (votes) or new, read from stored
+    # scores. Validated from the page itself, so nothing here scans the whole table.
+    order = feed.order(sort)
+    selected = projections.parse_fields(fields, LIST_FIELDS, SUMMARY_FIELDS)
+    expanded = projections.parse_expand(expand)
+    always = order + [models.BlogPost.version, models.BlogPost.updated_at]
+    statement = projections.apply(select(models.BlogPost), models.BlogPost, selected, expanded, always=always)
+    keys = None
+    if tag is not None:
+        statement, tag_order = feed.tagged(statement, tag, sort)
+        keys = [c.key for c in order]
+        order = tag_order
+    rows = await pagination.paginate(db, statement, order, cursor, limit, response, keys=keys)
+    not_modified = conditional.page(request, response, rows, models.BlogPost.__tablename__, expand=expanded, private=False)
+    if not_modified:
+        return not_modified
+    return [projections.project(row, selected, expanded) for row in rows]
 
-@router.get("/my", response_model=List[schemas.Blog])
-def read_my_blogs(
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+@router.get("/tags", response_model=List[schemas.TagCount])
+def read_tag_cloud(
+    request: Request,
+    response: Response,
+    limit: int = 50,
+    db: Session = Depends(dependencies.get_read_db)
 ):
-    return db.query(models.BlogPost).filter(models.BlogPost.owner_id == current_user.id).offset(skip).limit(limit).all()
+    # Counts are maintained on every write, this only reads the top of an index
+    rows = [{"name": name, "count": count} for name, count in tags.cloud(db, max(1, min(limit, pagination.MAX_PAGE_SIZE)))]
+    not_modified = conditional.respond(request, response, conditional.etag("tags", rows), private=False)
+    return not_modified or rows
+
+@router.get("/my", response_model=List[schemas.BlogListItem], response_model_exclude_unset=True)
+async def read_my_blogs(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    scope = models.BlogPost.owner_id == current_user.id
+    not_modified = await conditional.listing(request, response, db, models.BlogPost, scope, expand=projections.parse_expand(expand))
+    if not_modified:
+        return not_modified
+    order = [models.BlogPost.created_at, models.BlogPost.id]
+    return await list_blogs(db, select(models.BlogPost).where(scope), order, cursor, limit, fields, expand, response)
+
+@router.get("/{blog_id}", response_model=schemas.Blog, response_model_exclude={"owner"})
+def read_blog(blog_id: int, request: Request, response: Response, db: Session = Depends(dependencies.get_read_db)):
+    # The whole post, for when a list card is opened
+    blog = db.query(models.BlogPost).filter(models.BlogPost.id == blog_id).first()
+    if not blog:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    tag = conditional.etag("blog", blog.id, blog.version, blog.updated_at)
+    return conditional.respond(request, response, tag, private=False, last_modified=blog.updated_at) or blog
 
 @router.put("/{blog_id}/rank")
 def update_ranking(
     blog_id: int, 
     info: dict, # {"rank_delta": 1}
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    blog = db.query(models.BlogPost).filter(models.BlogPost.id == blog_id).first()
+    blog = db.query(models.BlogPost.ranking).filter(models.BlogPost.id == blog_id).first()
     if not blog:
         raise HTTPException(status_code=404, detail="Blog not found")
     
-    # Simple logic: upvote/downvote
-    delta = info.get("rank_delta", 0)
-    blog.ranking += delta
-    db.commit()
-    return {"new_ranking": blog.ranking}
+    # Simple logic: upvote/downvote, one vote per user, buffered and flushed in batches
+    try:
+        vote = int(info.get("rank_delta", 0))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="rank_delta must be an integer")
+    votes.record(db, blog_id, current_user.id, vote)
+    return {"new_ranking": (blog.ranking or 0) + votes.pending_delta(blog_id)}
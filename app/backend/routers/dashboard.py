@@ -1,62 +1,121 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
-from typing import List
-import models, schemas, dependencies
-from datetime import datetime
-import os
+from sqlalchemy import func, literal, or_, select, union_all
+from typing import List, Optional
+import models, schemas, dependencies, principals, sessions, stats_cache, pagination
 
 router = APIRouter(
     prefix="/dashboard",
     tags=["dashboard"],
+    route_class=sessions.SessionRoute,
 )
 
-@router.get("/stats", response_model=schemas.DashboardStats)
-def get_dashboard_stats(
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
-):
-    # Counts
-    journal_count = db.query(models.JournalEntry).filter(models.JournalEntry.owner_id == current_user.id).count()
-    blog_count = db.query(models.BlogPost).filter(models.BlogPost.owner_id == current_user.id).count()
-    album_count = db.query(models.AlbumItem).filter(models.AlbumItem.owner_id == current_user.id).count()
-    
-    # Storage Calculation (MB)
-    total_size_bytes = 0
-    # Add logic for file sizes if we tracked them broadly, for now use album_items
-    items = db.query(models.AlbumItem).filter(models.AlbumItem.owner_id == current_user.id).all()
-    for item in items:
-        total_size_bytes += (item.file_size or 0)
-    
-    storage_used_mb = round(total_size_bytes / (1024 * 1024), 2)
-    
-    # Recent Activity (Combined)
-    activities = []
-    
-    recent_journals = db.query(models.JournalEntry).filter(models.JournalEntry.owner_id == current_user.id).order_by(models.JournalEntry.created_at.desc()).limit(5).all()
-    for j in recent_journals:
-        activities.append({
-            "id": j.id,
-            "type": "journal",
-            "title": j.title,
-            "created_at": j.created_at
-        })
-        
-    recent_blogs = db.query(models.BlogPost).filter(models.BlogPost.owner_id == current_user.id).order_by(models.BlogPost.created_at.desc()).limit(5).all()
-    for b in recent_blogs:
-        activities.append({
-            "id": b.id,
-            "type": "blog",
-            "title": b.title,
-            "created_at": b.created_at
-        })
-        
-    # Sort by created_at desc
-    activities.sort(key=lambda x: x["created_at"], reverse=True)
-    
+RECENT_ACTIVITY_LIMIT = 8
+
+def _count(model, user_id):
+    return select(func.count(model.id)).where(model.owner_id == user_id).scalar_subquery()
+
+def _activity(kind, model, title, timestamp, user_id):
+    latest = (
+        select(
+            model.id.label("id"),
+            literal(kind).label("type"),
+            title.label("title"),
+            timestamp.label("created_at"),
+        )
+        .where(model.owner_id == user_id, timestamp.isnot(None))
+        .order_by(timestamp.desc())
+        .limit(RECENT_ACTIVITY_LIMIT)
+        .subquery()
+    )
+    # Wrapped so each branch keeps its own ORDER BY/LIMIT inside the UNION
+    return select(latest)
+
+def _profile_activity(user_id):
+    # Picture and theme live on the user row, updated_at moves with either
+    user = models.User
+    return select(
+        user.id.label("id"),
+        literal("profile").label("type"),
+        literal("Profile picture and theme").label("title"),
+        user.updated_at.label("created_at"),
+    ).where(
+        user.id == user_id,
+        user.updated_at.isnot(None),
+        or_(user.profile_picture.isnot(None), user.profile_theme.isnot(None)),
+    )
+
+async def compute_stats(db: Session, user_id: int):
+    # All counts and the ledger total in a single round trip
+    counts = (await sessions.execute(db, 
+        select(
+            _count(models.JournalEntry, user_id).label("journal_count"),
+            _count(models.BlogPost, user_id).label("blog_count"),
+            _count(models.AlbumItem, user_id).label("album_count"),
+            select(models.StorageUsage.bytes_used)
+            .where(models.StorageUsage.user_id == user_id)
+            .scalar_subquery()
+            .label("bytes_used"),
+        )
+    )).one()
+
+    # Recent activity across every content type as one UNION ALL
+    feed = union_all(
+        _activity("journal", models.JournalEntry, models.JournalEntry.title, models.JournalEntry.created_at, user_id),
+        _activity("blog", models.BlogPost, models.BlogPost.title, models.BlogPost.created_at, user_id),
+        # Items uploaded before filenames were kept show their media type
+        _activity("album", models.AlbumItem, func.coalesce(models.AlbumItem.filename, models.AlbumItem.media_type), models.AlbumItem.created_at, user_id),
+        _activity("profile", models.ProfileSection, models.ProfileSection.title, models.ProfileSection.updated_at, user_id),
+        _profile_activity(user_id),
+    ).subquery()
+    activity = (await sessions.execute(
+        db, select(feed).order_by(feed.c.created_at.desc()).limit(RECENT_ACTIVITY_LIMIT)
+    )).mappings().all()
+
     return {
-        "journal_count": journal_count,
-        "blog_count": blog_count,
-        "album_count": album_count,
-        "storage_used_mb": storage_used_mb,
-        "recent_activity": activities[:8]
+        "journal_count": counts.journal_count,
+        "blog_count": counts.blog_count,
+        "album_count": counts.album_count,
+        "storage_used_mb": round((counts.bytes_used or 0) / (1024 * 1024), 2),
+        "recent_activity": [dict(row) for row in activity],
     }
+
+@router.get("/stats", response_model=schemas.DashboardStats)
+async def get_dashboard_stats(
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    stats = stats_cache.get(current_user.id)
+    if stats is None:
+        stats = await compute_stats(db, current_user.id)
+        stats_cache.put(current_user.id, stats)
+    return stats
+
+@router.get("/media", response_model=List[schemas.MediaItem])
+async def list_media(
+    response: Response,
+    media_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    # Every gallery item across journals, blogs and sections, e.g. ?media_type=video
+    statement = select(models.Media).where(models.Media.owner_id == current_user.id)
+    if media_type:
+        statement = statement.where(models.Media.media_type == media_type)
+    rows = await pagination.paginate(db, statement, [models.Media.id], cursor, limit, response)
+    return [schemas.MediaItem.model_validate(row) for row in rows]
+
+@router.get("/media/usage", response_model=List[schemas.MediaUsage])
+async def media_usage(
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    rows = (await sessions.execute(
+        db,
+        select(models.Media.media_type, func.count(models.Media.id), func.coalesce(func.sum(models.Media.size), 0))
+        .where(models.Media.owner_id == current_user.id)
+        .group_by(models.Media.media_type),
+    )).all()
+    return [{"media_type": kind, "count": count, "bytes": nbytes} for kind, count, nbytes in rows]
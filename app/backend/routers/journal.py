@@ -1,62 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Form, Body, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import models, schemas, dependencies
-import shutil
-import os
+import models, schemas, dependencies, principals, sessions, bulk, blobstore, ingest, media, gallery, derivatives, stats_cache, pagination, projections, conditional
 
 router = APIRouter(
     prefix="/journal",
     tags=["journal"],
+    route_class=sessions.SessionRoute,
 )
 
-UPLOAD_DIR = "uploads/journal"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+LIST_FIELDS = set(schemas.JournalListItem.model_fields) - {"owner"}
+SUMMARY_FIELDS = {"id", "title", "excerpt", "is_public", "created_at", "cover", "media_count", "owner_id"}
 
 @router.post("/", response_model=schemas.Journal)
 def create_journal(
     journal: schemas.JournalCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     db_journal = models.JournalEntry(**journal.dict(), owner_id=current_user.id)
     db.add(db_journal)
     db.commit()
+    stats_cache.invalidate(current_user.id)
     db.refresh(db_journal)
     return db_journal
 
-@router.post("/upload/{journal_id}")
+@router.post("/bulk", response_model=schemas.BulkReport)
+def bulk_journals(
+    batch: schemas.BulkRequest,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    report = bulk.apply(db, "journal", batch, schemas.JournalCreate, schemas.JournalBulkUpdate, current_user.id)
+    db.commit()
+    stats_cache.invalidate(current_user.id)
+    return report
+
+@router.post("/upload/{journal_id}", openapi_extra=ingest.form_schema("files", multiple=True))
 async def upload_journal_media(
     journal_id: int,
-    files: List[UploadFile] = File(...),
+    request: Request,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    journal = db.query(models.JournalEntry).filter(models.JournalEntry.id == journal_id, models.JournalEntry.owner_id == current_user.id).first()
+    journal = await sessions.run(db, lambda session: session.query(models.JournalEntry).filter(models.JournalEntry.id == journal_id, models.JournalEntry.owner_id == current_user.id).first())
     if not journal:
         raise HTTPException(status_code=404, detail="Journal entry not found")
-        
-    gallery = list(journal.media_gallery or [])
-    for file in files:
-        file_location = f"{UPLOAD_DIR}/{journal_id}_{file.filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-        
-        media_type = "video" if file.content_type.startswith("video") else "image"
-        gallery.append({"url": file_location, "type": media_type})
-        
-    journal.media_gallery = gallery
+
+    form = await ingest.receive_form(request, blobstore.INCOMING_DIR)
+    stored = await blobstore.store_all(db, form.uploads("files"))
+
+    def save(session):
+        # One transaction takes every reference, a later file over quota rolls back the earlier ones
+        blobs = [blobstore.acquire_upload(session, upload, current_user.id) for upload in stored]
+        gallery.add(session, "journal", journal.id, blobs, current_user.id)
+        session.commit()
+        for blob in blobs:
+            derivatives.schedule(blob, [("journal", journal.id)])
+        return journal.media_gallery
+
+    entries = await sessions.run(db, save)
+    stats_cache.invalidate(current_user.id)
+    return {"gallery": media.sign_gallery(entries)}
+
+@router.delete("/{journal_id}/media/{media_id}")
+def delete_journal_media(
+    journal_id: int,
+    media_id: int,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    parent = db.query(models.JournalEntry).filter(models.JournalEntry.id == journal_id, models.JournalEntry.owner_id == current_user.id).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Journal entry not found")
+    gallery.remove(db, "journal", parent.id, media_id, current_user.id)
+    db.commit()
+    stats_cache.invalidate(current_user.id)
+    return {"gallery": media.sign_gallery(parent.media_gallery)}
+
+@router.put("/{journal_id}/media/order")
+def reorder_journal_media(
+    journal_id: int,
+    media_ids: List[int] = Body(...),
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    parent = db.query(models.JournalEntry).filter(models.JournalEntry.id == journal_id, models.JournalEntry.owner_id == current_user.id).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Journal entry not found")
+    gallery.reorder(db, "journal", parent.id, media_ids)
     db.commit()
-    db.refresh(journal)
-    return {"gallery": journal.media_gallery}
+    return {"gallery": media.sign_gallery(parent.media_gallery)}
 
 @router.put("/{journal_id}", response_model=schemas.Journal)
 def update_journal(
     journal_id: int,
     journal_update: schemas.JournalCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     db_journal = db.query(models.JournalEntry).filter(models.JournalEntry.id == journal_id, models.JournalEntry.owner_id == current_user.id).first()
     if not db_journal:
@@ -67,6 +109,7 @@ def update_journal(
         setattr(db_journal, key, value)
     
     db.commit()
+    stats_cache.invalidate(current_user.id)
     db.refresh(db_journal)
     return db_journal
 
@@ -74,27 +117,44 @@ def update_journal(
 def delete_journal(
     journal_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     journal = db.query(models.JournalEntry).filter(models.JournalEntry.id == journal_id, models.JournalEntry.owner_id == current_user.id).first()
     if not journal:
         raise HTTPException(status_code=404, detail="Journal entry not found")
+    gallery.remove_all(db, "journal", journal.id, current_user.id)
     db.delete(journal)
     db.commit()
+    stats_cache.invalidate(current_user.id)
     return {"status": "deleted"}
 
-@router.get("/", response_model=List[schemas.Journal])
-def read_journals(
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+@router.get("/", response_model=List[schemas.JournalListItem], response_model_exclude_unset=True)
+async def read_journals(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    return db.query(models.JournalEntry).filter(models.JournalEntry.owner_id == current_user.id).offset(skip).limit(limit).all()
+    selected = projections.parse_fields(fields, LIST_FIELDS, SUMMARY_FIELDS)
+    expanded = projections.parse_expand(expand)
+    scope = models.JournalEntry.owner_id == current_user.id
+    not_modified = await conditional.listing(request, response, db, models.JournalEntry, scope, expand=expanded)
+    if not_modified:
+        return not_modified
+    order = [models.JournalEntry.created_at, models.JournalEntry.id]
+    statement = select(models.JournalEntry).where(scope)
+    statement = projections.apply(statement, models.JournalEntry, selected, expanded, always=order)
+    rows = await pagination.paginate(db, statement, order, cursor, limit, response)
+    return [projections.project(row, selected, expanded) for row in rows]
 
 @router.get("/{journal_id}", response_model=schemas.Journal)
-def read_journal(journal_id: int, db: Session = Depends(dependencies.get_db), current_user: models.User = Depends(dependencies.get_current_user)):
+def read_journal(journal_id: int, request: Request, response: Response, db: Session = Depends(dependencies.get_read_db), current_user: principals.Principal = Depends(dependencies.get_current_principal)):
     journal = db.query(models.JournalEntry).filter(models.JournalEntry.id == journal_id, models.JournalEntry.owner_id == current_user.id).first()
     if not journal:
         raise HTTPException(status_code=404, detail="Journal not found")
-    return journal
+    tag = conditional.etag("journal", journal.id, journal.version, journal.updated_at)
+    return conditional.respond(request, response, tag, last_modified=journal.updated_at) or journal
@@ -0,0 +1,28 @@
+import mimetypes
+import os
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+import media
+
+router = APIRouter(
+    prefix="/media",
+    tags=["media"],
+)
+
+@router.api_route("/{relative:path}", methods=["GET", "HEAD"])
+async def serve_media(relative: str, exp: int = 0, sig: str = ""):
+    if not media.verify(relative, exp, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired media link")
+    path = media.resolve(relative)
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Media not found")
+    # FileResponse answers Range/If-Range for video seeking and hands the file to
+    # the server with http.response.pathsend where the server supports it
+    cache_control = media.IMMUTABLE_CACHE_CONTROL if media.is_immutable(path) else media.MUTABLE_CACHE_CONTROL
+    return FileResponse(
+        path,
+        media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        headers={"Cache-Control": cache_control},
+    )
@@ -0,0 +1,16 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Response
+
+import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics(authorization: Optional[str] = Header(None)):
+    # Prometheus text format, per worker process
+    if not metrics.METRICS_TOKEN and not metrics.METRICS_PUBLIC:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if metrics.METRICS_TOKEN and authorization != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,69 +1,120 @@
-import models, schemas, dependencies
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body
-from sqlalchemy.orm import Session
+import models, schemas, dependencies, principals, sessions, bulk, blobstore, ingest, media, gallery, derivatives, stats_cache, conditional, profile_cache
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Dict
-import shutil
-import os
 
 router = APIRouter(
     prefix="/profile",
     tags=["profile"],
+    route_class=sessions.SessionRoute,
 )
 
-UPLOAD_DIR = "uploads/profile"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
-
 @router.post("/section", response_model=schemas.ProfileSection)
 def create_section(
     section: schemas.ProfileSectionCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     db_section = models.ProfileSection(**section.dict(), owner_id=current_user.id)
     db.add(db_section)
     db.commit()
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
     db.refresh(db_section)
     return db_section
 
-@router.post("/section/{section_id}/media")
+@router.post("/section/bulk", response_model=schemas.BulkReport)
+def bulk_sections(
+    batch: schemas.BulkRequest,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    report = bulk.apply(db, "section", batch, schemas.ProfileSectionCreate, schemas.ProfileSectionBulkUpdate, current_user.id)
+    db.commit()
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
+    return report
+
+@router.post("/section/{section_id}/media", openapi_extra=ingest.form_schema("files", multiple=True))
 async def upload_section_media(
     section_id: int,
-    files: List[UploadFile] = File(...),
+    request: Request,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    section = db.query(models.ProfileSection).filter(models.ProfileSection.id == section_id, models.ProfileSection.owner_id == current_user.id).first()
+    section = await sessions.run(db, lambda session: session.query(models.ProfileSection).filter(models.ProfileSection.id == section_id, models.ProfileSection.owner_id == current_user.id).first())
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
-        
-    gallery = list(section.media_gallery or [])
-    for file in files:
-        file_location = f"{UPLOAD_DIR}/sec_{section_id}_{file.filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-        
-        media_type = "video" if file.content_type.startswith("video") else "image"
-        gallery.append({"url": file_location, "type": media_type})
-        
-    section.media_gallery = gallery
+
+    form = await ingest.receive_form(request, blobstore.INCOMING_DIR)
+    stored = await blobstore.store_all(db, form.uploads("files"))
+
+    def save(session):
+        blobs = [blobstore.acquire_upload(session, upload, current_user.id) for upload in stored]
+        gallery.add(session, "section", section.id, blobs, current_user.id)
+        session.commit()
+        for blob in blobs:
+            derivatives.schedule(blob, [("section", section.id)])
+        return section.media_gallery
+
+    entries = await sessions.run(db, save)
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
+    return {"gallery": media.sign_gallery(entries)}
+
+@router.delete("/section/{section_id}/media/{media_id}")
+def delete_section_media(
+    section_id: int,
+    media_id: int,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    parent = db.query(models.ProfileSection).filter(models.ProfileSection.id == section_id, models.ProfileSection.owner_id == current_user.id).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Section not found")
+    gallery.remove(db, "section", parent.id, media_id, current_user.id)
     db.commit()
-    db.refresh(section)
-    return {"gallery": section.media_gallery}
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
+    return {"gallery": media.sign_gallery(parent.media_gallery)}
 
-@router.post("/picture")
+@router.put("/section/{section_id}/media/order")
+def reorder_section_media(
+    section_id: int,
+    media_ids: List[int] = Body(...),
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    parent = db.query(models.ProfileSection).filter(models.ProfileSection.id == section_id, models.ProfileSection.owner_id == current_user.id).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Section not found")
+    gallery.reorder(db, "section", parent.id, media_ids)
+    db.commit()
+    profile_cache.invalidate(current_user.id)
+    return {"gallery": media.sign_gallery(parent.media_gallery)}
+
+@router.post("/picture", openapi_extra=ingest.form_schema("file"))
 async def upload_profile_picture(
-    file: UploadFile = File(...),
+    request: Request,
     db: Session = Depends(dependencies.get_db),
     current_user: models.User = Depends(dependencies.get_current_user)
 ):
-    file_location = f"{UPLOAD_DIR}/user_{current_user.id}_{file.filename}"
-    with open(file_location, "wb+") as file_object:
-        shutil.copyfileobj(file.file, file_object)
-        
-    current_user.profile_picture = file_location
-    db.commit()
-    return {"profile_picture": file_location}
+    form = await ingest.receive_form(request, blobstore.INCOMING_DIR, max_files=1)
+    stored, = await blobstore.store_all(db, form.uploads("file"))
+
+    def save(session):
+        blob = blobstore.acquire_upload(session, stored, current_user.id)
+        blobstore.release(session, current_user.profile_picture, current_user.id)
+        current_user.profile_picture = blob.path
+        session.commit()
+        return current_user.profile_picture
+
+    picture = await sessions.run(db, save)
+    principals.invalidate(current_user.username)
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
+    return {"profile_picture": media.sign(picture)}
 
 @router.put("/theme")
 def update_profile_theme(
@@ -73,22 +124,27 @@ def update_profile_theme(
 ):
     current_user.profile_theme = theme
     db.commit()
+    principals.invalidate(current_user.username)
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
     return {"profile_theme": theme}
 
 @router.put("/reorder")
 def reorder_sections(
     order_map: Dict[int, int] = Body(...), # {section_id: new_order_index}
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    sections = db.query(models.ProfileSection).filter(models.ProfileSection.owner_id == current_user.id).all()
-    for section in sections:
-        if str(section.id) in order_map or section.id in order_map:
-             # handle string keys from JSON
-             key = str(section.id)
-             val = order_map.get(key) or order_map.get(section.id)
-             section.order = val
+    if order_map:
+        # One UPDATE ... CASE for every section instead of loading and writing them one by one
+        db.execute(
+            update(models.ProfileSection)
+            .where(models.ProfileSection.owner_id == current_user.id, models.ProfileSection.id.in_(list(order_map)))
+            .values(order=case(order_map, value=models.ProfileSection.id))
+        )
     db.commit()
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
     return {"status": "success"}
 
 @router.put("/section/{section_id}", response_model=schemas.ProfileSection)
@@ -96,7 +152,7 @@ def update_section(
     section_id: int,
     section_update: schemas.ProfileSectionCreate,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     db_section = db.query(models.ProfileSection).filter(models.ProfileSection.id == section_id, models.ProfileSection.owner_id == current_user.id).first()
     if not db_section:
@@ -107,6 +163,8 @@ def update_section(
         setattr(db_section, key, value)
     
     db.commit()
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
     db.refresh(db_section)
     return db_section
 
@@ -114,24 +172,43 @@ def update_section(
 def delete_section(
     section_id: int,
     db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
     section = db.query(models.ProfileSection).filter(models.ProfileSection.id == section_id, models.ProfileSection.owner_id == current_user.id).first()
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
+    gallery.remove_all(db, "section", section.id, current_user.id)
     db.delete(section)
     db.commit()
+    stats_cache.invalidate(current_user.id)
+    profile_cache.invalidate(current_user.id)
     return {"status": "deleted"}
 
 @router.get("/", response_model=List[schemas.ProfileSection])
-def get_profile(
-    db: Session = Depends(dependencies.get_db),
-    current_user: models.User = Depends(dependencies.get_current_user)
+async def get_profile(
+    request: Request,
+    response: Response,
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    return db.query(models.ProfileSection).filter(models.ProfileSection.owner_id == current_user.id).order_by(models.ProfileSection.order).all()
+    scope = models.ProfileSection.owner_id == current_user.id
+    not_modified = await conditional.listing(request, response, db, models.ProfileSection, scope)
+    if not_modified:
+        return not_modified
+    statement = (
+        select(models.ProfileSection)
+        .options(selectinload(models.ProfileSection.media_items), selectinload(models.ProfileSection.owner))
+        .where(scope)
+        .order_by(models.ProfileSection.order)
+    )
+    sections = (await sessions.execute(db, statement)).scalars().all()
+    return [schemas.ProfileSection.model_validate(section) for section in sections]
 
 @router.get("/me", response_model=schemas.User)
 def get_my_profile_meta(
-    current_user: models.User = Depends(dependencies.get_current_user)
+    request: Request,
+    response: Response,
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
 ):
-    return current_user
+    # The cached principal is the whole payload, so no query is needed for the validator
+    return conditional.respond(request, response, conditional.etag(current_user)) or current_user
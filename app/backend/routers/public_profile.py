@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session, selectinload
+
+import models, schemas, dependencies, sessions, conditional, media, profile_cache
+
+# Anyone's profile in one response: picture, theme and sections in order. Served
+# from profile_cache, a hit runs no query and no serialization.
+router = APIRouter(
+    prefix="/u",
+    tags=["profile"],
+    route_class=sessions.SessionRoute,
+)
+
+def render(db: Session, username: str):
+    built_at = profile_cache.generation()
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if user is None:
+        return None
+    sections = (
+        db.query(models.ProfileSection)
+        .options(selectinload(models.ProfileSection.media_items))
+        .filter(models.ProfileSection.owner_id == user.id)
+        .order_by(models.ProfileSection.order, models.ProfileSection.id)
+        .all()
+    )
+    url_expiry = media.expiry()
+    body = schemas.PublicProfile(
+        username=user.username,
+        profile_picture=user.profile_picture,
+        profile_theme=user.profile_theme,
+        sections=[schemas.PublicProfileSection.model_validate(section) for section in sections],
+    ).model_dump_json().encode()
+    updated = [row.updated_at for row in [user, *sections] if row.updated_at is not None]
+    entry = profile_cache.Entry(
+        user_id=user.id,
+        body=body,
+        etag=conditional.etag("profile", body),
+        last_modified=max(updated, default=None),
+        url_expiry=url_expiry,
+    )
+    profile_cache.put(username, entry, built_at)
+    return entry
+
+@router.get("/{username}", response_model=schemas.PublicProfile)
+async def read_public_profile(
+    username: str,
+    request: Request,
+    db: Session = Depends(dependencies.get_read_db)
+):
+    entry = profile_cache.get(username)
+    if entry is None:
+        entry = await sessions.run(db, render, username)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="User not found")
+    response = Response(content=entry.body, media_type="application/json")
+    return conditional.respond(request, response, entry.etag, private=False, last_modified=entry.last_modified) or response
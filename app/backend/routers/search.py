@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import schemas, dependencies, principals, sessions, search
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+    route_class=sessions.SessionRoute,
+)
+
+@router.get("/", response_model=List[schemas.SearchResult])
+def search_content(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = None, # comma separated: journal,blog,section
+    mine: bool = False,
+    limit: int = 20,
+    db: Session = Depends(dependencies.get_read_db),
+    current_user: Optional[principals.Principal] = Depends(dependencies.get_optional_principal)
+):
+    if not search.enabled(db.get_bind()):
+        raise HTTPException(status_code=501, detail="Search requires SQLite FTS5")
+    kinds = [k.strip() for k in kind.split(",")] if kind else None
+    user_id = current_user.id if current_user else None
+    return search.query(db, q, user_id, kinds=kinds, mine=mine, limit=limit)
@@ -0,0 +1,146 @@
+import time
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+import models, schemas, dependencies, principals, sessions, resumable, gallery, derivatives, media, metrics, stats_cache, profile_cache
+from routers import album
+
+# Resumable uploads, tus style: POST creates an upload of a declared length, PATCH
+# appends bytes at Upload-Offset, HEAD reports the offset to resume from and
+# POST /complete turns the file into an album item or gallery entry
+router = APIRouter(
+    prefix="/uploads",
+    tags=["uploads"],
+    route_class=sessions.SessionRoute,
+)
+
+@router.post("/", response_model=schemas.UploadSession, status_code=201)
+def create_upload(
+    spec: schemas.UploadSessionCreate,
+    response: Response,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    upload = resumable.create(db, current_user.id, spec)
+    db.commit()
+    response.headers["Location"] = f"{router.prefix}/{upload.id}"
+    response.headers.update(resumable.progress_headers(upload))
+    return upload
+
+@router.head("/{upload_id}")
+def upload_progress(
+    upload_id: str,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    upload = resumable.get(db, upload_id, current_user.id)
+    return Response(status_code=200, headers=resumable.progress_headers(upload))
+
+@router.get("/{upload_id}", response_model=schemas.UploadSession)
+def read_upload(
+    upload_id: str,
+    response: Response,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    upload = resumable.get(db, upload_id, current_user.id)
+    response.headers.update(resumable.progress_headers(upload))
+    return upload
+
+@router.patch("/{upload_id}", status_code=204)
+async def append_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    upload = await sessions.run(db, resumable.get, upload_id, current_user.id)
+    part = await run_in_threadpool(resumable.open_locked, upload.path)
+    try:
+        offset = await sessions.run(db, resumable.received, upload.id)
+        if offset is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if upload_offset != offset:
+            raise HTTPException(status_code=409, detail=f"Upload-Offset must be {offset}")
+        await run_in_threadpool(resumable.rewind, part, offset)
+        remaining = upload.length - offset
+        written = 0
+        started = time.perf_counter()
+        try:
+            async for chunk in request.stream():
+                if written + len(chunk) > remaining:
+                    raise HTTPException(status_code=413, detail="Chunk runs past the declared upload length")
+                await run_in_threadpool(part.write, chunk)
+                written += len(chunk)
+        except ClientDisconnect:
+            pass  # What arrived is kept, the client resumes from the recorded offset
+        await run_in_threadpool(resumable.sync, part)
+        metrics.observe_upload(written, time.perf_counter() - started)
+
+        def record(session):
+            moved = resumable.advance(session, upload.id, offset, offset + written)
+            session.commit()
+            return moved
+
+        if not await sessions.run(db, record):
+            raise HTTPException(status_code=409, detail="Upload changed during the request")
+    finally:
+        await run_in_threadpool(part.close)
+    upload = await sessions.run(db, lambda session: session.get(models.UploadSession, upload.id, populate_existing=True))
+    return Response(status_code=204, headers=resumable.progress_headers(upload))
+
+@router.post("/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    upload = await sessions.run(db, resumable.get, upload_id, current_user.id)
+    part = await run_in_threadpool(resumable.open_locked, upload.path)
+    try:
+        offset = await sessions.run(db, resumable.received, upload.id)
+        if offset is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if offset != upload.length:
+            raise HTTPException(status_code=409, detail=f"Upload incomplete, {offset} of {upload.length} bytes received")
+        digest = await run_in_threadpool(resumable.digest, part)
+
+        def save(session):
+            target, parent_id, is_public, filename = upload.target, upload.parent_id, upload.is_public, upload.filename
+            if target == "album":
+                blob = resumable.finalize(session, upload, digest)
+                return album.create_item(session, blob, is_public, current_user.id, filename)
+            model = gallery.PARENTS[target]
+            parent = session.query(model).filter(model.id == parent_id, model.owner_id == current_user.id).first()
+            if parent is None:
+                raise HTTPException(status_code=404, detail="Parent not found")
+            blob = resumable.finalize(session, upload, digest)
+            gallery.add(session, target, parent_id, [blob], current_user.id)
+            session.commit()
+            derivatives.schedule(blob, [(target, parent_id)])
+            return {"gallery": media.sign_gallery(parent.media_gallery)}
+
+        result = await sessions.run(db, save)
+    finally:
+        await run_in_threadpool(part.close)
+    stats_cache.invalidate(current_user.id)
+    if upload.target == "section":
+        profile_cache.invalidate(current_user.id)
+    return result
+
+@router.delete("/{upload_id}", status_code=204)
+def cancel_upload(
+    upload_id: str,
+    db: Session = Depends(dependencies.get_db),
+    current_user: principals.Principal = Depends(dependencies.get_current_principal)
+):
+    upload = resumable.get(db, upload_id, current_user.id)
+    path = upload.path
+    db.delete(upload)
+    db.commit()
+    resumable.remove_part(path)
+    return Response(status_code=204)
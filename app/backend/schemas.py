@@ -1,6 +1,14 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, PlainSerializer
+from typing import Annotated, Any, List, Optional
 from datetime import datetime
+import media
+
+# Stored upload paths go out as signed /media URLs
+MediaPath = Annotated[Optional[str], PlainSerializer(media.sign)]
+MediaGallery = Annotated[Optional[List[dict]], PlainSerializer(media.sign_gallery)]
+MediaEntry = Annotated[Optional[dict], PlainSerializer(media.sign_entry)]
+MediaVariants = Annotated[Optional[dict], PlainSerializer(media.sign_variants)]
+MediaSrcset = Annotated[Optional[str], PlainSerializer(media.sign_srcset)]
 
 class UserBase(BaseModel):
     username: str
@@ -11,11 +19,16 @@ class UserCreate(UserBase):
 
 class User(UserBase):
     id: int
-    profile_picture: Optional[str] = None
+    profile_picture: MediaPath = None
     profile_theme: Optional[dict] = None
     class Config:
         from_attributes = True
 
+class OwnerSummary(BaseModel):
+    id: int
+    username: str
+    profile_picture: MediaPath = None
+
 class JournalBase(BaseModel):
     title: str
     content: str
@@ -24,30 +37,64 @@ class JournalBase(BaseModel):
 class JournalCreate(JournalBase):
     design_config: Optional[dict] = None
 
+class JournalBulkUpdate(JournalCreate):
+    id: int
+
 class Journal(JournalBase):
     id: int
     created_at: datetime
-    media_gallery: Optional[List[dict]] = None
+    media_gallery: MediaGallery = None
     design_config: Optional[dict] = None
     owner_id: int
     owner: Optional[User] = None
     class Config:
         from_attributes = True
 
+# List projections, only the requested ?fields= are sent
+class JournalListItem(BaseModel):
+    id: int
+    title: Optional[str] = None
+    excerpt: Optional[str] = None
+    content: Optional[str] = None
+    is_public: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    cover: MediaEntry = None
+    media_count: Optional[int] = None
+    media_gallery: MediaGallery = None
+    design_config: Optional[dict] = None
+    owner_id: Optional[int] = None
+    owner: Optional[OwnerSummary] = None
+
 class AlbumItemBase(BaseModel):
     is_public: bool = False
 
 class AlbumItem(AlbumItemBase):
     id: int
-    file_path: str
+    file_path: Annotated[str, PlainSerializer(media.sign)]
     file_size: int
     media_type: str
     design_config: Optional[dict] = None
+    variants: MediaVariants = None
+    srcset: MediaSrcset = None
+    created_at: Optional[datetime] = None
     owner_id: int
     owner: Optional[User] = None
     class Config:
         from_attributes = True
 
+class AlbumListItem(BaseModel):
+    id: int
+    file_path: MediaPath = None
+    file_size: Optional[int] = None
+    media_type: Optional[str] = None
+    is_public: Optional[bool] = None
+    design_config: Optional[dict] = None
+    variants: MediaVariants = None
+    srcset: MediaSrcset = None
+    created_at: Optional[datetime] = None
+    owner_id: Optional[int] = None
+    owner: Optional[OwnerSummary] = None
+
 class BlogBase(BaseModel):
     title: str
     content: str
@@ -56,17 +103,39 @@ class BlogBase(BaseModel):
 class BlogCreate(BlogBase):
     design_config: Optional[dict] = None
 
+class BlogBulkUpdate(BlogCreate):
+    id: int
+
 class Blog(BlogBase):
     id: int
     ranking: int
     created_at: datetime
-    media_gallery: Optional[List[dict]] = None
+    media_gallery: MediaGallery = None
     design_config: Optional[dict] = None
     owner_id: int
     owner: Optional[User] = None
     class Config:
         from_attributes = True
 
+class BlogListItem(BaseModel):
+    id: int
+    title: Optional[str] = None
+    excerpt: Optional[str] = None
+    content: Optional[str] = None
+    tags: Optional[str] = None
+    ranking: Optional[int] = None
+    created_at: Optional[datetime] = None
+    cover: MediaEntry = None
+    media_count: Optional[int] = None
+    media_gallery: MediaGallery = None
+    design_config: Optional[dict] = None
+    owner_id: Optional[int] = None
+    owner: Optional[OwnerSummary] = None
+
+class TagCount(BaseModel):
+    name: str
+    count: int
+
 class ProfileSectionBase(BaseModel):
     section_type: str
     title: str
@@ -77,13 +146,82 @@ class ProfileSectionBase(BaseModel):
 class ProfileSectionCreate(ProfileSectionBase):
     pass
 
+class ProfileSectionBulkUpdate(ProfileSectionCreate):
+    id: int
+
 class ProfileSection(ProfileSectionBase):
     id: int
-    media_gallery: Optional[List[dict]] = None
+    media_gallery: MediaGallery = None
+    updated_at: Optional[datetime] = None
     owner_id: int
     owner: Optional[User] = None
     class Config:
         from_attributes = True
+
+class PublicProfileSection(ProfileSectionBase):
+    id: int
+    media_gallery: MediaGallery = None
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class PublicProfile(BaseModel):
+    # What GET /u/{username} shows anyone, no email
+    username: str
+    profile_picture: MediaPath = None
+    profile_theme: Optional[dict] = None
+    sections: List[PublicProfileSection] = []
+
+class UploadSessionCreate(BaseModel):
+    length: int
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    target: str = "album" # album, journal, blog or section
+    parent_id: Optional[int] = None
+    is_public: bool = False
+
+class UploadSession(BaseModel):
+    id: str
+    target: str
+    parent_id: Optional[int] = None
+    filename: str
+    media_type: str
+    length: int
+    received: int
+    expires_at: datetime
+    class Config:
+        from_attributes = True
+
+class MediaItem(BaseModel):
+    id: int
+    parent_type: str
+    parent_id: int
+    position: int
+    path: MediaPath = None
+    media_type: str
+    mime: Optional[str] = None
+    size: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    variants: MediaVariants = None
+    srcset: MediaSrcset = None
+    created_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class MediaUsage(BaseModel):
+    media_type: str
+    count: int
+    bytes: int
+
+class SearchResult(BaseModel):
+    kind: str
+    ref_id: int
+    owner_id: int
+    title: str # HTML: escaped text, matches in <mark>
+    snippet: str # HTML, as title
+    score: float
+
 class RecentActivity(BaseModel):
     id: int
     type: str
@@ -96,3 +234,20 @@ class DashboardStats(BaseModel):
     album_count: int
     storage_used_mb: float
     recent_activity: List[RecentActivity]
+
+# Batch create/update/delete, items are validated one by one so they stay raw here
+class BulkRequest(BaseModel):
+    create: List[dict] = []
+    update: List[dict] = []
+    delete: List[int] = []
+
+class BulkResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: int
+    error: Optional[Any] = None
+
+class BulkReport(BaseModel):
+    created: List[BulkResult] = []
+    updated: List[BulkResult] = []
+    deleted: List[BulkResult] = []
@@ -0,0 +1,159 @@
+import argparse
+import html
+import re
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import migrations
+from database import engine as default_engine
+
+# rowid = source id * KIND_SLOTS + kind code, so triggers touch exactly one index row
+KIND_SLOTS = 4
+KINDS = {"journal": 1, "blog": 2, "section": 3}
+SOURCES = {
+    # kind: (table, title, body, tags, is_public, columns that trigger a reindex)
+    "journal": ("journal_entries", "title", "content", "''", "COALESCE({row}.is_public, 0)", "title, content, is_public"),
+    "blog": ("blog_posts", "title", "content", "COALESCE({row}.tags, '')", "1", "title, content, tags"),
+    # Profile sections are only shown to their owner for now
+    "section": ("profile_sections", "title", "content", "COALESCE({row}.section_type, '')", "0", "title, content, section_type"),
+}
+
+# BM25 with title and tags weighted above body text, lower is better
+RANK = "bm25(search_index, 0, 0, 0, 0, 10.0, 1.0, 4.0)"
+# Very broad terms are scored over the newest matches only, bm25 over every
+# match of a word found in most documents costs far more than the search is worth
+MAX_CANDIDATES = 2000
+SNIPPET_TOKENS = 12
+MAX_RESULTS = 50
+# highlight()/snippet() mark matches with these, the text is escaped before they become <mark>
+MARK_OPEN, MARK_CLOSE = "\ue000", "\ue001"
+
+
+def enabled(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def _values(kind, row):
+    table, title, body, tags, is_public, _ = SOURCES[kind]
+    return (
+        f"{row}.id * {KIND_SLOTS} + {KINDS[kind]}, '{kind}', {row}.id, {row}.owner_id, "
+        f"{is_public.format(row=row)}, COALESCE({row}.{title}, ''), COALESCE({row}.{body}, ''), "
+        f"{tags.format(row=row)}"
+    )
+
+
+COLUMNS = "rowid, kind, ref_id, owner_id, is_public, title, body, tags"
+
+
+def _ddl():
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, owner_id UNINDEXED, is_public UNINDEXED, "
+        "title, body, tags, tokenize = 'porter unicode61')"
+    ]
+    for kind, (table, *_rest, watched) in SOURCES.items():
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * {KIND_SLOTS} + {KINDS[kind]};"
+        insert = f"INSERT INTO search_index ({COLUMNS}) VALUES ({_values(kind, 'new')});"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF {watched} ON {table} BEGIN {delete} {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        ]
+    return statements
+
+
+def rebuild(conn):
+    conn.execute(text("DELETE FROM search_index"))
+    for kind, (table, *_rest) in SOURCES.items():
+        conn.execute(text(f"INSERT INTO search_index ({COLUMNS}) SELECT {_values(kind, table)} FROM {table}"))
+    conn.execute(text("INSERT INTO search_index(search_index) VALUES ('optimize')"))
+
+
+def ensure_index(engine: Engine):
+    # Triggers keep the index current on every create, update and delete
+    if not enabled(engine):
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+        ).first()
+        for statement in _ddl():
+            conn.execute(text(statement))
+        if not exists:
+            rebuild(conn)
+
+
+def to_match_query(q: str) -> Optional[str]:
+    # Treat input as plain words, never as FTS5 syntax; the last word matches as a prefix
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    quoted = ['"' + t.replace('"', '""') + '"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def query(db: Session, q: str, user_id: Optional[int], kinds=None, mine: bool = False, limit: int = 20):
+    match = to_match_query(q)
+    if match is None:
+        return []
+    params = {"match": match, "limit": max(1, min(limit, MAX_RESULTS)), "candidates": MAX_CANDIDATES}
+    filters = []
+    if mine and user_id is not None:
+        filters.append("owner_id = :user_id")
+    elif user_id is not None:
+        filters.append("(is_public = 1 OR owner_id = :user_id)")
+    else:
+        filters.append("is_public = 1")
+    params["user_id"] = user_id
+    if kinds:
+        names = [k for k in kinds if k in KINDS]
+        if not names:
+            return []
+        filters.append("kind IN (" + ", ".join(f"'{k}'" for k in names) + ")")
+    visible = " AND ".join(filters)
+    # The cutoff counts only matches the caller may see, other users' private rows
+    # can't push their results out of the candidates
+    filters.append(
+        "rowid >= COALESCE((SELECT rowid FROM search_index WHERE search_index MATCH :match "
+        f"AND {visible} ORDER BY rowid DESC LIMIT 1 OFFSET :candidates), 0)"
+    )
+    where = " AND ".join(filters)
+    # Rank and limit first, so highlight/snippet only run for the rows returned
+    rows = db.execute(
+        text(
+            "WITH top AS ("
+            f"SELECT rowid AS id, {RANK} AS score FROM search_index WHERE search_index MATCH :match AND {where} "
+            "ORDER BY score LIMIT :limit) "
+            "SELECT kind, ref_id, owner_id, "
+            f"highlight(search_index, 4, '{MARK_OPEN}', '{MARK_CLOSE}') AS title, "
+            f"snippet(search_index, 5, '{MARK_OPEN}', '{MARK_CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet, "
+            "top.score AS score "
+            "FROM search_index JOIN top ON search_index.rowid = top.id "
+            "WHERE search_index MATCH :match ORDER BY top.score"
+        ),
+        params,
+    ).mappings().all()
+    return [dict(row, title=_marked(row["title"]), snippet=_marked(row["snippet"])) for row in rows]
+
+
+def _marked(text: str) -> str:
+    # Stored text is user input, only the <mark> tags around matches are markup
+    return html.escape(text or "").replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the full-text search index")
+    parser.add_argument("--rebuild", action="store_true", help="drop and repopulate every index row")
+    args = parser.parse_args()
+    migrations.upgrade(default_engine)
+    ensure_index(default_engine)
+    if args.rebuild:
+        with default_engine.begin() as conn:
+            rebuild(conn)
+    with default_engine.connect() as conn:
+        count = conn.execute(text("SELECT count(*) FROM search_index")).scalar()
+    print(f"search_index: {count} rows")
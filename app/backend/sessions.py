@@ -0,0 +1,68 @@
+import functools
+import inspect
+
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
+
+import database, profiling
+
+
+async def run(db, fn, *args):
+    # Session-based code called from an async handler: in the threadpool for a
+    # Session, inside run_sync for an AsyncSession, never on the event loop itself
+    if database.ASYNC_DB:
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(profiling.profiled(fn), db, *args)
+
+
+async def execute(db, statement):
+    # One statement from an async handler, the result comes back fully buffered.
+    # Awaited natively on an AsyncSession, no handler code runs inside run_sync.
+    if database.ASYNC_DB:
+        return await db.execute(statement)
+    return await run(db, lambda session: session.execute(statement, execution_options={"prebuffer_rows": True}))
+
+
+def _session_param(fn):
+    for name, param in inspect.signature(fn).parameters.items():
+        if getattr(param.default, "dependency", None) in (database.get_async_db, database.get_async_read_db):
+            return name
+    return None
+
+
+def session_handler(fn, response_model=None):
+    # Runs a sync handler against the AsyncSession's sync view. The response is
+    # validated inside run_sync as well, lazy loads can't happen after it returns.
+    name = _session_param(fn)
+    if name is None:
+        return fn
+    adapter = TypeAdapter(response_model) if response_model is not None else None
+
+    @functools.wraps(fn)
+    async def handler(**kwargs):
+        def call(session):
+            result = fn(**dict(kwargs, **{name: session}))
+            if adapter is None or isinstance(result, Response):
+                return result
+            return adapter.validate_python(result, from_attributes=True)
+        return await kwargs[name].run_sync(call)
+
+    return handler
+
+
+class SessionRoute(APIRoute):
+    # With DB_ASYNC, sync handlers are served from the event loop through
+    # AsyncSession instead of taking a threadpool slot each. Hot read routes are
+    # async handlers awaiting execute() and skip run_sync altogether.
+    def __init__(self, path, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = profiling.profiled(endpoint)
+            if database.ASYNC_DB:
+                model = kwargs.get("response_model")
+                if isinstance(model, DefaultPlaceholder):
+                    model = model.value
+                endpoint = session_handler(endpoint, model)
+        super().__init__(path, endpoint, **kwargs)
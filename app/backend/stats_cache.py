@@ -0,0 +1,43 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Per-worker LRU of dashboard stats. Write endpoints invalidate their user's
+# entry, the TTL bounds staleness from writes handled by other workers.
+TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL", "30"))
+MAX_ENTRIES = int(os.getenv("STATS_CACHE_SIZE", "1024"))
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+
+
+def get(user_id: int):
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None:
+            return None
+        stored_at, stats = entry
+        if time.monotonic() - stored_at > TTL_SECONDS:
+            del _entries[user_id]
+            return None
+        _entries.move_to_end(user_id)
+        return stats
+
+
+def put(user_id: int, stats):
+    with _lock:
+        _entries[user_id] = (time.monotonic(), stats)
+        _entries.move_to_end(user_id)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def invalidate(user_id: int):
+    with _lock:
+        _entries.pop(user_id, None)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,145 @@
+from collections import Counter, defaultdict
+from typing import List, Optional
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+MAX_TAGS = 20  # per post, any beyond stay in the tags string but aren't indexed
+MAX_LENGTH = 64
+BATCH_SIZE = 500
+
+_posts = models.BlogPost
+_links = models.BlogPostTag
+_tags = models.Tag.__table__
+
+_link_table = _links.__table__
+_unlink = delete(_link_table).where(_link_table.c.post_id == bindparam("b_post_id"), _link_table.c.tag_id == bindparam("b_tag_id"))
+_recount = update(_tags).where(_tags.c.id == bindparam("tag_id")).values(post_count=_tags.c.post_count + bindparam("delta"))
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.split()).lower()[:MAX_LENGTH]
+
+
+def parse(tags: Optional[str]) -> List[str]:
+    # The comma separated tags string stays as written, these are the names it's indexed under
+    names = []
+    for part in (tags or "").split(","):
+        name = normalize(part)
+        if name and name not in names:
+            names.append(name)
+    return names[:MAX_TAGS]
+
+
+def _tag_ids(db: Session, names) -> dict:
+    if not names:
+        return {}
+    stmt = dialect_insert(db, models.Tag).on_conflict_do_nothing(index_elements=[models.Tag.name])
+    db.execute(stmt, [{"name": name, "post_count": 0} for name in names])
+    return dict(db.execute(select(models.Tag.name, models.Tag.id).where(models.Tag.name.in_(names))).all())
+
+
+def _count(db: Session, deltas: Counter):
+    # Relative updates, counts are never recounted from the join table
+    changes = [{"tag_id": tag_id, "delta": delta} for tag_id, delta in deltas.items() if delta]
+    if changes:
+        db.execute(_recount, changes)
+
+
+def sync(db: Session, post_ids):
+    # Brings the join rows and tag counts of these posts in line with their tags
+    # strings. Call after the posts are written, in the same transaction.
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    posts = db.execute(
+        select(_posts.id, _posts.tags, _posts.hot_score, _posts.ranking, _posts.created_at).where(_posts.id.in_(post_ids))
+    ).all()
+    current = defaultdict(set)
+    for post_id, tag_id in db.execute(select(_links.post_id, _links.tag_id).where(_links.post_id.in_(post_ids))):
+        current[post_id].add(tag_id)
+    wanted = {post.id: parse(post.tags) for post in posts}
+    ids = _tag_ids(db, sorted({name for names in wanted.values() for name in names}))
+
+    added, removed, deltas = [], [], Counter()
+    for post in posts:
+        target = {ids[name] for name in wanted[post.id]}
+        for tag_id in target - current[post.id]:
+            added.append({
+                "post_id": post.id, "tag_id": tag_id,
+                "hot_score": post.hot_score, "ranking": post.ranking, "created_at": post.created_at,
+            })
+            deltas[tag_id] += 1
+        for tag_id in current[post.id] - target:
+            removed.append({"b_post_id": post.id, "b_tag_id": tag_id})
+            deltas[tag_id] -= 1
+    if removed:
+        db.execute(_unlink, removed)
+    if added:
+        db.execute(insert(_links), added)
+    _count(db, deltas)
+
+
+def detach(db: Session, post_ids):
+    # Before the posts themselves are deleted
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    counts = db.execute(
+        select(_links.tag_id, func.count()).where(_links.post_id.in_(post_ids)).group_by(_links.tag_id)
+    ).all()
+    _count(db, Counter({tag_id: -count for tag_id, count in counts}))
+    db.execute(delete(_links).where(_links.post_id.in_(post_ids)))
+
+
+def copy_sort_keys(db: Session, post_ids):
+    # After a post's ranking or hot score changed, its join rows follow in one statement
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    db.execute(
+        update(_links)
+        .where(_links.post_id.in_(post_ids))
+        .values(
+            hot_score=select(_posts.hot_score).where(_posts.id == _links.post_id).scalar_subquery(),
+            ranking=select(_posts.ranking).where(_posts.id == _links.post_id).scalar_subquery(),
+        )
+    )
+
+
+def cloud(db: Session, limit: int):
+    # Most used first, read from the (post_count, name) index
+    return db.execute(
+        select(models.Tag.name, models.Tag.post_count)
+        .where(models.Tag.post_count > 0)
+        .order_by(models.Tag.post_count.desc(), models.Tag.name)
+        .limit(limit)
+    ).all()
+
+
+def backfill(bind: Engine):
+    # Indexes posts written before the tag tables existed. Workers starting together
+    # may race for a batch, the loser hits the join table's key and drops its batch.
+    linked = select(_links.post_id).where(_links.post_id == _posts.id).exists()
+    with Session(bind) as db:
+        last_id = 0
+        while True:
+            post_ids = db.scalars(
+                select(_posts.id)
+                .where(_posts.id > last_id, _posts.tags.isnot(None), _posts.tags != "", ~linked)
+                .order_by(_posts.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not post_ids:
+                break
+            last_id = post_ids[-1]
+            try:
+                sync(db, post_ids)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
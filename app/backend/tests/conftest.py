@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app opens ./sql_app.db and writes under ./uploads, both relative to the
+# working directory, so every test session runs in a scratch directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.chdir(WORK_DIR)
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", f"sqlite:///{WORK_DIR}/sql_app.db")
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def auth(client):
+    client.post("/auth/register", json={"username": "tester", "email": "tester@example.com", "password": "pw"})
+    token = client.post("/auth/token", data={"username": "tester", "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
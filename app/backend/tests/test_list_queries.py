@@ -0,0 +1,78 @@
+import contextlib
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+import database, models
+
+_authors = itertools.count()
+
+ENDPOINTS = [
+    ("/journal/", {}),
+    ("/blog/", {"expand": "owner"}),
+    ("/album/", {}),
+]
+
+
+@contextlib.contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def add_rows(count: int):
+    # Every row has a gallery and every post its own author, so a lazy load would show up per row
+    db = database.SessionLocal()
+    try:
+        owner = db.query(models.User).filter(models.User.username == "tester").one()
+        for i in range(count):
+            n = next(_authors)
+            author = models.User(username=f"author{n}", email=f"author{n}@example.com", hashed_password="x")
+            db.add(author)
+            db.flush()
+            journal = models.JournalEntry(title=f"Journal {i}", content="text", owner_id=owner.id)
+            blog = models.BlogPost(title=f"Post {i}", content="text", tags="test", owner_id=author.id)
+            db.add_all([journal, blog])
+            db.flush()
+            for kind, parent_id, owner_id in (("journal", journal.id, owner.id), ("blog", blog.id, author.id)):
+                db.add(models.Media(
+                    owner_id=owner_id, parent_type=kind, parent_id=parent_id, position=0,
+                    path=f"uploads/blobs/{kind}-{parent_id}.jpg", size=1, media_type="image",
+                ))
+            db.add(models.AlbumItem(file_path=f"uploads/blobs/album-{i}.jpg", file_size=1, media_type="image", owner_id=owner.id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def statements_for(client, auth, path, params, expected_rows):
+    with count_statements() as statements:
+        response = client.get(path, params=params, headers=auth)
+    assert response.status_code == 200
+    assert len(response.json()) == expected_rows
+    return len(statements)
+
+
+@pytest.mark.parametrize("path,params", ENDPOINTS)
+def test_list_statements_do_not_grow_with_rows(client, auth, path, params):
+    for endpoint, endpoint_params in ENDPOINTS:
+        client.get(endpoint, params=endpoint_params, headers=auth)  # caches the principal
+    rows = len(client.get(path, params=params, headers=auth).json())
+
+    add_rows(3)
+    few = statements_for(client, auth, path, params, rows + 3)
+    add_rows(12)
+    many = statements_for(client, auth, path, params, rows + 15)
+    assert few == many
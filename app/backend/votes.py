@@ -0,0 +1,140 @@
+import datetime
+import logging
+import os
+import threading
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.orm import Session
+
+import models, feed
+from database import SessionLocal, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv("VOTE_FLUSH_INTERVAL", "0.5"))
+MAX_VOTE = 1
+
+_lock = threading.Lock()
+_votes = {}   # (post_id, user_id) -> value not yet written
+_deltas = {}  # post_id -> ranking change this worker expects, only shown until the flush
+_flushing = {}  # votes being written by the current flush
+_stop = threading.Event()
+_thread = None
+
+_posts = models.BlogPost.__table__
+_stored = (
+    select(models.BlogVote.value)
+    .where(models.BlogVote.post_id == bindparam("b_post_id"), models.BlogVote.user_id == bindparam("b_user_id"))
+    .scalar_subquery()
+)
+# new - old against the stored vote, read inside the write so votes for one user
+# flushed by two workers both count once
+_apply_vote = (
+    update(_posts)
+    .where(_posts.c.id == bindparam("b_post_id"))
+    .values(ranking=func.coalesce(_posts.c.ranking, 0) + bindparam("b_value") - func.coalesce(_stored, 0))
+)
+
+
+def _stored_vote(db: Session, post_id: int, user_id: int) -> int:
+    vote = db.get(models.BlogVote, (post_id, user_id))
+    return vote.value if vote is not None else 0
+
+
+def pending_delta(post_id: int) -> int:
+    with _lock:
+        return _deltas.get(post_id, 0)
+
+
+def record(db: Session, post_id: int, user_id: int, value: int) -> int:
+    # One vote per user and post, clamped to -1..1, so a repeat vote is a no-op. The
+    # delta returned is this worker's estimate, flush() works out the real one.
+    value = max(-MAX_VOTE, min(MAX_VOTE, int(value)))
+    key = (post_id, user_id)
+    with _lock:
+        previous = _votes.get(key, _flushing.get(key))
+    if previous is None:
+        previous = _stored_vote(db, post_id, user_id)
+    with _lock:
+        # Re-read under the lock, another request may have buffered a vote meanwhile
+        previous = _votes.get(key, _flushing.get(key, previous))
+        delta = value - previous
+        _votes[key] = value
+        if delta:
+            _deltas[post_id] = _deltas.get(post_id, 0) + delta
+            if not _deltas[post_id]:
+                del _deltas[post_id]
+    return delta
+
+
+def flush():
+    with _lock:
+        votes, deltas = dict(_votes), dict(_deltas)
+        _votes.clear()
+        _deltas.clear()
+        _flushing.update(votes)
+    if not votes and not deltas:
+        return 0
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        if votes:
+            # Locks the posts (where the database can), concurrent flushes for them wait
+            # here. Votes for posts deleted since they were cast are dropped.
+            existing = set(db.scalars(
+                select(_posts.c.id).where(_posts.c.id.in_({post_id for post_id, _ in votes})).with_for_update()
+            ))
+            votes = {key: value for key, value in votes.items() if key[0] in existing}
+        if votes:
+            # Applied before the upsert below, so each reads the vote it replaces
+            db.execute(_apply_vote, [
+                {"b_post_id": post_id, "b_user_id": user_id, "b_value": value}
+                for (post_id, user_id), value in votes.items()
+            ])
+            feed.rescore(db, existing)
+            stmt = dialect_insert(db, models.BlogVote)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.BlogVote.post_id, models.BlogVote.user_id],
+                set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+            )
+            db.execute(stmt, [
+                {"post_id": post_id, "user_id": user_id, "value": value, "updated_at": now}
+                for (post_id, user_id), value in votes.items()
+            ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Vote flush failed, keeping %d votes buffered", len(votes))
+        with _lock:
+            for key, value in votes.items():
+                _votes.setdefault(key, value)
+            for post_id, delta in deltas.items():
+                _deltas[post_id] = _deltas.get(post_id, 0) + delta
+        return 0
+    finally:
+        db.close()
+        with _lock:
+            _flushing.clear()
+    return len(votes)
+
+
+def _run():
+    while not _stop.wait(FLUSH_INTERVAL):
+        flush()
+
+
+def start():
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="vote-flusher", daemon=True)
+        _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=FLUSH_INTERVAL * 4)
+        _thread = None
+    flush()
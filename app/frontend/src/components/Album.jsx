@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { Camera, Image as ImageIcon, Video, Trash2, Palette, User as UserIcon, Type, Edit3, Save, Bold, Italic, AlignLeft, AlignCenter, AlignRight } from 'lucide-react';
 import { useAuth } from '../context/AuthContext';
+import { mediaUrl, mediaSrcSet } from '../utils/media';
 
 const Album = () => {
     const [items, setItems] = useState([]);
@@ -141,7 +142,7 @@ const Album = () => {
                         style={{ ...getCardStyle(item.design_config), padding: '1rem', display: 'flex', flexDirection: 'column' }}
                     >
                         <div style={{ position: 'relative', borderRadius: 'var(--radius-lg)', overflow: 'hidden', boxShadow: '0 4px 12px rgba(0,0,0,0.1)', flex: 1, maxHeight: item.design_config?.customHeight ? `${item.design_config.customHeight - 80}px` : '270px' }}>
-                            {item.media_type === 'video' ? <video src={`http://localhost:8000/${item.file_path}`} controls style={{ width: '100%', height: '100%', objectFit: 'cover' }} /> : <img src={`http://localhost:8000/${item.file_path}`} alt="Asset" style={{ width: '100%', height: '100%', objectFit: 'cover' }} />}
+                            {item.media_type === 'video' ? <video src={mediaUrl(item.file_path)} controls style={{ width: '100%', height: '100%', objectFit: 'cover' }} /> : <img src={mediaUrl(item.file_path)} srcSet={mediaSrcSet(item.variants)} sizes="(max-width: 768px) 100vw, 33vw" loading="lazy" alt="Asset" style={{ width: '100%', height: '100%', objectFit: 'cover' }} />}
 
                             <div style={{ position: 'absolute', top: '10px', right: '10px', display: 'flex', gap: '0.5rem' }}>
                                 <button onClick={() => startEdit(item)} style={{ background: 'rgba(255,255,255,0.8)', color: 'var(--sidebar-bg)', border: 'none', padding: '0.4rem', borderRadius: '50%', cursor: 'pointer' }}><Edit3 size={14} /></button>
@@ -3,12 +3,14 @@ import axios from 'axios';
 import { useAuth } from '../context/AuthContext';
 import { Palette, Layers, Save, Trash2, Edit3, User as UserIcon, Calendar, Hash, Type, Bold, Italic, AlignLeft, AlignCenter, AlignRight, Camera, Video as VideoIcon, X } from 'lucide-react';
 import MediaCarousel from './MediaCarousel';
+import { mediaUrl, mediaSrcSet } from '../utils/media';
 
 const Blog = () => {
     const [posts, setPosts] = useState([]);
     const [showForm, setShowForm] = useState(false);
     const [editingId, setEditingId] = useState(null);
     const [previews, setPreviews] = useState([]);
+    const [opened, setOpened] = useState({}); // id -> full post, fetched when a card is opened
     const { user } = useAuth();
 
     const [formState, setFormState] = useState({
@@ -26,11 +28,31 @@ const Blog = () => {
 
     const fetchPosts = async () => {
         try {
-            const res = await axios.get('http://localhost:8000/blog/');
+            // Summaries only, the full post is fetched when its card is opened
+            const res = await axios.get('http://localhost:8000/blog/', { params: { fields: 'title,excerpt,tags,ranking,created_at,cover,media_count,owner_id', expand: 'owner' } });
             setPosts(res.data);
         } catch (err) { console.error(err); }
     };
 
+    const loadPost = async (id) => {
+        if (opened[id]) return opened[id];
+        const res = await axios.get(`http://localhost:8000/blog/${id}`);
+        setOpened(prev => ({ ...prev, [id]: res.data }));
+        return res.data;
+    };
+
+    const togglePost = async (id) => {
+        if (opened[id]) { setOpened(({ [id]: _, ...rest }) => rest); return; }
+        try { await loadPost(id); } catch (err) { console.error(err); }
+    };
+
+    const summarize = (post) => ({
+        ...post,
+        excerpt: post.content.slice(0, 200),
+        cover: post.media_gallery?.[0] || null,
+        media_count: post.media_gallery?.length || 0
+    });
+
     const handleFileChange = (e) => {
         const files = Array.from(e.target.files);
         setFormState({ ...formState, mediaFiles: [...formState.mediaFiles, ...files] });
@@ -64,16 +86,21 @@ const Blog = () => {
             let res;
             if (editingId) res = await axios.put(`http://localhost:8000/blog/${editingId}`, payload);
             else res = await axios.post('http://localhost:8000/blog/', payload);
+            let saved = res.data;
 
             if (formState.mediaFiles.length > 0) {
                 const formData = new FormData();
                 for (let file of formState.mediaFiles) {
                     formData.append('files', file);
                 }
-                await axios.post(`http://localhost:8000/blog/${res.data.id}/media`, formData);
+                const upload = await axios.post(`http://localhost:8000/blog/${res.data.id}/media`, formData);
+                saved = { ...saved, media_gallery: upload.data.gallery };
             }
 
-            resetForm(); fetchPosts();
+            // Patch the list locally instead of refetching it, the saved post stays open
+            setOpened(prev => ({ ...prev, [saved.id]: saved }));
+            setPosts(prev => editingId ? prev.map(item => item.id === saved.id ? { ...item, ...summarize(saved) } : item) : [summarize(saved), ...prev]);
+            resetForm();
         } catch (err) { console.error(err); }
     };
 
@@ -94,10 +121,12 @@ const Blog = () => {
 
     const deletePost = async (id) => {
         if (!confirm("Delete this story?")) return;
-        try { await axios.delete(`http://localhost:8000/blog/${id}`); fetchPosts(); } catch (err) { console.error(err); }
+        try { await axios.delete(`http://localhost:8000/blog/${id}`); setPosts(prev => prev.filter(item => item.id !== id)); } catch (err) { console.error(err); }
     };
 
-    const startEdit = (post) => {
+    const startEdit = async (summary) => {
+        let post;
+        try { post = await loadPost(summary.id); } catch (err) { console.error(err); return; }
         setEditingId(post.id);
         setFormState({
             title: post.title, content: post.content, tags: post.tags, mediaFiles: [],
@@ -216,26 +245,36 @@ const Blog = () => {
             )}
 
             <div className="profile-grid">
-                {posts.map(post => (
+                {posts.map(post => {
+                    const full = opened[post.id];
+                    return (
                     <div
                         key={post.id}
-                        className={`glass-panel col-span-${post.design_config?.width || 6} ${post.design_config?.backgroundType === 'glass' ? 'glass-effect' : ''}`}
-                        style={getStyle(post.design_config)}
+                        className={`glass-panel col-span-${full?.design_config?.width || 6} ${full?.design_config?.backgroundType === 'glass' ? 'glass-effect' : ''}`}
+                        style={getStyle(full?.design_config)}
                     >
                         <div style={{ display: 'flex', justifyContent: 'space-between', marginBottom: '1.5rem' }}>
-                            <h2 style={{ fontSize: '1.8rem', fontWeight: 900, letterSpacing: '-0.02em' }}>{post.title}</h2>
+                            <h2 style={{ fontSize: '1.8rem', fontWeight: 900, letterSpacing: '-0.02em', cursor: 'pointer' }} onClick={() => togglePost(post.id)}>{post.title}</h2>
                             <div style={{ display: 'flex', gap: '1rem' }}>
                                 <Edit3 size={20} style={{ cursor: 'pointer', opacity: 0.5 }} onClick={() => startEdit(post)} />
                                 <Trash2 size={20} style={{ cursor: 'pointer', opacity: 0.5 }} onClick={() => deletePost(post.id)} />
                             </div>
                         </div>
 
-                        {post.media_gallery && post.media_gallery.length > 0 && (
-                            <div style={{ marginBottom: '2rem' }}>
-                                <MediaCarousel
-                                    media={post.media_gallery}
-                                    height={post.design_config?.customHeight ? `${post.design_config.customHeight * 0.75}px` : '400px'}
-                                />
+                        {full ? (
+                            full.media_gallery && full.media_gallery.length > 0 && (
+                                <div style={{ marginBottom: '2rem' }}>
+                                    <MediaCarousel
+                                        media={full.media_gallery}
+                                        height={full.design_config?.customHeight ? `${full.design_config.customHeight * 0.75}px` : '400px'}
+                                    />
+                                </div>
+                            )
+                        ) : post.cover && (
+                            <div style={{ marginBottom: '2rem', borderRadius: '0.75rem', overflow: 'hidden', cursor: 'pointer' }} onClick={() => togglePost(post.id)}>
+                                {post.cover.type === 'video'
+                                    ? <video src={mediaUrl(post.cover.url)} style={{ width: '100%', height: '260px', objectFit: 'cover' }} />
+                                    : <img src={mediaUrl(post.cover.url)} srcSet={mediaSrcSet(post.cover.variants)} sizes="50vw" loading="lazy" style={{ width: '100%', height: '260px', objectFit: 'cover' }} />}
                             </div>
                         )}
 
@@ -249,14 +288,18 @@ const Blog = () => {
                             </div>
                         )}
 
-                        <p style={{ whiteSpace: 'pre-wrap', lineHeight: 1.8, opacity: 0.9 }}>{post.content}</p>
+                        <p style={{ whiteSpace: 'pre-wrap', lineHeight: 1.8, opacity: 0.9 }}>{full ? full.content : post.excerpt}</p>
+                        <button type="button" className="btn" style={{ marginTop: '1rem', fontSize: '0.8rem' }} onClick={() => togglePost(post.id)}>
+                            {full ? 'Show less' : `Read more${post.media_count > 1 ? ` · ${post.media_count} photos & videos` : ''}`}
+                        </button>
 
                         <div style={{ marginTop: 'auto', paddingTop: '2rem', display: 'flex', justifyContent: 'space-between', fontSize: '0.85rem', opacity: 0.6 }}>
                             <span style={{ display: 'flex', alignItems: 'center', gap: '0.5rem' }}><Calendar size={16} /> {new Date(post.created_at).toLocaleDateString()}</span>
                             <span style={{ display: 'flex', alignItems: 'center', gap: '0.5rem' }}><UserIcon size={16} /> Story by {post.owner?.username || user?.username}</span>
                         </div>
                     </div>
-                ))}
+                    );
+                })}
             </div>
         </div>
     );
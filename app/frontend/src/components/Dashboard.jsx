@@ -76,7 +76,7 @@ const Dashboard = () => {
                 {stats?.recent_activity?.length > 0 ? (
                     <div style={{ display: 'flex', flexDirection: 'column', gap: '1rem' }}>
                         {stats.recent_activity.map((act, i) => (
-                            <div key={`${act.type}-${act.id}`} style={{
+                            <div key={`${act.type}-${act.id}-${i}`} style={{
                                 display: 'flex',
                                 alignItems: 'center',
                                 justifyContent: 'space-between',
@@ -3,12 +3,14 @@ import axios from 'axios';
 import { useAuth } from '../context/AuthContext';
 import { Palette, Layers, Save, Trash2, Edit3, User as UserIcon, Calendar, Type, Bold, Italic, AlignLeft, AlignCenter, AlignRight, Camera, Image as ImageIcon, X } from 'lucide-react';
 import MediaCarousel from './MediaCarousel';
+import { mediaUrl, mediaSrcSet } from '../utils/media';
 
 const Journal = () => {
     const [entries, setEntries] = useState([]);
     const [showForm, setShowForm] = useState(false);
     const [editingId, setEditingId] = useState(null);
     const [previews, setPreviews] = useState([]);
+    const [opened, setOpened] = useState({}); // id -> full entry, fetched when a card is opened
     const { user } = useAuth();
 
     const [formState, setFormState] = useState({
@@ -26,11 +28,31 @@ const Journal = () => {
 
     const fetchEntries = async () => {
         try {
-            const res = await axios.get('http://localhost:8000/journal/');
+            // Summaries only, the full entry is fetched when its card is opened
+            const res = await axios.get('http://localhost:8000/journal/', { params: { fields: 'title,excerpt,is_public,created_at,cover,media_count,owner_id' } });
             setEntries(res.data);
         } catch (err) { console.error(err); }
     };
 
+    const loadEntry = async (id) => {
+        if (opened[id]) return opened[id];
+        const res = await axios.get(`http://localhost:8000/journal/${id}`);
+        setOpened(prev => ({ ...prev, [id]: res.data }));
+        return res.data;
+    };
+
+    const toggleEntry = async (id) => {
+        if (opened[id]) { setOpened(({ [id]: _, ...rest }) => rest); return; }
+        try { await loadEntry(id); } catch (err) { console.error(err); }
+    };
+
+    const summarize = (entry) => ({
+        ...entry,
+        excerpt: entry.content.slice(0, 200),
+        cover: entry.media_gallery?.[0] || null,
+        media_count: entry.media_gallery?.length || 0
+    });
+
     const handleFileChange = (e) => {
         const files = Array.from(e.target.files);
         setFormState({ ...formState, mediaFiles: [...formState.mediaFiles, ...files] });
@@ -64,16 +86,21 @@ const Journal = () => {
             let res;
             if (editingId) res = await axios.put(`http://localhost:8000/journal/${editingId}`, payload);
             else res = await axios.post('http://localhost:8000/journal/', payload);
+            let saved = res.data;
 
             if (formState.mediaFiles.length > 0) {
                 const formData = new FormData();
                 for (let file of formState.mediaFiles) {
                     formData.append('files', file);
                 }
-                await axios.post(`http://localhost:8000/journal/upload/${res.data.id}`, formData);
+                const upload = await axios.post(`http://localhost:8000/journal/upload/${res.data.id}`, formData);
+                saved = { ...saved, media_gallery: upload.data.gallery };
             }
 
-            resetForm(); fetchEntries();
+            // Patch the list locally instead of refetching it, the saved entry stays open
+            setOpened(prev => ({ ...prev, [saved.id]: saved }));
+            setEntries(prev => editingId ? prev.map(item => item.id === saved.id ? { ...item, ...summarize(saved) } : item) : [summarize(saved), ...prev]);
+            resetForm();
         } catch (err) { console.error(err); }
     };
 
@@ -94,10 +121,12 @@ const Journal = () => {
 
     const deleteEntry = async (id) => {
         if (!confirm("Delete this memory?")) return;
-        try { await axios.delete(`http://localhost:8000/journal/${id}`); fetchEntries(); } catch (err) { console.error(err); }
+        try { await axios.delete(`http://localhost:8000/journal/${id}`); setEntries(prev => prev.filter(item => item.id !== id)); } catch (err) { console.error(err); }
     };
 
-    const startEdit = (entry) => {
+    const startEdit = async (summary) => {
+        let entry;
+        try { entry = await loadEntry(summary.id); } catch (err) { console.error(err); return; }
         setEditingId(entry.id);
         setFormState({
             title: entry.title, content: entry.content, is_public: entry.is_public, mediaFiles: [],
@@ -217,37 +246,57 @@ const Journal = () => {
             )}
 
             <div className="profile-grid">
-                {entries.map(entry => (
+                {entries.map(entry => {
+                    const full = opened[entry.id];
+                    return (
                     <div
                         key={entry.id}
-                        className={`glass-panel col-span-${entry.design_config?.width || 6} ${entry.design_config?.backgroundType === 'glass' ? 'glass-effect' : ''}`}
-                        style={getStyle(entry.design_config)}
+                        className={`glass-panel col-span-${full?.design_config?.width || 6} ${full?.design_config?.backgroundType === 'glass' ? 'glass-effect' : ''}`}
+                        style={getStyle(full?.design_config)}
                     >
                         <div style={{ display: 'flex', justifyContent: 'space-between', marginBottom: '1rem' }}>
-                            <h2 style={{ fontSize: '1.4rem', fontWeight: 900 }}>{entry.title}</h2>
+                            <h2 style={{ fontSize: '1.4rem', fontWeight: 900, cursor: 'pointer' }} onClick={() => toggleEntry(entry.id)}>{entry.title}</h2>
                             <div style={{ display: 'flex', gap: '0.75rem' }}>
                                 <Edit3 size={18} style={{ cursor: 'pointer', opacity: 0.5 }} onClick={() => startEdit(entry)} />
                                 <Trash2 size={18} style={{ cursor: 'pointer', opacity: 0.5 }} onClick={() => deleteEntry(entry.id)} />
                             </div>
                         </div>
 
-                        {entry.media_gallery && entry.media_gallery.length > 0 && (
-                            <div style={{ marginBottom: '1.5rem' }}>
-                                <MediaCarousel
-                                    media={entry.media_gallery}
-                                    height={entry.design_config?.customHeight ? `${entry.design_config.customHeight * 0.7}px` : '300px'}
-                                />
-                            </div>
+                        {full ? (
+                            <>
+                                {full.media_gallery && full.media_gallery.length > 0 && (
+                                    <div style={{ marginBottom: '1.5rem' }}>
+                                        <MediaCarousel
+                                            media={full.media_gallery}
+                                            height={full.design_config?.customHeight ? `${full.design_config.customHeight * 0.7}px` : '300px'}
+                                        />
+                                    </div>
+                                )}
+                                <p style={{ whiteSpace: 'pre-wrap', lineHeight: 1.7, opacity: 0.9 }}>{full.content}</p>
+                            </>
+                        ) : (
+                            <>
+                                {entry.cover && (
+                                    <div style={{ marginBottom: '1.5rem', borderRadius: '0.75rem', overflow: 'hidden', cursor: 'pointer' }} onClick={() => toggleEntry(entry.id)}>
+                                        {entry.cover.type === 'video'
+                                            ? <video src={mediaUrl(entry.cover.url)} style={{ width: '100%', height: '220px', objectFit: 'cover' }} />
+                                            : <img src={mediaUrl(entry.cover.url)} srcSet={mediaSrcSet(entry.cover.variants)} sizes="50vw" loading="lazy" style={{ width: '100%', height: '220px', objectFit: 'cover' }} />}
+                                    </div>
+                                )}
+                                <p style={{ whiteSpace: 'pre-wrap', lineHeight: 1.7, opacity: 0.9 }}>{entry.excerpt}</p>
+                            </>
                         )}
-
-                        <p style={{ whiteSpace: 'pre-wrap', lineHeight: 1.7, opacity: 0.9 }}>{entry.content}</p>
+                        <button type="button" className="btn" style={{ marginTop: '1rem', fontSize: '0.75rem' }} onClick={() => toggleEntry(entry.id)}>
+                            {full ? 'Show less' : `Read more${entry.media_count > 1 ? ` · ${entry.media_count} photos & videos` : ''}`}
+                        </button>
 
                         <div style={{ marginTop: 'auto', paddingTop: '1.5rem', borderTop: '1px solid rgba(0,0,0,0.05)', display: 'flex', justifyContent: 'space-between', fontSize: '0.75rem', opacity: 0.6 }}>
                             <span style={{ display: 'flex', alignItems: 'center', gap: '0.4rem' }}><Calendar size={14} /> {new Date(entry.created_at).toLocaleDateString()}</span>
                             <span style={{ display: 'flex', alignItems: 'center', gap: '0.4rem' }}><UserIcon size={14} /> Shared by {entry.owner?.username || user?.username}</span>
                         </div>
                     </div>
-                ))}
+                    );
+                })}
             </div>
         </div>
     );
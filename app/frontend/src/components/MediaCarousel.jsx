@@ -1,5 +1,6 @@
 import React, { useState } from 'react';
 import { ChevronLeft, ChevronRight } from 'lucide-react';
+import { mediaUrl, mediaSrcSet } from '../utils/media';
 
 const MediaCarousel = ({ media, height }) => {
     const [currentIndex, setCurrentIndex] = useState(0);
@@ -46,13 +47,15 @@ const MediaCarousel = ({ media, height }) => {
             <div style={{ width: '100%', height: '100%', display: 'flex', alignItems: 'center', justifyContent: 'center', padding: isVideo ? '0' : '0' }}>
                 {isVideo ? (
                     <video
-                        src={currentMedia.url.startsWith('http') ? currentMedia.url : `http://localhost:8000/${currentMedia.url}`}
+                        src={mediaUrl(currentMedia.url)}
                         controls
                         style={{ width: '100%', height: '100%', objectFit: 'contain', background: '#000' }}
                     />
                 ) : (
                     <img
-                        src={currentMedia.url.startsWith('http') ? currentMedia.url : `http://localhost:8000/${currentMedia.url}`}
+                        src={mediaUrl(currentMedia.url)}
+                        srcSet={mediaSrcSet(currentMedia.variants)}
+                        sizes="(max-width: 768px) 100vw, 50vw"
                         alt="Gallery Item"
                         style={{ width: '100%', height: '100%', objectFit: 'cover' }}
                     />
@@ -0,0 +1,11 @@
+const API_URL = 'http://localhost:8000';
+
+export const mediaUrl = (url) => (url.startsWith('http') ? url : `${API_URL}/${url}`);
+
+// Resized copies produced by the backend, keyed by width
+export const mediaSrcSet = (variants) => {
+    if (!variants) return undefined;
+    const entries = Object.entries(variants);
+    if (entries.length === 0) return undefined;
+    return entries.map(([width, url]) => `${mediaUrl(url)} ${width}w`).join(', ');
+};